@@ -1,18 +1,39 @@
 import requests
-import httpx
 import json
 import os
 import logging
-from typing import Dict, List, Optional, Union
+import gzip
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union
 import aiofiles
 import logging
 from config import (
     API_URLS, DEFAULT_HEADERS, PAYLOAD_TEMPLATES,
     get_user_cookies_path, get_global_cookies_path, SAMPLE_COOKIES
 )
+from http_transport import get_async_client
+from json_stream import JsonArrayStreamParser
+from cookie_cache import CookieIdentity, get_cached_identity, cache_user_cookies, invalidate_user_cookies
+
+# Размер куска при потоковом чтении экспорта словаря
+EXPORT_STREAM_CHUNK_SIZE = 64 * 1024
 
 USE_DATABASE = os.environ.get("DATABASE_URL") is not None
 
+# Точные заголовки из curl примера для getLearningMain
+LEARNING_MAIN_HEADERS = {
+    "accept": "application/json",
+    "accept-language": "en-US,en;q=0.9,ru;q=0.8",
+    "content-type": "application/json",
+    "dnt": "1",
+    "origin": "https://lingualeo.com",
+    "priority": "u=1, i",
+    "referer": "https://lingualeo.com/ru/training/words",
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-site",
+    "user-agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 18_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.5 Mobile/15E148 Safari/604.1"
+}
+
 if USE_DATABASE:
     import sys
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lingualeo_pyth'))
@@ -34,16 +55,17 @@ class LingualeoAPIClient:
         self.session = requests.Session()
         self.session.headers.update(self.headers)
         self.async_client = None
+        self._identity: Optional[CookieIdentity] = None
         logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
 
     async def __aenter__(self):
-        self.async_client = httpx.AsyncClient(headers=self.headers)
+        # Берем соединения из общего пула процесса; закрывать его здесь нельзя
+        self.async_client = await get_async_client()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.async_client:
-            await self.async_client.aclose()
+        self.async_client = None
 
     def load_cookies(self, user_id: Optional[int] = None) -> bool:
         """
@@ -69,6 +91,16 @@ class LingualeoAPIClient:
         Приоритет: база данных -> файл пользователя -> глобальный файл
         """
         logger = logging.getLogger(__name__)
+        if self.user_id is None:
+            self.user_id = user_id
+
+        # Кэш в памяти: без обращений к БД и диску
+        cached = get_cached_identity(user_id)
+        if cached:
+            self._identity = cached
+            self.cookies = cached.cookies
+            self.headers['Cookie'] = self.cookies
+            return True
 
         # Сначала пробуем базу данных (если доступна)
         if USE_DATABASE:
@@ -77,6 +109,7 @@ class LingualeoAPIClient:
                 if cookies_from_db:
                     self.cookies = cookies_from_db
                     self.headers['Cookie'] = self.cookies
+                    self._identity = cache_user_cookies(user_id, self.cookies)
                     logger.info(f"Cookies загружены из БД для user_id {user_id}")
                     return True
                 else:
@@ -96,6 +129,7 @@ class LingualeoAPIClient:
 
                 if self.cookies:
                     self.headers['Cookie'] = self.cookies
+                    self._identity = cache_user_cookies(user_id, self.cookies)
                     logger.info(f"Пользовательские cookies загружены для user_id {user_id}")
                     return True
                 else:
@@ -107,6 +141,44 @@ class LingualeoAPIClient:
         logger.info(f"Cookies не найдены для user_id {user_id} - требуется авторизация через /login")
         return False
 
+    async def _ensure_cookies_async(self, user_id: Optional[int] = None):
+        """
+        Загружает cookies асинхронно, если они еще не установлены в клиенте.
+        """
+        if self.cookies:
+            return
+        effective_user_id = user_id or self.user_id
+        if not effective_user_id or not await self.load_user_cookies_async(effective_user_id):
+            raise ValueError("Cookies not found. Login first.")
+
+    def _get_ym_uid(self) -> str:
+        """
+        Извлекает ID пользователя из cookies: предпочитаем _ym_uid, fallback на lingualeouid.
+        """
+        if self._identity is None or self._identity.cookies != self.cookies:
+            self._identity = CookieIdentity.from_cookies(self.cookies)
+        if not self._identity.ym_uid:
+            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        return self._identity.ym_uid
+
+    def _on_unauthorized(self):
+        """
+        Сессия на стороне Lingualeo истекла: сбрасываем кэш cookies пользователя,
+        чтобы следующий запрос перечитал их (или потребовал /login).
+        """
+        self.logger.warning(f"401 от Lingualeo для user_id {self.user_id} - сбрасываем кэш cookies")
+        if self.user_id:
+            invalidate_user_cookies(self.user_id)
+        self._identity = None
+        self.cookies = ""
+        self.headers.pop('Cookie', None)
+
+    def _raise_for_status(self, response):
+        """raise_for_status с инвалидацией кэша cookies при 401"""
+        if response.status_code == 401:
+            self._on_unauthorized()
+        response.raise_for_status()
+
     def login(self, email: str, password: str) -> Dict:
         """
         Синхронный логин и сохранение cookies.
@@ -144,9 +216,12 @@ class LingualeoAPIClient:
         payload['credentials']['password'] = password
         
         logger.info(f"Login attempt for user_id {user_id}, email: {email[:3]}***")
+        # Старые cookies больше не действительны, даже если логин не удастся
+        invalidate_user_cookies(user_id)
+        self.user_id = user_id
         
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            response = await client.post(url, json=payload)
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
         
         logger.info(f"Login response status: {response.status_code}")
         logger.debug(f"Login response body: {response.text[:500]}")
@@ -195,22 +270,24 @@ class LingualeoAPIClient:
         os.makedirs(os.path.dirname(path), exist_ok=True)
         async with aiofiles.open(path, 'w', encoding='utf-8') as f:
             await f.write(cookies_str)
+        self._identity = cache_user_cookies(user_id, cookies_str)
         
         # Verify login and check vocabulary
         word_count = 0
         try:
             test_url = 'https://api.lingualeo.com/GetWords'
-            async with httpx.AsyncClient(headers={'Cookie': cookies_str}) as verify_client:
-                verify_response = await verify_client.get(test_url, params={'limit': 1})
-                logger.info(f"Verify API call status: {verify_response.status_code}")
-                if verify_response.status_code == 401:
-                    logger.warning("Login verification failed - unauthorized")
-                    return {'error_msg': 'Неверный email или пароль'}
-                
-                # Check word count
-                verify_data = verify_response.json()
-                word_count = verify_data.get('cntWords', 0)
-                logger.info(f"User vocabulary count: {word_count}")
+            verify_client = await get_async_client()
+            verify_response = await verify_client.get(test_url, params={'limit': 1}, headers={'Cookie': cookies_str})
+            logger.info(f"Verify API call status: {verify_response.status_code}")
+            if verify_response.status_code == 401:
+                logger.warning("Login verification failed - unauthorized")
+                invalidate_user_cookies(user_id)
+                return {'error_msg': 'Неверный email или пароль'}
+            
+            # Check word count
+            verify_data = verify_response.json()
+            word_count = verify_data.get('cntWords', 0)
+            logger.info(f"User vocabulary count: {word_count}")
         except Exception as verify_error:
             logger.warning(f"Login verification error (non-critical): {verify_error}")
         
@@ -242,11 +319,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -269,11 +342,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/GetWords'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "apiVersion": "1.0.1",
@@ -299,11 +368,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -322,6 +387,32 @@ class LingualeoAPIClient:
         response.raise_for_status()
         return response.json()
 
+    async def process_training_answer_batch_async(self, training_results: dict) -> Dict:
+        """
+        Асинхронно отправляет все результаты тренировки одним запросом (word_set_repetition).
+        """
+        await self._ensure_cookies_async()
+        url = 'https://api.lingualeo.com/ProcessTraining'
+        ym_uid = self._get_ym_uid()
+
+        payload = {
+            "api_call": "process_training",
+            "apiVersion": "1.0.1",
+            "trainingName": "word_set_repetition",
+            "data": {
+                "words": training_results,
+                "wordSetId": 0
+            },
+            "iDs": [{"y": ym_uid}]
+        }
+
+        self.logger.debug(f"Sending process_training_answer_batch_async request to {url} with {len(training_results)} words")
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
+        self.logger.debug(f"process_training_answer_batch_async response status: {response.status_code}")
+        self._raise_for_status(response)
+        return response.json()
+
     async def process_training_answer_async(self, user_id: int, word_id: int, translate_id: int, result: int) -> Dict:
         """
         Асинхронно отправляет ответ на вопрос тренировки (word_set_repetition).
@@ -329,11 +420,7 @@ class LingualeoAPIClient:
         if not await self.load_user_cookies_async(user_id):
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -346,9 +433,9 @@ class LingualeoAPIClient:
             "iDs": [{"y": ym_uid}]
         }
 
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            response = await client.post(url, json=payload)
-        response.raise_for_status()
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
+        self._raise_for_status(response)
         return response.json()
 
     async def add_word_async(self, word: str, translation: str, user_id: int) -> str:
@@ -361,8 +448,11 @@ class LingualeoAPIClient:
         payload = PAYLOAD_TEMPLATES['add_word'].copy()
         payload['data'][0]['valueList']['wordValue'] = word
         payload['data'][0]['valueList']['translation']['tr'] = translation
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            response = await client.post(url, json=payload)
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
+        if response.status_code == 401:
+            self._on_unauthorized()
+            return "Сессия Lingualeo истекла. Войдите заново командой /login"
         if response.status_code == 200:
             return "Слово добавлено успешно!"
         else:
@@ -402,11 +492,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = API_URLS['load_words']
-        # Извлекаем ID из cookies: предпочитаем _ym_uid, fallback на lingualeouid
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
         payload = PAYLOAD_TEMPLATES['load_words'].copy()
         payload['iDs'] = [{'y': ym_uid}]
         response = self.session.post(url, json=payload)
@@ -414,6 +500,61 @@ class LingualeoAPIClient:
         data = response.json()
         return data.get('data', [])
 
+    async def export_all_words_async(self, user_id: Optional[int] = None) -> List[Dict]:
+        """
+        Асинхронно экспортирует все слова (для /update_vocab в TG боте).
+        """
+        await self._ensure_cookies_async(user_id)
+        url = API_URLS['load_words']
+        ym_uid = self._get_ym_uid()
+        payload = PAYLOAD_TEMPLATES['load_words'].copy()
+        payload['iDs'] = [{'y': ym_uid}]
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
+        self._raise_for_status(response)
+        data = response.json()
+        return data.get('data', [])
+
+    def iter_export_words(self, raw_dump_path: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Потоково экспортирует все слова: массив data разбирается по мере
+        загрузки ответа, слова отдаются по одному. Если указан raw_dump_path,
+        сырой ответ параллельно пишется туда в gzip.
+        """
+        if not self.load_cookies():
+            raise ValueError("Cookies not found. Login first.")
+        payload = PAYLOAD_TEMPLATES['load_words'].copy()
+        payload['iDs'] = [{'y': self._get_ym_uid()}]
+        parser = JsonArrayStreamParser('data')
+        dump = gzip.open(raw_dump_path, 'wb') if raw_dump_path else None
+        try:
+            with self.session.post(API_URLS['load_words'], json=payload, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=EXPORT_STREAM_CHUNK_SIZE):
+                    if dump:
+                        dump.write(chunk)
+                    yield from parser.feed(chunk)
+            parser.close()
+        finally:
+            if dump:
+                dump.close()
+
+    async def iter_export_words_async(self, user_id: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Асинхронный вариант iter_export_words (для /update_vocab в TG боте).
+        """
+        await self._ensure_cookies_async(user_id)
+        payload = PAYLOAD_TEMPLATES['load_words'].copy()
+        payload['iDs'] = [{'y': self._get_ym_uid()}]
+        parser = JsonArrayStreamParser('data')
+        client = await get_async_client()
+        async with client.stream('POST', API_URLS['load_words'], json=payload, headers=self.headers) as response:
+            self._raise_for_status(response)
+            async for chunk in response.aiter_bytes(EXPORT_STREAM_CHUNK_SIZE):
+                for word in parser.feed(chunk):
+                    yield word
+        parser.close()
+
     def get_training_words(self) -> Dict:
         """
         Получает слова для тренировки (word_get_repetition).
@@ -421,11 +562,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -448,11 +585,7 @@ class LingualeoAPIClient:
             if not await self.load_user_cookies_async(user_id):
                 raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -462,9 +595,9 @@ class LingualeoAPIClient:
             "iDs": [{"y": ym_uid}]
         }
 
-        async with httpx.AsyncClient(headers=self.headers) as client:
-            response = await client.post(url, json=payload)
-        response.raise_for_status()
+        client = await get_async_client()
+        response = await client.post(url, json=payload, headers=self.headers)
+        self._raise_for_status(response)
         return response.json()
 
     def process_training_answer(self, word_id: int, translate_id: int, result: int) -> Dict:
@@ -474,11 +607,7 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/ProcessTraining'
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "api_call": "process_training",
@@ -505,27 +634,9 @@ class LingualeoAPIClient:
         if not self.load_cookies():
             raise ValueError("Cookies not found. Login first.")
         url = 'https://api.lingualeo.com/getLearningMain'
+        headers = LEARNING_MAIN_HEADERS
 
-        # Используем точные заголовки из curl примера
-        headers = {
-            "accept": "application/json",
-            "accept-language": "en-US,en;q=0.9,ru;q=0.8",
-            "content-type": "application/json",
-            "dnt": "1",
-            "origin": "https://lingualeo.com",
-            "priority": "u=1, i",
-            "referer": "https://lingualeo.com/ru/training/words",
-            "sec-fetch-dest": "empty",
-            "sec-fetch-mode": "cors",
-            "sec-fetch-site": "same-site",
-            "user-agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 18_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.5 Mobile/15E148 Safari/604.1"
-        }
-
-        # Извлекаем ID из cookies
-        cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in self.cookies.split(';') if '=' in c}
-        ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-        if not ym_uid:
-            raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
+        ym_uid = self._get_ym_uid()
 
         payload = {
             "apiVersion": "1.0.0",
@@ -539,6 +650,45 @@ class LingualeoAPIClient:
         response.raise_for_status()
         return response.json()
 
+    async def get_learning_main_async(self, user_id: Optional[int] = None) -> Dict:
+        """
+        Асинхронная версия get_learning_main (количество слов для повторения).
+        """
+        await self._ensure_cookies_async(user_id)
+        url = 'https://api.lingualeo.com/getLearningMain'
+        ym_uid = self._get_ym_uid()
+
+        payload = {
+            "apiVersion": "1.0.0",
+            "wordSetId": 1,
+            "iDs": [{"y": ym_uid}]
+        }
+
+        headers = {**LEARNING_MAIN_HEADERS, 'Cookie': self.cookies}
+        client = await get_async_client()
+        response = await client.post(url, headers=headers, json=payload)
+        self.logger.debug(f"get_learning_main_async response status: {response.status_code}")
+        self._raise_for_status(response)
+        return response.json()
+
+
+def normalize_training_results(training_results: dict) -> dict:
+    """
+    ИСПРАВЛЕНИЕ: нормализует типы данных результатов тренировки.
+    Ключи должны быть строками, значения - числами (int).
+    """
+    normalized_results = {}
+    for word_id, translate_id in training_results.items():
+        try:
+            # Преобразуем word_id в строку, translate_id в число
+            normalized_results[str(word_id)] = int(translate_id)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Ошибка преобразования типов данных: word_id={word_id}, translate_id={translate_id}: {e}")
+            # В случае ошибки преобразования используем значения как есть,
+            # но с приведенным типом ключа к строке
+            normalized_results[str(word_id)] = translate_id
+    return normalized_results
+
 
 def fix_process_training_answer_batch(client, training_results):
     """
@@ -560,25 +710,9 @@ def fix_process_training_answer_batch(client, training_results):
     
     url = 'https://api.lingualeo.com/ProcessTraining'
     
-    # Извлекаем ID из cookies
-    cookies_dict = {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip()
-                  for c in client.cookies.split(';') if '=' in c}
-    ym_uid = cookies_dict.get('_ym_uid') or cookies_dict.get('lingualeouid')
-    if not ym_uid:
-        raise ValueError("Не найден ни _ym_uid, ни lingualeouid в cookies.")
-
-    # ИСПРАВЛЕНИЕ: нормализуем типы данных
-    # Ключи должны быть строками, значения - числами (int)
-    normalized_results = {}
-    for word_id, translate_id in training_results.items():
-        try:
-            # Преобразуем word_id в строку, translate_id в число
-            normalized_results[str(word_id)] = int(translate_id)
-        except (ValueError, TypeError) as e:
-            logging.warning(f"Ошибка преобразования типов данных: word_id={word_id}, translate_id={translate_id}: {e}")
-            # В случае ошибки преобразования используем значения как есть,
-            # но с приведенным типом ключа к строке
-            normalized_results[str(word_id)] = translate_id
+    ym_uid = client._get_ym_uid()
+
+    normalized_results = normalize_training_results(training_results)
     
     payload = {
         "api_call": "process_training",
@@ -593,4 +727,23 @@ def fix_process_training_answer_batch(client, training_results):
 
     response = client.session.post(url, json=payload)
     response.raise_for_status()
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+
+async def fix_process_training_answer_batch_async(client, training_results):
+    """
+    Асинхронная версия fix_process_training_answer_batch для TG бота:
+    не блокирует event loop во время запроса к серверу.
+
+    В отличие от синхронной версии, не перечитывает cookies из файла,
+    если они уже загружены в клиент (например, из базы данных).
+
+    Args:
+        client (LingualeoAPIClient): экземпляр API-клиента
+        training_results (dict): результаты тренировки с ID слов и переводов
+
+    Returns:
+        dict: ответ от сервера
+    """
+    normalized_results = normalize_training_results(training_results)
+    return await client.process_training_answer_batch_async(normalized_results)
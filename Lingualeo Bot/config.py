@@ -24,6 +24,51 @@ DEFAULT_HEADERS = {
     'DNT': '1',
 }
 
+# Общий пул HTTP-соединений для асинхронных запросов к API (см. http_transport.py)
+HTTP_POOL_SETTINGS = {
+    'max_connections': int(os.environ.get('LINGUALEO_HTTP_MAX_CONNECTIONS', '20')),
+    'max_keepalive_connections': int(os.environ.get('LINGUALEO_HTTP_MAX_KEEPALIVE', '10')),
+    'keepalive_expiry': float(os.environ.get('LINGUALEO_HTTP_KEEPALIVE_EXPIRY', '60')),
+    'timeout': float(os.environ.get('LINGUALEO_HTTP_TIMEOUT', '5')),
+    'http2': os.environ.get('LINGUALEO_HTTP2', '').lower() in ('1', 'true', 'yes'),
+}
+
+# Кэш cookies и ym_uid пользователей в памяти процесса (секунды / количество пользователей)
+COOKIE_CACHE_SETTINGS = {
+    'ttl': float(os.environ.get('LINGUALEO_COOKIE_CACHE_TTL', '3600')),
+    'max_size': int(os.environ.get('LINGUALEO_COOKIE_CACHE_SIZE', '1000')),
+}
+
+# Режим webhook (aiohttp-сервер aiogram). Без LINGUALEO_WEBHOOK_URL бот работает через long polling
+WEBHOOK_SETTINGS = {
+    'url': os.environ.get('LINGUALEO_WEBHOOK_URL', '').rstrip('/'),  # Публичный адрес, например https://bot.example.com
+    'host': os.environ.get('LINGUALEO_WEBHOOK_HOST', '0.0.0.0'),
+    'port': int(os.environ.get('LINGUALEO_WEBHOOK_PORT', '8080')),
+    'path': os.environ.get('LINGUALEO_WEBHOOK_PATH', '/webhook'),
+    'secret': os.environ.get('LINGUALEO_WEBHOOK_SECRET', ''),
+}
+
+# Лимиты исходящих сообщений Telegram (см. lingualeo_pyth/send_scheduler.py), сообщений в секунду
+TELEGRAM_RATE_LIMITS = {
+    'global_rate': float(os.environ.get('LINGUALEO_TG_GLOBAL_RATE', '30')),
+    'chat_rate': float(os.environ.get('LINGUALEO_TG_CHAT_RATE', '1')),
+    'chat_burst': float(os.environ.get('LINGUALEO_TG_CHAT_BURST', '3')),
+    'group_rate': float(os.environ.get('LINGUALEO_TG_GROUP_RATE', str(20 / 60))),
+}
+
+# Карточка тренировки: одно сообщение, которое редактируется для каждого слова (иначе - новое сообщение на слово)
+TRAINING_CARD_EDIT_IN_PLACE = os.environ.get('LINGUALEO_EDIT_CARDS', '1').lower() in ('1', 'true', 'yes')
+
+# Метрики в формате Prometheus (см. metrics.py) на GET /metrics; порт 0 - не запускать.
+# Воркер i из supervisor.py слушает port + i
+METRICS_SETTINGS = {
+    'host': os.environ.get('LINGUALEO_METRICS_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('LINGUALEO_METRICS_PORT', '9108')),
+}
+
+# Telegram id администраторов через запятую: им доступна команда /stats
+ADMIN_IDS = {int(user_id) for user_id in os.environ.get('LINGUALEO_ADMIN_IDS', '').split(',') if user_id.strip()}
+
 # Директории для cookies
 USER_COOKIES_DIR = 'User_Cookies'
 GLOBAL_COOKIES_FILE = 'cookies_current.txt'  # Для не-TG скриптов
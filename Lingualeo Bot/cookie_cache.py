@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import COOKIE_CACHE_SETTINGS
+
+
+def parse_cookies(cookies: str) -> Dict[str, str]:
+    """Разбирает строку 'a=1; b=2' в словарь"""
+    return {c.split('=', 1)[0].strip(): c.split('=', 1)[1].strip() for c in cookies.split(';') if '=' in c}
+
+
+@dataclass(frozen=True)
+class CookieIdentity:
+    """Cookies пользователя вместе с уже разобранными значениями"""
+    cookies: str
+    cookie_dict: Dict[str, str]
+    ym_uid: Optional[str]
+
+    @classmethod
+    def from_cookies(cls, cookies: str) -> 'CookieIdentity':
+        cookie_dict = parse_cookies(cookies)
+        ym_uid = cookie_dict.get('_ym_uid') or cookie_dict.get('lingualeouid')
+        return cls(cookies, cookie_dict, ym_uid)
+
+
+class CookieCache:
+    """
+    TTL/LRU кэш CookieIdentity по user_id.
+
+    Запись живет ttl секунд с момента загрузки; при переполнении
+    вытесняется пользователь, к которому дольше всего не обращались.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[CookieIdentity]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        identity, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return identity
+
+    def put(self, user_id: int, cookies: str) -> CookieIdentity:
+        identity = CookieIdentity.from_cookies(cookies)
+        self._entries[user_id] = (identity, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = CookieCache(COOKIE_CACHE_SETTINGS['ttl'], COOKIE_CACHE_SETTINGS['max_size'])
+
+
+def get_cached_identity(user_id: int) -> Optional[CookieIdentity]:
+    return _cache.get(user_id)
+
+
+def cache_user_cookies(user_id: int, cookies: str) -> CookieIdentity:
+    return _cache.put(user_id, cookies)
+
+
+def invalidate_user_cookies(user_id: int):
+    """Сбрасывает кэш пользователя (новый логин или 401 от Lingualeo)"""
+    _cache.invalidate(user_id)
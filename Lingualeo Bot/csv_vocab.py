@@ -0,0 +1,172 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from search_index import NgramIndex, PrefixIndex
+from srs import next_states
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Сколько словарей держать в кэше производных данных (сортировки, поисковый индекс)
+FILE_CACHE_SIZE = 32
+
+# path -> ((mtime_ns, size), {ключ: производные данные словаря})
+_file_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_file_cache_lock = threading.RLock()
+
+
+def read_vocabulary(path: str) -> pd.DataFrame:
+    """
+    Читает CSV-словарь и приводит колонки интервального повторения к нужным типам.
+    """
+    df = pd.read_csv(path)
+    df['interval_hours'] = df['interval_hours'].astype(float)
+    df['ease_factor'] = df['ease_factor'].astype(float)
+    df['repetitions'] = df['repetitions'].astype('int64')
+    df['next_repetition_date'] = pd.to_datetime(df['next_repetition_date'])
+    return df
+
+
+def word_positions(df: pd.DataFrame, word_ids) -> np.ndarray:
+    """
+    Позиции строк для word_ids (-1 для отсутствующих) по хеш-индексу word_id,
+    без сравнения всей колонки для каждого слова.
+    """
+    word_ids = np.asarray(word_ids, dtype='int64')
+    index = pd.Index(df['word_id'])
+    if index.is_unique:
+        return index.get_indexer(word_ids)
+    # Старые CSV могут содержать дубликаты word_id - берем первую строку
+    first_rows = pd.Series(np.arange(len(df)), index=index)[~index.duplicated()]
+    return first_rows.reindex(word_ids).fillna(-1).to_numpy(dtype='int64')
+
+
+def apply_session_results(df: pd.DataFrame, results: Dict, now: datetime) -> int:
+    """
+    Применяет результаты сессии {word_id: is_correct} к словарю одним
+    векторным присваиванием на колонку. Возвращает количество обновленных слов.
+
+    Новые состояния считает общий движок srs.next_states.
+    """
+    if not results:
+        return 0
+    word_ids = np.fromiter((int(word_id) for word_id in results), dtype='int64', count=len(results))
+    correct = np.fromiter((bool(v) for v in results.values()), dtype=bool, count=len(results))
+
+    positions = word_positions(df, word_ids)
+    found = positions >= 0
+    positions, correct = positions[found], correct[found]
+    if not len(positions):
+        return 0
+
+    repetitions, ease_factor, interval_hours = next_states(
+        df['repetitions'].to_numpy()[positions],
+        df['ease_factor'].to_numpy()[positions],
+        df['interval_hours'].to_numpy()[positions],
+        correct,
+    )
+    next_dates = pd.Timestamp(now) + pd.to_timedelta(interval_hours, unit='h')
+
+    columns = df.columns
+    df.iloc[positions, columns.get_loc('repetitions')] = repetitions
+    df.iloc[positions, columns.get_loc('interval_hours')] = interval_hours
+    df.iloc[positions, columns.get_loc('ease_factor')] = ease_factor
+    df.iloc[positions, columns.get_loc('next_repetition_date')] = next_dates
+    return len(positions)
+
+
+def write_vocabulary(df: pd.DataFrame, path: str):
+    """
+    Атомарно записывает словарь: во временный файл рядом и os.replace,
+    чтобы падение во время записи не оставило обрезанный CSV.
+    """
+    out = df
+    if pd.api.types.is_datetime64_any_dtype(df['next_repetition_date']):
+        out = df.copy()
+        out['next_repetition_date'] = out['next_repetition_date'].dt.strftime(DATE_FORMAT)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8-sig', newline='') as f:
+            out.to_csv(f, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def update_vocabulary_file(path: str, results: Dict, now: datetime) -> int:
+    """Читает словарь, применяет результаты сессии и атомарно сохраняет его"""
+    df = read_vocabulary(path)
+    updated = apply_session_results(df, results, now)
+    write_vocabulary(df, path)
+    return updated
+
+
+def _cached(path: str, key: str, build):
+    """
+    Производные данные словаря path под ключом key. Пересчитываются через
+    build(), только когда файл изменился (mtime или размер).
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _file_cache_lock:
+        entry = _file_cache.get(path)
+        if entry is None or entry[0] != version:
+            entry = (version, {})
+            _file_cache[path] = entry
+        _file_cache.move_to_end(path)
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+        values = entry[1]
+        if key not in values:
+            values[key] = build()
+        return values[key]
+
+
+def sorted_vocabulary(path: str, sort_by: str, now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Словарь в порядке просмотра: 'alpha' - по english, 'date' - по дате
+    повторения, 'due' - только слова к повторению по дате.
+
+    Отсортированные копии кэшируются, пока не изменится файл, поэтому
+    листание страниц не перечитывает и не сортирует CSV. Слова к
+    повторению - это префикс копии, отсортированной по дате (searchsorted).
+    """
+    key = 'alpha' if sort_by == 'alpha' else 'date'
+    column = 'english' if key == 'alpha' else 'next_repetition_date'
+    df = _cached(path, key, lambda: _cached(path, 'frame', lambda: read_vocabulary(path))
+                 .sort_values(column, kind='stable').reset_index(drop=True))
+    if sort_by == 'due':
+        end = df['next_repetition_date'].searchsorted(pd.Timestamp(now or datetime.now()), side='right')
+        return df.iloc[:end]
+    return df
+
+
+def search_vocabulary(path: str, term: str, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Слова, в английском или русском тексте которых встречается term,
+    по рангу (точные, с начала, вхождения). N-граммный индекс строится
+    один раз на версию файла.
+    """
+    with _file_cache_lock:
+        df = _cached(path, 'frame', lambda: read_vocabulary(path))
+        index = _cached(path, 'search', lambda: NgramIndex.build(zip(df['english'], df['russian'])))
+    return df.iloc[index.search(term, limit)]
+
+
+def prefix_index(path: str) -> PrefixIndex:
+    """Префиксный индекс словаря для inline-поиска (english, russian, дата повторения)"""
+    with _file_cache_lock:
+        df = _cached(path, 'frame', lambda: read_vocabulary(path))
+        return _cached(path, 'prefix', lambda: PrefixIndex.build(
+            zip(df['english'], df['russian'], df['next_repetition_date'].dt.to_pydatetime())
+        ))
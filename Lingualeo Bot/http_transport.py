@@ -0,0 +1,73 @@
+import asyncio
+import importlib.util
+import logging
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Optional
+
+import httpx
+
+from config import HTTP_POOL_SETTINGS
+from metrics import TimedTransport
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_lock = asyncio.Lock()
+
+
+def _build_client() -> httpx.AsyncClient:
+    """
+    Создает общий httpx.AsyncClient с пулом keep-alive соединений.
+
+    Клиент не хранит cookies между запросами: cookies разных пользователей
+    передаются в заголовке Cookie каждого запроса, а Set-Cookie из ответов
+    в общий jar не попадает.
+    """
+    settings = HTTP_POOL_SETTINGS
+    limits = httpx.Limits(
+        max_connections=settings['max_connections'],
+        max_keepalive_connections=settings['max_keepalive_connections'],
+        keepalive_expiry=settings['keepalive_expiry'],
+    )
+
+    http2 = settings['http2']
+    if http2 and importlib.util.find_spec('h2') is None:
+        logger.warning("HTTP/2 включен, но пакет h2 не установлен (pip install httpx[http2]) - используем HTTP/1.1")
+        http2 = False
+
+    no_cookies_jar = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    # Пул соединений задается транспортом; обертка замеряет запросы (metrics.py)
+    transport = TimedTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+
+    logger.info(
+        f"Создан общий HTTP-пул: max_connections={limits.max_connections}, "
+        f"keepalive={limits.max_keepalive_connections}, http2={http2}"
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(settings['timeout']),
+        cookies=no_cookies_jar,
+    )
+
+
+async def get_async_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий для процесса httpx.AsyncClient (создается при первом вызове).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        async with _client_lock:
+            if _client is None or _client.is_closed:
+                _client = _build_client()
+    return _client
+
+
+async def close_async_client():
+    """
+    Закрывает общий HTTP-пул. Вызывается при остановке бота.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Общий HTTP-пул закрыт")
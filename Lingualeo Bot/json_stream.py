@@ -0,0 +1,77 @@
+import codecs
+import json
+import re
+from typing import Any, List
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+class JsonArrayStreamParser:
+    """
+    Инкрементальный парсер массива верхнего уровня из JSON-ответа.
+
+    Тело ответа подается кусками через feed(), парсер возвращает элементы
+    массива по мере того, как они полностью приходят. В памяти держится
+    только еще не разобранный хвост буфера, а не весь ответ.
+
+    Пример: для {"status": "ok", "data": [{...}, {...}]} и key='data'
+    элементы массива data возвращаются по одному.
+    """
+
+    def __init__(self, key: str = 'data'):
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._in_array = False
+        self._finished = False
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Добавляет кусок тела ответа и возвращает полностью пришедшие элементы"""
+        if self._finished:
+            return []
+        self._buffer += self._text_decoder.decode(chunk)
+        items = []
+
+        if not self._in_array:
+            match = self._key_re.search(self._buffer)
+            if not match:
+                # Ключ может быть разрезан между кусками - оставляем хвост
+                self._buffer = self._buffer[-256:]
+                return items
+            self._buffer = self._buffer[match.end():]
+            self._in_array = True
+
+        pos = 0
+        buffer = self._buffer
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE + ',':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                self._finished = True
+                pos += 1
+                break
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент пришел не полностью - ждем следующий кусок
+                break
+            if end >= len(buffer):
+                # Число на границе куска могло быть обрезано
+                break
+            items.append(item)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self):
+        """Проверяет, что массив дочитан до конца"""
+        if not self._finished:
+            raise ValueError("Ответ оборвался до конца JSON-массива")
@@ -1,4 +1,6 @@
+import csv
 import json
+import tempfile
 import pandas as pd
 from datetime import datetime
 import os
@@ -10,12 +12,18 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import ensure_requirements
 from api_client import LingualeoAPIClient
 from config import get_global_cookies_path
+from vocab_sync import normalize_export_word, normalize_export_words, diff_vocabulary, frame_vocabulary_hashes, merge_delta_into_frame
 
 ensure_requirements()
 
 # Константы
 VOCABULARY_FILE = "vocabulary.csv"
 RAW_RESPONSE_FILE = "raw_api_response.json"
+RAW_RESPONSE_GZ_FILE = "raw_api_response.json.gz"
+CSV_COLUMNS = ['word_id', 'english', 'russian', 'next_repetition_date',
+               'interval_hours', 'ease_factor', 'repetitions', 'content_hash']
+SRS_COLUMNS = ['next_repetition_date', 'interval_hours', 'ease_factor', 'repetitions']
+STREAM_CHUNK_SIZE = 500
 
 def export_all_words():
     """
@@ -50,39 +58,90 @@ def export_all_words():
 
 def save_words_to_csv(words):
     """
-    Сохраняет слова в CSV.
+    Синхронизирует CSV со словами Lingualeo: добавляет новые, обновляет
+    измененные и удаляет исчезнувшие слова. Прогресс повторения
+    существующих слов сохраняется.
     """
     if not words:
         return
 
-    processed_words = []
-    for word_data in words:
-        processed_words.append({
-            'word_id': word_data.get('id'),
-            'english': word_data.get('wd'),
-            'russian': word_data.get('trc')
-        })
-
-    df = pd.DataFrame(processed_words)
-    df.dropna(subset=['russian'], inplace=True)
-    df = df[df['russian'] != '']
-    df.drop_duplicates(subset=['word_id'], keep='first', inplace=True)
-
-    # Поля для интервального повторения
-    df['next_repetition_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    df['interval_hours'] = 12
-    df['ease_factor'] = 2.5
-    df['repetitions'] = 0
+    remote_words = normalize_export_words(w for w in words if w.get('trc'))
 
+    existing_df = pd.read_csv(VOCABULARY_FILE) if os.path.exists(VOCABULARY_FILE) else None
+    delta = diff_vocabulary(remote_words, frame_vocabulary_hashes(existing_df))
+    if delta.is_empty:
+        print(f"\nСловарь на {len(remote_words)} слов актуален, изменений нет.")
+        return
+
+    df = merge_delta_into_frame(existing_df, delta, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     df.to_csv(VOCABULARY_FILE, index=False, encoding='utf-8-sig')
-    print(f"\nСловарь на {len(df)} слов сохранен в {VOCABULARY_FILE}")
+    print(f"\nСловарь на {len(df)} слов сохранен в {VOCABULARY_FILE} "
+          f"(новых: {len(delta.new_words)}, изменено: {len(delta.changed_words)}, "
+          f"удалено: {len(delta.removed_word_ids)})")
+
+def _load_srs_progress():
+    """{word_id: (next_repetition_date, interval_hours, ease_factor, repetitions)} из текущего CSV"""
+    if not os.path.exists(VOCABULARY_FILE):
+        return {}
+    df = pd.read_csv(VOCABULARY_FILE, usecols=['word_id'] + SRS_COLUMNS)
+    return dict(zip(df['word_id'].astype('int64'), df[SRS_COLUMNS].itertuples(index=False, name=None)))
+
+def stream_words_to_csv(dump_raw: bool = False):
+    """
+    Потоковый экспорт: слова разбираются из ответа по мере загрузки и
+    пишутся в CSV порциями, весь ответ в памяти не собирается. Прогресс
+    повторения существующих слов переносится по word_id, слов, удаленных
+    в Lingualeo, в новом файле не будет. Сырой ответ сохраняется только
+    при dump_raw=True и сразу в gzip.
+    """
+    print("--- Запуск потокового экспортера слов ---")
+
+    client = LingualeoAPIClient()
+    if not client.load_cookies():
+        print("Ошибка: Куки не найдены. Используйте глобальный файл куки.")
+        return 0
+
+    progress = _load_srs_progress()
+    default_progress = (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 12, 2.5, 0)
+    seen = set()
+    written = 0
+
+    # Пишем во временный файл и подменяем словарь только после успешного экспорта
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv', dir=os.path.dirname(os.path.abspath(VOCABULARY_FILE)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            chunk = []
+            for raw_word in client.iter_export_words(RAW_RESPONSE_GZ_FILE if dump_raw else None):
+                word = normalize_export_word(raw_word)
+                if word['word_id'] is None or not word['russian'] or word['word_id'] in seen:
+                    continue
+                seen.add(word['word_id'])
+                chunk.append((word['word_id'], word['english'], word['russian'],
+                              *progress.get(word['word_id'], default_progress), word['content_hash']))
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    writer.writerows(chunk)
+                    written += len(chunk)
+                    chunk = []
+            writer.writerows(chunk)
+            written += len(chunk)
+        os.replace(tmp_path, VOCABULARY_FILE)
+    except Exception as e:
+        os.remove(tmp_path)
+        print(f"\nОшибка при потоковом экспорте: {e}")
+        return 0
+
+    print(f"\nСловарь на {written} слов сохранен в {VOCABULARY_FILE}")
+    if dump_raw:
+        print(f"Сырой JSON-ответ сохранен в {RAW_RESPONSE_GZ_FILE}")
+    return written
 
 if __name__ == "__main__":
-    if os.path.exists(VOCABULARY_FILE):
-        os.remove(VOCABULARY_FILE)
-    if os.path.exists(RAW_RESPONSE_FILE):
-        os.remove(RAW_RESPONSE_FILE)
-    
-    all_my_words = export_all_words()
-    if all_my_words:
-        save_words_to_csv(all_my_words)
\ No newline at end of file
+    # --full: старый режим с полным ответом в памяти и несжатым дампом
+    if '--full' in sys.argv:
+        all_my_words = export_all_words()
+        if all_my_words:
+            save_words_to_csv(all_my_words)
+    else:
+        stream_words_to_csv(dump_raw='--dump-raw' in sys.argv)
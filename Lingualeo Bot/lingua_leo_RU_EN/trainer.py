@@ -3,12 +3,13 @@ import os
 import sys
 import difflib
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Fix import path for local utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import ensure_requirements
+from csv_vocab import read_vocabulary, apply_session_results, write_vocabulary
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -29,18 +30,12 @@ def run_training_session(mode='free'):
         return
 
     try:
-        df = pd.read_csv(VOCABULARY_FILE)
+        df = read_vocabulary(VOCABULARY_FILE)
         print(f"Словарь успешно загружен. Всего слов: {len(df)}")
-        # Исправляем типы для избежания warning
-        df['interval_hours'] = df['interval_hours'].astype(float)
-        df['ease_factor'] = df['ease_factor'].astype(float)
     except Exception as e:
         print(f"Не удалось прочитать файл словаря: {e}")
         return
 
-    # Конвертируем next_repetition_date в datetime
-    df['next_repetition_date'] = pd.to_datetime(df['next_repetition_date'])
-
     # --- Шаг 2: Выбор слов для тренировки с интервальным повторением ---
     now = datetime.now()
     # Выбираем слова, готовые к повторению
@@ -67,8 +62,8 @@ def run_training_session(mode='free'):
     correct_answers = 0
     total_questions = len(training_df)
 
-    # Сохраняем индексы для обновления df
-    original_indices = training_df.index.tolist()
+    # Результаты копятся за сессию и применяются к словарю один раз в конце
+    session_results = {}
 
     # --- Шаг 3: Цикл тренировки ---
     for index, row in training_df.iterrows():
@@ -123,29 +118,11 @@ def run_training_session(mode='free'):
 
         correct_answers += 1 if is_correct else 0
 
-        # --- Шаг 4: Обновление интервала (общее для обоих режимов) ---
-        if is_correct:
-            df.loc[index, 'repetitions'] += 1
-            repetitions = df.loc[index, 'repetitions']
-            ease_factor = df.loc[index, 'ease_factor']
-            # Упрощенная SM2: interval = repetitions * ease_factor
-            new_interval = repetitions * ease_factor
-            df.loc[index, 'interval_hours'] = new_interval
-            # Следующая дата: + interval часов
-            next_date = now + timedelta(hours=new_interval)
-            df.loc[index, 'next_repetition_date'] = next_date
-        else:
-            # На неправильный: сброс repetitions=0, interval=12 часов
-            df.loc[index, 'repetitions'] = 0
-            df.loc[index, 'interval_hours'] = 12
-            next_date = now + timedelta(hours=12)
-            df.loc[index, 'next_repetition_date'] = next_date
-            # Уменьшаем ease_factor
-            df.loc[index, 'ease_factor'] = max(1.3, df.loc[index, 'ease_factor'] - 0.2)
-
-    # Сохраняем обновленный df обратно в CSV
-    df['next_repetition_date'] = df['next_repetition_date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    df.to_csv(VOCABULARY_FILE, index=False, encoding='utf-8-sig')
+        session_results[row['word_id']] = is_correct
+
+    # --- Шаг 4: Обновление интервалов всей сессии и атомарное сохранение CSV ---
+    apply_session_results(df, session_results, now)
+    write_vocabulary(df, VOCABULARY_FILE)
     print("Обновленный словарь с прогрессом сохранен.")
 
     # --- Сохранение статистики тренировки ---
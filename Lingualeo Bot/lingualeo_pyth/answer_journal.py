@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+# После стольких строк журнал сворачивается в снимок
+COMPACT_THRESHOLD = 200
+
+
+class AnswerJournal:
+    """
+    Журнал ответов тренировки с дозаписью (write-ahead log).
+
+    Каждый ответ - одна строка JSON [word_id, value] в <snapshot>.jsonl,
+    запись - O(1) дозапись в конец файла. Состояние восстанавливается
+    чтением снимка <snapshot>.json (формат прежних файлов результатов)
+    и проигрыванием журнала поверх него. Когда журнал вырастает до
+    COMPACT_THRESHOLD строк, он сворачивается в снимок.
+    """
+
+    def __init__(self, snapshot_path: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + '.jsonl'
+        self.compact_threshold = compact_threshold
+        self._lock = asyncio.Lock()
+        self._lines = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.journal_path)
+
+    def _count_lines(self) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, 'rb+') as f:
+            lines = 0
+            last = b'\n'
+            for last in f:
+                lines += 1
+            if not last.endswith(b'\n'):
+                # Оборванная при падении строка: новые записи начинаем с новой строки
+                f.write(b'\n')
+            return lines
+
+    async def append(self, word_id: Any, value: Any):
+        """Дописывает один ответ в журнал"""
+        async with self._lock:
+            if self._lines is None:
+                self._lines = await asyncio.to_thread(self._count_lines)
+            line = json.dumps([str(word_id), value], ensure_ascii=False) + '\n'
+            async with aiofiles.open(self.journal_path, 'a', encoding='utf-8') as f:
+                await f.write(line)
+                await f.flush()
+            self._lines += 1
+            if self._lines >= self.compact_threshold:
+                await asyncio.to_thread(self._compact)
+                self._lines = 0
+
+    def replay(self) -> Dict[str, Any]:
+        """Восстанавливает результаты: снимок + все записи журнала"""
+        results = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    results.update(json.load(f))
+            except json.JSONDecodeError:
+                logger.warning(f"Снимок результатов поврежден, используем только журнал: {self.snapshot_path}")
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        word_id, value = json.loads(line)
+                    except (json.JSONDecodeError, ValueError):
+                        # Последняя строка могла оборваться при падении процесса
+                        logger.warning(f"Пропущена поврежденная строка журнала {self.journal_path}")
+                        continue
+                    results[word_id] = value
+        return results
+
+    def _compact(self):
+        results = self.replay()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+        # Журнал удаляется только после того, как снимок атомарно записан
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        logger.info(f"Журнал ответов свернут в снимок: {len(results)} ответов, {self.snapshot_path}")
+
+    async def compact(self):
+        async with self._lock:
+            await asyncio.to_thread(self._compact)
+            self._lines = 0
+
+    def _clear(self) -> bool:
+        existed = False
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+                existed = True
+        return existed
+
+    async def clear(self) -> bool:
+        """
+        Удаляет снимок и журнал. Возвращает True, если что-то было удалено.
+        Под той же блокировкой, что и запись: идущее сворачивание не вернет снимок.
+        """
+        async with self._lock:
+            existed = await asyncio.to_thread(self._clear)
+            self._lines = 0
+        return existed
+
+
+_journals: Dict[str, AnswerJournal] = {}
+
+
+def get_journal(snapshot_path: str) -> AnswerJournal:
+    """Возвращает общий для процесса журнал по пути снимка"""
+    journal = _journals.get(snapshot_path)
+    if journal is None:
+        journal = _journals[snapshot_path] = AnswerJournal(snapshot_path)
+    return journal
@@ -0,0 +1,99 @@
+"""
+Бенчмарк выборки слов к повторению: старый ORDER BY RANDOM() против
+выборки по shuffle_key (db_sqlite.get_due_words).
+
+Запуск: python bench_due_words.py [--words 6000] [--due 1.0] [--runs 200]
+База создается во временном каталоге, рабочая lingualeo.db не трогается.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db_sqlite
+
+USER_ID = 1
+
+OLD_DUE_WORDS_SQL = """
+    SELECT word_id, english, russian, transcription, picture_url, sound_url,
+           translate_id, repetitions, ease_factor, interval_hours, next_due
+    FROM user_vocabulary
+    WHERE user_id = ? AND next_due <= ?
+    ORDER BY RANDOM()
+    LIMIT ?
+"""
+
+
+async def fill_vocabulary(words: int, due_share: float):
+    now = datetime.now()
+    due_count = int(words * due_share)
+    vocabulary = [
+        {
+            'word_id': i,
+            'english': f'word{i}',
+            'russian': f'слово{i}',
+            'next_repetition_date': now - timedelta(hours=1) if i < due_count else now + timedelta(days=1),
+        }
+        for i in range(words)
+    ]
+    await db_sqlite.bulk_upsert_vocabulary(USER_ID, vocabulary)
+    # Второй пользователь, чтобы индекс не состоял из одного user_id
+    await db_sqlite.bulk_upsert_vocabulary(USER_ID + 1, vocabulary)
+
+
+async def old_due_words(limit: int):
+    pool = await db_sqlite.get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(OLD_DUE_WORDS_SQL, (USER_ID, int(time.time()), limit))
+        return await cursor.fetchall()
+
+
+async def measure(name: str, func, runs: int, limit: int) -> Counter:
+    seen = Counter()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = await func(limit)
+        timings.append((time.perf_counter() - start) * 1000)
+        seen.update(row['word_id'] for row in rows)
+    timings.sort()
+    print(f"{name:>12}: median {timings[len(timings) // 2]:.3f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.3f} ms, "
+          f"разных слов за {runs} выборок: {len(seen)}")
+    return seen
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, default=6000, help='Слов в словаре')
+    parser.add_argument('--due', type=float, default=1.0, help='Доля слов к повторению (0..1)')
+    parser.add_argument('--runs', type=int, default=200, help='Количество выборок')
+    parser.add_argument('--limit', type=int, default=10, help='Слов в одной выборке')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_sqlite.DB_PATH = os.path.join(tmp_dir, 'bench.db')
+        await fill_vocabulary(args.words, args.due)
+        print(f"Словарь: {args.words} слов, к повторению {int(args.words * args.due)}, limit {args.limit}")
+
+        await measure('ORDER BY', old_due_words, args.runs, args.limit)
+        await measure('shuffle_key', lambda limit: db_sqlite.get_due_words(USER_ID, limit), args.runs, args.limit)
+
+        pool = await db_sqlite.get_pool()
+        async with pool.acquire() as db:
+            cursor = await db.execute(
+                "EXPLAIN QUERY PLAN " + db_sqlite._DUE_WORDS_SQL.format(op='>='),
+                (USER_ID, 0, int(time.time()), args.limit)
+            )
+            print("План выборки:", '; '.join(row[3] for row in await cursor.fetchall()))
+        await db_sqlite.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
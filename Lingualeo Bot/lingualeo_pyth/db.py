@@ -1,20 +1,132 @@
 import os
+import sys
+import random
 import asyncpg
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import json
 import logging
 
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+from search_index import normalize_term
+from srs import next_state, next_states, due_dates, reschedule
+
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
 _pool: Optional[asyncpg.Pool] = None
 
+async def _ensure_schema(pool: asyncpg.Pool):
+    """Аддитивные миграции поверх существующей схемы (выполняются один раз при подключении)"""
+    async with pool.acquire() as conn:
+        await conn.execute("ALTER TABLE user_vocabulary ADD COLUMN IF NOT EXISTS content_hash TEXT")
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_sync_state (
+                user_id BIGINT PRIMARY KEY,
+                last_sync_at TIMESTAMP,
+                vocabulary_digest TEXT,
+                word_count INTEGER DEFAULT 0
+            )
+            """
+        )
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_vocab_word_id ON user_vocabulary(user_id, word_id)"
+        )
+        # Случайный ключ для выборки слов к повторению (volatile DEFAULT заполняет и старые строки)
+        await conn.execute(
+            "ALTER TABLE user_vocabulary ADD COLUMN IF NOT EXISTS shuffle_key DOUBLE PRECISION DEFAULT random()"
+        )
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_vocab_shuffle ON user_vocabulary(user_id, shuffle_key, next_repetition_date)"
+        )
+        # Триграммный поиск слов (pg_trgm); без расширения поиск работает сканированием
+        try:
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_vocab_english_trgm ON user_vocabulary USING gin (LOWER(english) gin_trgm_ops)"
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_vocab_russian_trgm ON user_vocabulary USING gin (LOWER(russian) gin_trgm_ops)"
+            )
+        except asyncpg.PostgresError as e:
+            logger.warning(f"pg_trgm недоступен, поиск слов без индекса: {e}")
+        # Покрывающий индекс: счетчик и страницы слов к повторению читаются index-only
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_vocab_due
+            ON user_vocabulary(user_id, next_repetition_date) INCLUDE (english, russian)
+            """
+        )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_vocab_stats (
+                user_id BIGINT PRIMARY KEY,
+                word_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Количество слов пользователя поддерживается триггером при вставке и удалении
+        await conn.execute(
+            """
+            CREATE OR REPLACE FUNCTION vocab_stats_trigger() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO user_vocab_stats (user_id, word_count) VALUES (NEW.user_id, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET word_count = user_vocab_stats.word_count + 1;
+                ELSE
+                    UPDATE user_vocab_stats SET word_count = word_count - 1 WHERE user_id = OLD.user_id;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+        # Триггер и пересчет - одна транзакция под блокировкой, исключающей запись
+        # в словарь (и параллельный запуск схемы другим процессом): иначе вставка
+        # между ними дала бы счетчик, который пересчет уже не исправит
+        async with conn.transaction():
+            await conn.execute("LOCK TABLE user_vocabulary IN SHARE ROW EXCLUSIVE MODE")
+            await conn.execute(
+                """
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_vocab_stats') THEN
+                        CREATE TRIGGER trg_vocab_stats
+                        AFTER INSERT OR DELETE ON user_vocabulary
+                        FOR EACH ROW EXECUTE FUNCTION vocab_stats_trigger();
+                    END IF;
+                END
+                $$
+                """
+            )
+            await conn.execute(
+                """
+                INSERT INTO user_vocab_stats (user_id, word_count)
+                SELECT user_id, COUNT(*) FROM user_vocabulary GROUP BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET word_count = EXCLUDED.word_count
+                """
+            )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                storage_key TEXT PRIMARY KEY,
+                state TEXT,
+                data BYTEA,
+                expires_at BIGINT NOT NULL
+            )
+            """
+        )
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm_storage(expires_at)")
+
 async def get_pool() -> asyncpg.Pool:
     global _pool
     if _pool is None:
         _pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+        await _ensure_schema(_pool)
     return _pool
 
 async def close_pool():
@@ -39,18 +151,34 @@ async def get_user_vocabulary(user_id: int) -> List[Dict[str, Any]]:
         return [dict(row) for row in rows]
 
 async def get_due_words(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Случайная выборка слов к повторению без ORDER BY RANDOM().
+
+    У каждого слова есть случайный shuffle_key (обновляется после каждого
+    ответа). Берем случайную точку и читаем индекс (user_id, shuffle_key)
+    от нее вперед, при нехватке слов - с начала до этой точки. Сортировки
+    всех просроченных слов нет, чтение останавливается на limit строках.
+    """
     pool = await get_pool()
     async with pool.acquire() as conn:
         rows = await conn.fetch(
             """
-            SELECT word_id, english, russian, transcription, picture_url, sound_url,
-                   translate_id, repetitions, ease_factor, interval_hours, next_repetition_date
-            FROM user_vocabulary
-            WHERE user_id = $1 AND next_repetition_date <= NOW()
-            ORDER BY RANDOM()
-            LIMIT $2
+            (SELECT word_id, english, russian, transcription, picture_url, sound_url,
+                    translate_id, repetitions, ease_factor, interval_hours, next_repetition_date
+             FROM user_vocabulary
+             WHERE user_id = $1 AND shuffle_key >= $2 AND next_repetition_date <= NOW()
+             ORDER BY shuffle_key
+             LIMIT $3)
+            UNION ALL
+            (SELECT word_id, english, russian, transcription, picture_url, sound_url,
+                    translate_id, repetitions, ease_factor, interval_hours, next_repetition_date
+             FROM user_vocabulary
+             WHERE user_id = $1 AND shuffle_key < $2 AND next_repetition_date <= NOW()
+             ORDER BY shuffle_key
+             LIMIT $3)
+            LIMIT $3
             """,
-            user_id, limit
+            user_id, random.random(), limit
         )
         return [dict(row) for row in rows]
 
@@ -98,42 +226,206 @@ async def upsert_vocabulary_word(user_id: int, word_data: Dict[str, Any]) -> Non
             word_data.get('next_repetition_date', datetime.now())
         )
 
-async def bulk_upsert_vocabulary(user_id: int, words: List[Dict[str, Any]]) -> int:
+async def bulk_upsert_vocabulary(user_id: int, words: List[Dict[str, Any]]) -> tuple:
+    """
+    Пакетный upsert словаря: COPY во временную таблицу и один INSERT ... SELECT
+    ... ON CONFLICT. Возвращает (inserted, updated) - количество новых и обновленных слов.
+    """
+    if not words:
+        return 0, 0
+    now = datetime.now()
+    records = [
+        (
+            word.get('word_id'),
+            word.get('english', ''),
+            word.get('russian', ''),
+            word.get('transcription', ''),
+            word.get('picture_url', ''),
+            word.get('sound_url', ''),
+            word.get('translate_id'),
+            word.get('repetitions', 0),
+            word.get('ease_factor', 2.5),
+            word.get('interval_hours', 1.0),
+            word.get('next_repetition_date') or now,
+            word.get('content_hash')
+        )
+        for word in words
+    ]
+    
     pool = await get_pool()
-    count = 0
     async with pool.acquire() as conn:
         async with conn.transaction():
-            for word in words:
+            await conn.execute(
+                """
+                CREATE TEMP TABLE tmp_vocabulary_import (
+                    word_id BIGINT,
+                    english TEXT,
+                    russian TEXT,
+                    transcription TEXT,
+                    picture_url TEXT,
+                    sound_url TEXT,
+                    translate_id BIGINT,
+                    repetitions INTEGER,
+                    ease_factor DOUBLE PRECISION,
+                    interval_hours DOUBLE PRECISION,
+                    next_repetition_date TIMESTAMP,
+                    content_hash TEXT
+                ) ON COMMIT DROP
+                """
+            )
+            await conn.copy_records_to_table(
+                'tmp_vocabulary_import',
+                records=records,
+                columns=[
+                    'word_id', 'english', 'russian', 'transcription', 'picture_url',
+                    'sound_url', 'translate_id', 'repetitions', 'ease_factor',
+                    'interval_hours', 'next_repetition_date', 'content_hash'
+                ]
+            )
+            # DISTINCT ON: ON CONFLICT не может обновить одну строку дважды за запрос
+            rows = await conn.fetch(
+                """
+                INSERT INTO user_vocabulary (
+                    user_id, word_id, english, russian, transcription, picture_url,
+                    sound_url, translate_id, repetitions, ease_factor, interval_hours,
+                    next_repetition_date, content_hash, updated_at
+                )
+                SELECT DISTINCT ON (english)
+                    $1, word_id, english, russian, transcription, picture_url,
+                    sound_url, translate_id, repetitions, ease_factor, interval_hours,
+                    next_repetition_date, content_hash, NOW()
+                FROM tmp_vocabulary_import
+                ORDER BY english
+                ON CONFLICT (user_id, english) DO UPDATE SET
+                    russian = EXCLUDED.russian,
+                    transcription = EXCLUDED.transcription,
+                    picture_url = EXCLUDED.picture_url,
+                    sound_url = EXCLUDED.sound_url,
+                    translate_id = EXCLUDED.translate_id,
+                    content_hash = EXCLUDED.content_hash,
+                    updated_at = NOW()
+                RETURNING (xmax = 0) AS inserted
+                """,
+                user_id
+            )
+    inserted = sum(1 for row in rows if row['inserted'])
+    return inserted, len(rows) - inserted
+
+async def get_vocabulary_hashes(user_id: int) -> Dict[int, Optional[str]]:
+    """
+    Возвращает {word_id: content_hash} словаря пользователя для дельта-синхронизации.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT word_id, content_hash FROM user_vocabulary WHERE user_id = $1 AND word_id IS NOT NULL",
+            user_id
+        )
+        return {row['word_id']: row['content_hash'] for row in rows}
+
+async def get_sync_state(user_id: int) -> Optional[Dict[str, Any]]:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT last_sync_at, vocabulary_digest, word_count FROM user_sync_state WHERE user_id = $1",
+            user_id
+        )
+        return dict(row) if row else None
+
+_SAVE_SYNC_STATE_SQL = """
+    INSERT INTO user_sync_state (user_id, last_sync_at, vocabulary_digest, word_count)
+    VALUES ($1, NOW(), $2, $3)
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_sync_at = EXCLUDED.last_sync_at,
+        vocabulary_digest = EXCLUDED.vocabulary_digest,
+        word_count = EXCLUDED.word_count
+"""
+
+async def save_sync_state(user_id: int, digest: str, word_count: int) -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(_SAVE_SYNC_STATE_SQL, user_id, digest, word_count)
+
+async def apply_vocabulary_delta(user_id: int, new_words: List[Dict[str, Any]],
+                                 changed_words: List[Dict[str, Any]], removed_word_ids: List[int],
+                                 digest: str, word_count: int) -> None:
+    """
+    Применяет дельту словаря в одной транзакции: удаляет исчезнувшие слова,
+    обновляет текст измененных (прогресс SRS сохраняется), добавляет новые
+    и запоминает дайджест синхронизации.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if removed_word_ids:
+                await conn.execute(
+                    "DELETE FROM user_vocabulary WHERE user_id = $1 AND word_id = ANY($2::bigint[])",
+                    user_id, removed_word_ids
+                )
+            if changed_words:
+                # NOT EXISTS: новое написание может совпасть с другим словом пользователя
+                await conn.execute(
+                    """
+                    UPDATE user_vocabulary AS v
+                    SET english = c.english, russian = c.russian,
+                        content_hash = c.content_hash, updated_at = NOW()
+                    FROM unnest($2::bigint[], $3::text[], $4::text[], $5::text[])
+                        AS c(word_id, english, russian, content_hash)
+                    WHERE v.user_id = $1 AND v.word_id = c.word_id
+                      AND NOT EXISTS (
+                          SELECT 1 FROM user_vocabulary AS o
+                          WHERE o.user_id = $1 AND o.english = c.english AND o.word_id <> c.word_id
+                      )
+                    """,
+                    user_id,
+                    [w['word_id'] for w in changed_words],
+                    [w['english'] for w in changed_words],
+                    [w['russian'] for w in changed_words],
+                    [w['content_hash'] for w in changed_words]
+                )
+                # Пропущенные из-за совпадения строки получают новый хэш с прежним
+                # текстом, иначе каждая следующая синхронизация снова сочтет их измененными
+                status = await conn.execute(
+                    """
+                    UPDATE user_vocabulary AS v
+                    SET content_hash = c.content_hash, updated_at = NOW()
+                    FROM unnest($2::bigint[], $3::text[]) AS c(word_id, content_hash)
+                    WHERE v.user_id = $1 AND v.word_id = c.word_id
+                      AND v.content_hash IS DISTINCT FROM c.content_hash
+                    """,
+                    user_id,
+                    [w['word_id'] for w in changed_words],
+                    [w['content_hash'] for w in changed_words]
+                )
+                collisions = int(status.split()[-1])
+                if collisions:
+                    logger.warning(
+                        f"Пользователь {user_id}: {collisions} измененных слов совпали по написанию "
+                        f"с другими словами словаря, текст оставлен прежним"
+                    )
+            if new_words:
                 await conn.execute(
                     """
                     INSERT INTO user_vocabulary (
-                        user_id, word_id, english, russian, transcription, picture_url,
-                        sound_url, translate_id, repetitions, ease_factor, interval_hours,
-                        next_repetition_date, updated_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, NOW())
+                        user_id, word_id, english, russian, next_repetition_date, content_hash, updated_at
+                    )
+                    SELECT DISTINCT ON (n.english) $1, n.word_id, n.english, n.russian, NOW(), n.content_hash, NOW()
+                    FROM unnest($2::bigint[], $3::text[], $4::text[], $5::text[])
+                        AS n(word_id, english, russian, content_hash)
+                    ORDER BY n.english
                     ON CONFLICT (user_id, english) DO UPDATE SET
+                        word_id = EXCLUDED.word_id,
                         russian = EXCLUDED.russian,
-                        transcription = EXCLUDED.transcription,
-                        picture_url = EXCLUDED.picture_url,
-                        sound_url = EXCLUDED.sound_url,
-                        translate_id = EXCLUDED.translate_id,
+                        content_hash = EXCLUDED.content_hash,
                         updated_at = NOW()
                     """,
                     user_id,
-                    word.get('word_id'),
-                    word.get('english', ''),
-                    word.get('russian', ''),
-                    word.get('transcription', ''),
-                    word.get('picture_url', ''),
-                    word.get('sound_url', ''),
-                    word.get('translate_id'),
-                    word.get('repetitions', 0),
-                    word.get('ease_factor', 2.5),
-                    word.get('interval_hours', 1.0),
-                    word.get('next_repetition_date', datetime.now())
+                    [w['word_id'] for w in new_words],
+                    [w['english'] for w in new_words],
+                    [w['russian'] for w in new_words],
+                    [w['content_hash'] for w in new_words]
                 )
-                count += 1
-    return count
+            await conn.execute(_SAVE_SYNC_STATE_SQL, user_id, digest, word_count)
 
 async def update_word_after_training(user_id: int, english: str, correct: bool) -> None:
     pool = await get_pool()
@@ -150,23 +442,9 @@ async def update_word_after_training(user_id: int, english: str, correct: bool)
         if not row:
             return
         
-        repetitions = row['repetitions']
-        ease_factor = row['ease_factor']
-        interval_hours = row['interval_hours']
-        
-        if correct:
-            repetitions += 1
-            if repetitions == 1:
-                interval_hours = 1.0
-            elif repetitions == 2:
-                interval_hours = 6.0
-            else:
-                interval_hours = interval_hours * ease_factor
-            ease_factor = max(1.3, ease_factor + 0.1)
-        else:
-            repetitions = 0
-            interval_hours = 0.5
-            ease_factor = max(1.3, ease_factor - 0.2)
+        repetitions, ease_factor, interval_hours = next_state(
+            row['repetitions'], row['ease_factor'], row['interval_hours'], correct
+        )
         
         next_rep = datetime.now().timestamp() + (interval_hours * 3600)
         next_rep_date = datetime.fromtimestamp(next_rep)
@@ -175,57 +453,186 @@ async def update_word_after_training(user_id: int, english: str, correct: bool)
             """
             UPDATE user_vocabulary
             SET repetitions = $3, ease_factor = $4, interval_hours = $5,
-                next_repetition_date = $6, updated_at = NOW()
+                next_repetition_date = $6, updated_at = NOW(), shuffle_key = random()
             WHERE user_id = $1 AND english = $2
             """,
             user_id, english, repetitions, ease_factor, interval_hours, next_rep_date
         )
 
-async def get_word_status(user_id: int, search_term: str) -> List[Dict[str, Any]]:
+async def apply_training_results(user_id: int, results: Dict[str, bool]) -> int:
+    """
+    Применяет результаты RUS-ENG сессии ({word_id: is_correct}) ко всем словам
+    в одной транзакции: SELECT ... FOR UPDATE и один UPDATE ... FROM unnest(...).
+    Возвращает количество обновленных слов.
+    """
+    if not results:
+        return 0
+    word_ids = [int(word_id) for word_id in results]
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch(
+                """
+                SELECT word_id, repetitions, ease_factor, interval_hours
+                FROM user_vocabulary
+                WHERE user_id = $1 AND word_id = ANY($2::bigint[])
+                FOR UPDATE
+                """,
+                user_id, word_ids
+            )
+            
+            now = datetime.now()
+            ids = [row['word_id'] for row in rows]
+            reps, eases, intervals = next_states(
+                [row['repetitions'] for row in rows],
+                [row['ease_factor'] for row in rows],
+                [row['interval_hours'] for row in rows],
+                [bool(results[str(word_id)]) for word_id in ids],
+            )
+            next_dates = due_dates(now, intervals).astype(datetime)
+            
+            if ids:
+                await conn.execute(
+                    """
+                    UPDATE user_vocabulary AS v
+                    SET repetitions = u.repetitions, ease_factor = u.ease_factor,
+                        interval_hours = u.interval_hours,
+                        next_repetition_date = u.next_repetition_date, updated_at = NOW(),
+                        shuffle_key = random()
+                    FROM unnest($2::bigint[], $3::int[], $4::float8[], $5::float8[], $6::timestamp[])
+                        AS u(word_id, repetitions, ease_factor, interval_hours, next_repetition_date)
+                    WHERE v.user_id = $1 AND v.word_id = u.word_id
+                    """,
+                    user_id, ids, reps.tolist(), eases.tolist(), intervals.tolist(), next_dates.tolist()
+                )
+    return len(ids)
+
+async def reschedule_vocabulary(user_id: Optional[int] = None) -> int:
+    """
+    Пересчитывает интервалы и даты повторения всех слов (или слов одного
+    пользователя) по текущему алгоритму srs одной векторной операцией.
+    Нужен после изменения параметров интервального повторения.
+    Возвращает количество пересчитанных слов.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch(
+                """
+                SELECT user_id, english, repetitions, ease_factor, interval_hours, next_repetition_date
+                FROM user_vocabulary
+                WHERE next_repetition_date IS NOT NULL
+                  AND ($1::bigint IS NULL OR user_id = $1)
+                FOR UPDATE
+                """,
+                user_id
+            )
+            if not rows:
+                return 0
+            
+            new_intervals, new_dues = reschedule(
+                [row['repetitions'] or 0 for row in rows],
+                [row['ease_factor'] or 2.5 for row in rows],
+                [row['interval_hours'] or 0.0 for row in rows],
+                [row['next_repetition_date'] for row in rows],
+            )
+            await conn.execute(
+                """
+                UPDATE user_vocabulary AS v
+                SET interval_hours = u.interval_hours,
+                    next_repetition_date = u.next_repetition_date, updated_at = NOW()
+                FROM unnest($1::bigint[], $2::text[], $3::float8[], $4::timestamp[])
+                    AS u(user_id, english, interval_hours, next_repetition_date)
+                WHERE v.user_id = u.user_id AND v.english = u.english
+                """,
+                [row['user_id'] for row in rows], [row['english'] for row in rows], new_intervals.tolist(), new_dues.astype(datetime).tolist()
+            )
+    logger.info(f"Расписание пересчитано для {len(rows)} слов")
+    return len(rows)
+
+async def get_word_status(user_id: int, search_term: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Поиск слов по вхождению в английский или русский текст без учета регистра
+    через триграммные GIN-индексы (pg_trgm). Результаты ранжируются: точные
+    совпадения, затем с начала слова, затем вхождения.
+    """
+    term = normalize_term(search_term)
+    if not term:
+        return []
+    pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
     pool = await get_pool()
     async with pool.acquire() as conn:
         rows = await conn.fetch(
             """
             SELECT english, russian, repetitions, ease_factor, interval_hours, next_repetition_date
             FROM user_vocabulary
-            WHERE user_id = $1 AND (LOWER(english) LIKE $2 OR LOWER(russian) LIKE $2)
-            LIMIT 5
+            WHERE user_id = $1 AND (LOWER(english) LIKE $3 OR LOWER(russian) LIKE $3)
+            ORDER BY
+                CASE
+                    WHEN LOWER(english) = $2 OR LOWER(russian) = $2 THEN 0
+                    WHEN LOWER(english) LIKE $4 OR LOWER(russian) LIKE $4 THEN 1
+                    ELSE 2
+                END,
+                LENGTH(english), english
+            LIMIT $5
             """,
-            user_id, f"%{search_term.lower()}%"
+            user_id, term, f"%{pattern}%", f"{pattern}%", limit
         )
         return [dict(row) for row in rows]
 
-async def get_vocabulary_page(user_id: int, offset: int, limit: int, sort_by: str = 'alpha', due_only: bool = False) -> tuple:
+async def get_vocabulary_count(user_id: int) -> int:
+    """Количество слов пользователя из user_vocab_stats (без COUNT по словарю)"""
     pool = await get_pool()
     async with pool.acquire() as conn:
-        where_clause = "WHERE user_id = $1"
-        if due_only:
-            where_clause += " AND next_repetition_date <= NOW()"
-        
-        if sort_by == 'alpha':
-            order_clause = "ORDER BY english ASC"
-        elif sort_by == 'date':
-            order_clause = "ORDER BY next_repetition_date ASC"
-        else:
-            order_clause = "ORDER BY english ASC"
-        
-        count = await conn.fetchval(
-            f"SELECT COUNT(*) FROM user_vocabulary {where_clause}",
+        result = await conn.fetchval(
+            "SELECT word_count FROM user_vocab_stats WHERE user_id = $1",
             user_id
         )
-        
+        return result or 0
+
+async def get_vocabulary_page(user_id: int, limit: int, sort_by: str = 'alpha', due_only: bool = False,
+                              after_english: Optional[str] = None, backward: bool = False) -> List[Dict[str, Any]]:
+    """
+    Страница словаря с keyset-пагинацией: вместо OFFSET страница начинается
+    сразу после слова after_english (или перед ним при backward=True) в
+    порядке сортировки, поэтому стоимость не зависит от номера страницы.
+    Якорь - сам ключ сортировки: english уникален в словаре пользователя.
+    Если при сортировке по дате слово-якорь удалено, возвращается пустой список.
+    """
+    keys = "next_repetition_date, english" if sort_by == 'date' else "english"
+    where_clause = "WHERE user_id = $1"
+    params = [user_id]
+    if due_only:
+        where_clause += " AND next_repetition_date <= NOW()"
+    if after_english is not None:
+        if sort_by == 'date':
+            where_clause += f"""
+            AND ({keys}) {'<' if backward else '>'} (
+                SELECT {keys} FROM user_vocabulary WHERE user_id = $1 AND english = $2
+            )"""
+        else:
+            where_clause += f" AND english {'<' if backward else '>'} $2"
+        params.append(after_english)
+    direction = 'DESC' if backward else 'ASC'
+    order_clause = "ORDER BY " + ", ".join(f"{key} {direction}" for key in keys.split(", "))
+    params.append(limit)
+    
+    pool = await get_pool()
+    async with pool.acquire() as conn:
         rows = await conn.fetch(
             f"""
-            SELECT english, russian, next_repetition_date
+            SELECT word_id, english, russian, next_repetition_date
             FROM user_vocabulary
             {where_clause}
             {order_clause}
-            OFFSET $2 LIMIT $3
+            LIMIT ${len(params)}
             """,
-            user_id, offset, limit
+            *params
         )
-        
-        return [dict(row) for row in rows], count or 0
+    words = [dict(row) for row in rows]
+    if backward:
+        words.reverse()
+    return words
 
 async def save_user_cookies(user_id: int, cookies: str) -> None:
     pool = await get_pool()
@@ -281,3 +688,45 @@ async def delete_training_results(result_id: int) -> None:
             "DELETE FROM training_results WHERE id = $1",
             result_id
         )
+
+async def get_fsm_record(storage_key: str, now: int) -> Optional[tuple]:
+    """Возвращает (state, data) записи FSM, если она не истекла"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT state, data FROM fsm_storage WHERE storage_key = $1 AND expires_at > $2",
+            storage_key, now
+        )
+        return (row['state'], row['data']) if row else None
+
+async def save_fsm_records(upserts: List[tuple], deletes: List[str]) -> None:
+    """
+    Пакетная запись FSM в одной транзакции.
+    upserts: [(storage_key, state, data, expires_at)], deletes: [storage_key].
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if upserts:
+                await conn.executemany(
+                    """
+                    INSERT INTO fsm_storage (storage_key, state, data, expires_at)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (storage_key) DO UPDATE SET
+                        state = EXCLUDED.state,
+                        data = EXCLUDED.data,
+                        expires_at = EXCLUDED.expires_at
+                    """,
+                    upserts
+                )
+            if deletes:
+                await conn.execute(
+                    "DELETE FROM fsm_storage WHERE storage_key = ANY($1::text[])",
+                    deletes
+                )
+
+async def delete_expired_fsm_records(now: int) -> int:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM fsm_storage WHERE expires_at <= $1", now)
+        return int(result.split()[-1])
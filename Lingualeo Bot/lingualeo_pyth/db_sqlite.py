@@ -1,64 +1,326 @@
 import os
+import sys
+import time
+import random
+import asyncio
 import aiosqlite
+import numpy as np
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import json
 import logging
 
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+from search_index import match_rank, normalize_term, NGRAM_SIZE
+from srs import next_state, next_states, reschedule
+
 logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "lingualeo.db")
 
-async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_vocabulary (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                word_id INTEGER,
-                english TEXT NOT NULL,
-                russian TEXT,
-                transcription TEXT,
-                picture_url TEXT,
-                sound_url TEXT,
-                translate_id INTEGER,
-                repetitions INTEGER DEFAULT 0,
-                ease_factor REAL DEFAULT 2.5,
-                interval_hours REAL DEFAULT 1.0,
-                next_repetition_date TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, english)
-            )
-        """)
+# Размер порции для executemany при массовом импорте словаря
+BULK_CHUNK_SIZE = 500
+# Размер порции при переводе дат повторения в next_due (одна транзакция на порцию)
+NEXT_DUE_BACKFILL_CHUNK = 2000
+# Сколько ждать блокировку базы, занятой другим процессом (воркеры supervisor.py), секунды
+BUSY_TIMEOUT = 30.0
+
+
+class SQLitePool:
+    """
+    Долгоживущее соединение aiosqlite с интерфейсом, похожим на asyncpg.Pool.
+
+    Каждое соединение aiosqlite - это отдельный поток, поэтому держим одно
+    соединение на весь процесс и сериализуем доступ к нему через asyncio.Lock,
+    чтобы транзакции разных обработчиков не перемешивались.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection):
+        self._conn = conn
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._lock:
+            try:
+                yield self._conn
+            except BaseException:
+                # Не оставляем незавершенную транзакцию следующему обработчику
+                if self._conn.in_transaction:
+                    await self._conn.rollback()
+                raise
+
+    async def close(self):
+        await self._conn.close()
+
+
+_pool: Optional[SQLitePool] = None
+# Доступен ли полнотекстовый индекс (FTS5 с токенизатором trigram, SQLite 3.34+)
+_fts_enabled = False
+_pool_lock = asyncio.Lock()
+
+
+async def _apply_schema(db: aiosqlite.Connection):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_vocabulary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            word_id INTEGER,
+            english TEXT NOT NULL,
+            russian TEXT,
+            transcription TEXT,
+            picture_url TEXT,
+            sound_url TEXT,
+            translate_id INTEGER,
+            repetitions INTEGER DEFAULT 0,
+            ease_factor REAL DEFAULT 2.5,
+            interval_hours REAL DEFAULT 1.0,
+            next_due INTEGER,
+            content_hash TEXT,
+            shuffle_key INTEGER DEFAULT (random()),
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, english)
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_cookies (
+            user_id INTEGER PRIMARY KEY,
+            cookies TEXT,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS training_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            training_type TEXT NOT NULL,
+            results TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_sync_state (
+            user_id INTEGER PRIMARY KEY,
+            last_sync_at TEXT,
+            vocabulary_digest TEXT,
+            word_count INTEGER DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_vocab_stats (
+            user_id INTEGER PRIMARY KEY,
+            word_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data BLOB,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+    # Миграция баз, созданных до появления хешей содержимого слов
+    cursor = await db.execute("PRAGMA table_info(user_vocabulary)")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if 'content_hash' not in columns:
+        await db.execute("ALTER TABLE user_vocabulary ADD COLUMN content_hash TEXT")
+    if 'next_due' not in columns:
+        await db.execute("ALTER TABLE user_vocabulary ADD COLUMN next_due INTEGER")
+    if 'next_repetition_date' in columns:
+        await _backfill_next_due(db)
+    if 'shuffle_key' not in columns:
+        # ALTER TABLE не допускает DEFAULT (random()), ключи проставляются отдельно
+        await db.execute("ALTER TABLE user_vocabulary ADD COLUMN shuffle_key INTEGER")
+        await db.execute("UPDATE user_vocabulary SET shuffle_key = random()")
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_shuffle_key
+        AFTER INSERT ON user_vocabulary
+        WHEN NEW.shuffle_key IS NULL
+        BEGIN
+            UPDATE user_vocabulary SET shuffle_key = random() WHERE id = NEW.id;
+        END
+    """)
+    # Количество слов пользователя поддерживается триггерами при вставке и удалении
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_stats_insert
+        AFTER INSERT ON user_vocabulary
+        BEGIN
+            INSERT INTO user_vocab_stats (user_id, word_count) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET word_count = word_count + 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_stats_delete
+        AFTER DELETE ON user_vocabulary
+        BEGIN
+            UPDATE user_vocab_stats SET word_count = word_count - 1 WHERE user_id = OLD.user_id;
+        END
+    """)
+    await db.execute("""
+        INSERT OR IGNORE INTO user_vocab_stats (user_id, word_count)
+        SELECT user_id, COUNT(*) FROM user_vocabulary GROUP BY user_id
+    """)
+    await _apply_search_schema(db)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_vocab_user ON user_vocabulary(user_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_vocab_word_id ON user_vocabulary(user_id, word_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm_storage(expires_at)")
+    # Индексы по текстовой next_repetition_date заменены индексами по next_due
+    await db.execute("DROP INDEX IF EXISTS idx_vocab_next_rep")
+    await db.execute("DROP INDEX IF EXISTS idx_vocab_shuffle")
+    # Покрывающий индекс: счетчик и страницы слов к повторению читаются без обращения к таблице
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_vocab_due ON user_vocabulary(user_id, next_due, english, russian)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_vocab_shuffle_due ON user_vocabulary(user_id, shuffle_key, next_due)"
+    )
+    await db.commit()
+
+async def _apply_search_schema(db: aiosqlite.Connection):
+    """
+    Поисковый индекс vocab_search: FTS5 с токенизатором trigram поверх
+    user_vocabulary (external content), синхронизируется триггерами.
+    Без поддержки trigram поиск работает прежним сканированием.
+    """
+    global _fts_enabled
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'vocab_search'")
+    existed = await cursor.fetchone() is not None
+    try:
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_cookies (
-                user_id INTEGER PRIMARY KEY,
-                cookies TEXT,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            CREATE VIRTUAL TABLE IF NOT EXISTS vocab_search USING fts5(
+                english, russian, user_id UNINDEXED,
+                content='user_vocabulary', content_rowid='id',
+                tokenize='trigram case_sensitive 0'
             )
         """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS training_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                training_type TEXT NOT NULL,
-                results TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    except aiosqlite.OperationalError as e:
+        logger.warning(f"FTS5 trigram недоступен, поиск слов без индекса: {e}")
+        _fts_enabled = False
+        return
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_search_insert
+        AFTER INSERT ON user_vocabulary
+        BEGIN
+            INSERT INTO vocab_search (rowid, english, russian, user_id)
+            VALUES (NEW.id, NEW.english, NEW.russian, NEW.user_id);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_search_delete
+        AFTER DELETE ON user_vocabulary
+        BEGIN
+            INSERT INTO vocab_search (vocab_search, rowid, english, russian, user_id)
+            VALUES ('delete', OLD.id, OLD.english, OLD.russian, OLD.user_id);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vocab_search_update
+        AFTER UPDATE OF english, russian ON user_vocabulary
+        BEGIN
+            INSERT INTO vocab_search (vocab_search, rowid, english, russian, user_id)
+            VALUES ('delete', OLD.id, OLD.english, OLD.russian, OLD.user_id);
+            INSERT INTO vocab_search (rowid, english, russian, user_id)
+            VALUES (NEW.id, NEW.english, NEW.russian, NEW.user_id);
+        END
+    """)
+    if not existed:
+        await db.execute("INSERT INTO vocab_search (vocab_search) VALUES ('rebuild')")
+    _fts_enabled = True
+
+async def _backfill_next_due(db: aiosqlite.Connection):
+    """
+    Переносит старые ISO-даты next_repetition_date в целочисленный next_due
+    (секунды эпохи) порциями по NEXT_DUE_BACKFILL_CHUNK с commit после каждой,
+    чтобы не держать блокировку записи на весь словарь. Перенесенная дата
+    обнуляется, поэтому прерванная миграция продолжается при следующем запуске.
+    Нечитаемые даты, как и раньше при чтении, считаются текущим моментом.
+    """
+    total = 0
+    while True:
+        cursor = await db.execute(
+            """
+            UPDATE user_vocabulary
+            SET next_due = COALESCE(
+                    CAST(strftime('%s', next_repetition_date, 'utc') AS INTEGER),
+                    CAST(strftime('%s', 'now') AS INTEGER)
+                ),
+                next_repetition_date = NULL
+            WHERE id IN (
+                SELECT id FROM user_vocabulary
+                WHERE next_repetition_date IS NOT NULL
+                LIMIT ?
             )
-        """)
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_vocab_user ON user_vocabulary(user_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_vocab_next_rep ON user_vocabulary(user_id, next_repetition_date)")
+            """,
+            (NEXT_DUE_BACKFILL_CHUNK,)
+        )
         await db.commit()
+        if cursor.rowcount <= 0:
+            break
+        total += cursor.rowcount
+    if total:
+        logger.info(f"Даты повторения переведены в next_due: {total} слов")
+
+def _to_epoch(value, default: int) -> int:
+    """Дата повторения (datetime, ISO-строка или секунды) -> секунды эпохи"""
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value).timestamp())
+        except ValueError:
+            pass
+    return default
+
+def _word_row(row) -> Dict[str, Any]:
+    """Строка словаря -> dict с next_repetition_date (datetime), как в db.py"""
+    d = dict(row)
+    if 'next_due' in d:
+        next_due = d.pop('next_due')
+        d['next_repetition_date'] = datetime.fromtimestamp(next_due) if next_due is not None else None
+    return d
+
+async def get_pool() -> SQLitePool:
+    """
+    Возвращает общее соединение с базой. При первом вызове открывает его
+    и один раз применяет схему.
+    """
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                conn = await aiosqlite.connect(DB_PATH, timeout=BUSY_TIMEOUT)
+                conn.row_factory = aiosqlite.Row
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await _apply_schema(conn)
+                _pool = SQLitePool(conn)
+                logger.info(f"SQLite соединение открыто: {DB_PATH}")
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool:
+        await _pool.close()
+        _pool = None
+        logger.info("SQLite соединение закрыто")
+
+async def init_db():
+    await get_pool()
 
 async def get_user_vocabulary(user_id: int) -> List[Dict[str, Any]]:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
             """
             SELECT word_id, english, russian, transcription, picture_url, sound_url,
-                   translate_id, repetitions, ease_factor, interval_hours, next_repetition_date
+                   translate_id, repetitions, ease_factor, interval_hours, next_due
             FROM user_vocabulary
             WHERE user_id = ?
             ORDER BY english
@@ -66,53 +328,45 @@ async def get_user_vocabulary(user_id: int) -> List[Dict[str, Any]]:
             (user_id,)
         )
         rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            d = dict(row)
-            if d.get('next_repetition_date'):
-                try:
-                    d['next_repetition_date'] = datetime.fromisoformat(d['next_repetition_date'])
-                except:
-                    d['next_repetition_date'] = datetime.now()
-            result.append(d)
-        return result
+        return [_word_row(row) for row in rows]
+
+_DUE_WORDS_SQL = """
+    SELECT word_id, english, russian, transcription, picture_url, sound_url,
+           translate_id, repetitions, ease_factor, interval_hours, next_due
+    FROM user_vocabulary INDEXED BY idx_vocab_shuffle_due
+    WHERE user_id = ? AND shuffle_key {op} ? AND next_due <= ?
+    ORDER BY shuffle_key
+    LIMIT ?
+"""
 
 async def get_due_words(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    await init_db()
-    now = datetime.now().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT word_id, english, russian, transcription, picture_url, sound_url,
-                   translate_id, repetitions, ease_factor, interval_hours, next_repetition_date
-            FROM user_vocabulary
-            WHERE user_id = ? AND next_repetition_date <= ?
-            ORDER BY RANDOM()
-            LIMIT ?
-            """,
-            (user_id, now, limit)
-        )
-        rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            d = dict(row)
-            if d.get('next_repetition_date'):
-                try:
-                    d['next_repetition_date'] = datetime.fromisoformat(d['next_repetition_date'])
-                except:
-                    d['next_repetition_date'] = datetime.now()
-            result.append(d)
-        return result
+    """
+    Случайная выборка слов к повторению без ORDER BY RANDOM().
+
+    У каждого слова есть случайный shuffle_key (обновляется после каждого
+    ответа). Берем случайную точку и читаем индекс (user_id, shuffle_key)
+    от нее вперед, при нехватке слов - с начала до этой точки. Сортировки
+    всех просроченных слов нет, чтение останавливается на limit строках.
+    """
+    pool = await get_pool()
+    now = int(time.time())
+    pivot = random.getrandbits(64) - 2 ** 63
+    async with pool.acquire() as db:
+        cursor = await db.execute(_DUE_WORDS_SQL.format(op='>='), (user_id, pivot, now, limit))
+        rows = list(await cursor.fetchall())
+        if len(rows) < limit:
+            cursor = await db.execute(_DUE_WORDS_SQL.format(op='<'), (user_id, pivot, now, limit - len(rows)))
+            rows.extend(await cursor.fetchall())
+        return [_word_row(row) for row in rows]
 
 async def count_due_words(user_id: int) -> int:
-    await init_db()
-    now = datetime.now().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    pool = await get_pool()
+    now = int(time.time())
+    async with pool.acquire() as db:
         cursor = await db.execute(
             """
             SELECT COUNT(*) FROM user_vocabulary
-            WHERE user_id = ? AND next_repetition_date <= ?
+            WHERE user_id = ? AND next_due <= ?
             """,
             (user_id, now)
         )
@@ -120,21 +374,17 @@ async def count_due_words(user_id: int) -> int:
         return row[0] if row else 0
 
 async def upsert_vocabulary_word(user_id: int, word_data: Dict[str, Any]) -> None:
-    await init_db()
+    pool = await get_pool()
     now = datetime.now().isoformat()
-    next_rep = word_data.get('next_repetition_date')
-    if isinstance(next_rep, datetime):
-        next_rep = next_rep.isoformat()
-    elif next_rep is None:
-        next_rep = now
+    next_due = _to_epoch(word_data.get('next_repetition_date'), int(time.time()))
     
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.acquire() as db:
         await db.execute(
             """
             INSERT INTO user_vocabulary (
                 user_id, word_id, english, russian, transcription, picture_url,
                 sound_url, translate_id, repetitions, ease_factor, interval_hours,
-                next_repetition_date, updated_at
+                next_due, updated_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT (user_id, english) DO UPDATE SET
                 russian = excluded.russian,
@@ -156,65 +406,194 @@ async def upsert_vocabulary_word(user_id: int, word_data: Dict[str, Any]) -> Non
                 word_data.get('repetitions', 0),
                 word_data.get('ease_factor', 2.5),
                 word_data.get('interval_hours', 1.0),
-                next_rep,
+                next_due,
                 now,
                 now
             )
         )
         await db.commit()
 
-async def bulk_upsert_vocabulary(user_id: int, words: List[Dict[str, Any]]) -> int:
-    await init_db()
+async def bulk_upsert_vocabulary(user_id: int, words: List[Dict[str, Any]]) -> tuple:
+    """
+    Пакетный upsert словаря: executemany порциями по BULK_CHUNK_SIZE в одной транзакции.
+    Возвращает (inserted, updated) - количество новых и обновленных слов.
+    """
+    if not words:
+        return 0, 0
     now = datetime.now().isoformat()
-    count = 0
-    async with aiosqlite.connect(DB_PATH) as db:
-        for word in words:
-            next_rep = word.get('next_repetition_date')
-            if isinstance(next_rep, datetime):
-                next_rep = next_rep.isoformat()
-            elif next_rep is None:
-                next_rep = now
-            
-            await db.execute(
+    now_epoch = int(time.time())
+    rows = []
+    for word in words:
+        rows.append((
+            user_id,
+            word.get('word_id'),
+            word.get('english', ''),
+            word.get('russian', ''),
+            word.get('transcription', ''),
+            word.get('picture_url', ''),
+            word.get('sound_url', ''),
+            word.get('translate_id'),
+            word.get('repetitions', 0),
+            word.get('ease_factor', 2.5),
+            word.get('interval_hours', 1.0),
+            _to_epoch(word.get('next_repetition_date'), now_epoch),
+            word.get('content_hash'),
+            now,
+            now
+        ))
+    
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT english FROM user_vocabulary WHERE user_id = ?",
+            (user_id,)
+        )
+        existing = {row[0] for row in await cursor.fetchall()}
+        incoming = {row[2] for row in rows}
+        inserted = len(incoming - existing)
+        
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            await db.executemany(
                 """
                 INSERT INTO user_vocabulary (
                     user_id, word_id, english, russian, transcription, picture_url,
                     sound_url, translate_id, repetitions, ease_factor, interval_hours,
-                    next_repetition_date, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    next_due, content_hash, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT (user_id, english) DO UPDATE SET
                     russian = excluded.russian,
                     transcription = excluded.transcription,
                     picture_url = excluded.picture_url,
                     sound_url = excluded.sound_url,
                     translate_id = excluded.translate_id,
+                    content_hash = excluded.content_hash,
                     updated_at = ?
                 """,
-                (
-                    user_id,
-                    word.get('word_id'),
-                    word.get('english', ''),
-                    word.get('russian', ''),
-                    word.get('transcription', ''),
-                    word.get('picture_url', ''),
-                    word.get('sound_url', ''),
-                    word.get('translate_id'),
-                    word.get('repetitions', 0),
-                    word.get('ease_factor', 2.5),
-                    word.get('interval_hours', 1.0),
-                    next_rep,
-                    now,
-                    now
+                rows[start:start + BULK_CHUNK_SIZE]
+            )
+        await db.commit()
+    return inserted, len(incoming) - inserted
+
+async def get_vocabulary_hashes(user_id: int) -> Dict[int, Optional[str]]:
+    """
+    Возвращает {word_id: content_hash} словаря пользователя для дельта-синхронизации.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT word_id, content_hash FROM user_vocabulary WHERE user_id = ? AND word_id IS NOT NULL",
+            (user_id,)
+        )
+        rows = await cursor.fetchall()
+        return {row['word_id']: row['content_hash'] for row in rows}
+
+async def get_sync_state(user_id: int) -> Optional[Dict[str, Any]]:
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT last_sync_at, vocabulary_digest, word_count FROM user_sync_state WHERE user_id = ?",
+            (user_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        d = dict(row)
+        if d.get('last_sync_at'):
+            try:
+                d['last_sync_at'] = datetime.fromisoformat(d['last_sync_at'])
+            except:
+                d['last_sync_at'] = None
+        return d
+
+async def _save_sync_state(db: aiosqlite.Connection, user_id: int, digest: str, word_count: int, now: str):
+    await db.execute(
+        """
+        INSERT INTO user_sync_state (user_id, last_sync_at, vocabulary_digest, word_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            last_sync_at = excluded.last_sync_at,
+            vocabulary_digest = excluded.vocabulary_digest,
+            word_count = excluded.word_count
+        """,
+        (user_id, now, digest, word_count)
+    )
+
+async def save_sync_state(user_id: int, digest: str, word_count: int) -> None:
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        await _save_sync_state(db, user_id, digest, word_count, datetime.now().isoformat())
+        await db.commit()
+
+async def apply_vocabulary_delta(user_id: int, new_words: List[Dict[str, Any]],
+                                 changed_words: List[Dict[str, Any]], removed_word_ids: List[int],
+                                 digest: str, word_count: int) -> None:
+    """
+    Применяет дельту словаря одной транзакцией: удаляет исчезнувшие слова,
+    обновляет текст измененных (прогресс SRS сохраняется), добавляет новые
+    и запоминает дайджест синхронизации.
+    """
+    now = datetime.now().isoformat()
+    now_epoch = int(time.time())
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        if removed_word_ids:
+            await db.executemany(
+                "DELETE FROM user_vocabulary WHERE user_id = ? AND word_id = ?",
+                [(user_id, word_id) for word_id in removed_word_ids]
+            )
+        if changed_words:
+            # OR IGNORE: новое написание может совпасть с другим словом пользователя
+            await db.executemany(
+                """
+                UPDATE OR IGNORE user_vocabulary
+                SET english = ?, russian = ?, content_hash = ?, updated_at = ?
+                WHERE user_id = ? AND word_id = ?
+                """,
+                [
+                    (w['english'], w['russian'], w['content_hash'], now, user_id, w['word_id'])
+                    for w in changed_words
+                ]
+            )
+            # Пропущенные из-за совпадения строки получают новый хэш с прежним
+            # текстом, иначе каждая следующая синхронизация снова сочтет их измененными
+            cursor = await db.executemany(
+                """
+                UPDATE user_vocabulary SET content_hash = ?, updated_at = ?
+                WHERE user_id = ? AND word_id = ? AND content_hash IS NOT ?
+                """,
+                [
+                    (w['content_hash'], now, user_id, w['word_id'], w['content_hash'])
+                    for w in changed_words
+                ]
+            )
+            if cursor.rowcount > 0:
+                logger.warning(
+                    f"Пользователь {user_id}: {cursor.rowcount} измененных слов совпали по написанию "
+                    f"с другими словами словаря, текст оставлен прежним"
                 )
+        for start in range(0, len(new_words), BULK_CHUNK_SIZE):
+            await db.executemany(
+                """
+                INSERT INTO user_vocabulary (
+                    user_id, word_id, english, russian, next_due, content_hash, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, english) DO UPDATE SET
+                    word_id = excluded.word_id,
+                    russian = excluded.russian,
+                    content_hash = excluded.content_hash,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (user_id, w['word_id'], w['english'], w['russian'], now_epoch, w['content_hash'], now)
+                    for w in new_words[start:start + BULK_CHUNK_SIZE]
+                ]
             )
-            count += 1
+        await _save_sync_state(db, user_id, digest, word_count, now)
         await db.commit()
-    return count
 
 async def update_word_after_training(user_id: int, english: str, correct: bool) -> None:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
             """
             SELECT repetitions, ease_factor, interval_hours
@@ -228,118 +607,222 @@ async def update_word_after_training(user_id: int, english: str, correct: bool)
         if not row:
             return
         
-        repetitions = row['repetitions']
-        ease_factor = row['ease_factor']
-        interval_hours = row['interval_hours']
-        
-        if correct:
-            repetitions += 1
-            if repetitions == 1:
-                interval_hours = 1.0
-            elif repetitions == 2:
-                interval_hours = 6.0
-            else:
-                interval_hours = interval_hours * ease_factor
-            ease_factor = max(1.3, ease_factor + 0.1)
-        else:
-            repetitions = 0
-            interval_hours = 0.5
-            ease_factor = max(1.3, ease_factor - 0.2)
+        repetitions, ease_factor, interval_hours = next_state(
+            row['repetitions'], row['ease_factor'], row['interval_hours'], correct
+        )
         
-        next_rep = datetime.now().timestamp() + (interval_hours * 3600)
-        next_rep_date = datetime.fromtimestamp(next_rep).isoformat()
+        next_due = int(time.time() + interval_hours * 3600)
         now = datetime.now().isoformat()
         
         await db.execute(
             """
             UPDATE user_vocabulary
             SET repetitions = ?, ease_factor = ?, interval_hours = ?,
-                next_repetition_date = ?, updated_at = ?
+                next_due = ?, updated_at = ?, shuffle_key = random()
             WHERE user_id = ? AND english = ?
             """,
-            (repetitions, ease_factor, interval_hours, next_rep_date, now, user_id, english)
+            (repetitions, ease_factor, interval_hours, next_due, now, user_id, english)
         )
         await db.commit()
 
-async def get_word_status(user_id: int, search_term: str) -> List[Dict[str, Any]]:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def apply_training_results(user_id: int, results: Dict[str, bool]) -> int:
+    """
+    Применяет результаты RUS-ENG сессии ({word_id: is_correct}) ко всем словам
+    одной транзакцией: один SELECT, один executemany UPDATE и один commit.
+    Возвращает количество обновленных слов.
+    """
+    if not results:
+        return 0
+    word_ids = [int(word_id) for word_id in results]
+    placeholders = ','.join('?' * len(word_ids))
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
-            """
-            SELECT english, russian, repetitions, ease_factor, interval_hours, next_repetition_date
+            f"""
+            SELECT word_id, repetitions, ease_factor, interval_hours
             FROM user_vocabulary
-            WHERE user_id = ? AND (LOWER(english) LIKE ? OR LOWER(russian) LIKE ?)
-            LIMIT 5
+            WHERE user_id = ? AND word_id IN ({placeholders})
             """,
-            (user_id, f"%{search_term.lower()}%", f"%{search_term.lower()}%")
+            (user_id, *word_ids)
         )
         rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            d = dict(row)
-            if d.get('next_repetition_date'):
-                try:
-                    d['next_repetition_date'] = datetime.fromisoformat(d['next_repetition_date'])
-                except:
-                    d['next_repetition_date'] = datetime.now()
-            result.append(d)
-        return result
-
-async def get_vocabulary_page(user_id: int, offset: int, limit: int, sort_by: str = 'alpha', due_only: bool = False) -> tuple:
-    await init_db()
-    now = datetime.now().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
-        where_clause = "WHERE user_id = ?"
-        params = [user_id]
-        if due_only:
-            where_clause += " AND next_repetition_date <= ?"
-            params.append(now)
         
-        if sort_by == 'alpha':
-            order_clause = "ORDER BY english ASC"
-        elif sort_by == 'date':
-            order_clause = "ORDER BY next_repetition_date ASC"
-        else:
-            order_clause = "ORDER BY english ASC"
+        now_epoch = time.time()
+        now = datetime.now().isoformat()
+        ids = [row['word_id'] for row in rows]
+        reps, eases, intervals = next_states(
+            [row['repetitions'] for row in rows],
+            [row['ease_factor'] for row in rows],
+            [row['interval_hours'] for row in rows],
+            [bool(results[str(word_id)]) for word_id in ids],
+        )
+        next_dues = (now_epoch + intervals * 3600).astype('int64')
+        updates = [
+            (int(r), float(e), float(i), int(d), now, user_id, word_id)
+            for word_id, r, e, i, d in zip(ids, reps, eases, intervals, next_dues)
+        ]
         
+        await db.executemany(
+            """
+            UPDATE user_vocabulary
+            SET repetitions = ?, ease_factor = ?, interval_hours = ?,
+                next_due = ?, updated_at = ?, shuffle_key = random()
+            WHERE user_id = ? AND word_id = ?
+            """,
+            updates
+        )
+        await db.commit()
+    return len(updates)
+
+async def reschedule_vocabulary(user_id: Optional[int] = None) -> int:
+    """
+    Пересчитывает интервалы и даты повторения всех слов (или слов одного
+    пользователя) по текущему алгоритму srs одной векторной операцией.
+    Нужен после изменения параметров интервального повторения.
+    Возвращает количество пересчитанных слов.
+    """
+    where_clause = "WHERE next_due IS NOT NULL"
+    params = []
+    if user_id is not None:
+        where_clause += " AND user_id = ?"
+        params.append(user_id)
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
-            f"SELECT COUNT(*) FROM user_vocabulary {where_clause}",
+            f"""
+            SELECT id, repetitions, ease_factor, interval_hours, next_due
+            FROM user_vocabulary
+            {where_clause}
+            """,
             params
         )
-        count_row = await cursor.fetchone()
-        count = count_row[0] if count_row else 0
+        rows = await cursor.fetchall()
+        if not rows:
+            return 0
         
+        new_intervals, new_dues = reschedule(
+            [row['repetitions'] or 0 for row in rows],
+            [row['ease_factor'] or 2.5 for row in rows],
+            [row['interval_hours'] or 0.0 for row in rows],
+            np.array([row['next_due'] for row in rows], dtype='int64').astype('datetime64[s]'),
+        )
+        new_dues = new_dues.astype('datetime64[s]').astype('int64')
+        now = datetime.now().isoformat()
+        updates = [
+            (float(i), int(d), now, row['id'])
+            for row, i, d in zip(rows, new_intervals, new_dues)
+        ]
+        for i in range(0, len(updates), BULK_CHUNK_SIZE):
+            await db.executemany(
+                """
+                UPDATE user_vocabulary
+                SET interval_hours = ?, next_due = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                updates[i:i + BULK_CHUNK_SIZE]
+            )
+        await db.commit()
+    logger.info(f"Расписание пересчитано для {len(updates)} слов")
+    return len(updates)
+
+async def get_word_status(user_id: int, search_term: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Поиск слов по вхождению в английский или русский текст без учета регистра.
+    Запросы от NGRAM_SIZE символов идут через индекс vocab_search (trigram),
+    более короткие - сканированием словаря пользователя. Результаты
+    ранжируются: точные совпадения, затем с начала слова, затем вхождения.
+    """
+    term = normalize_term(search_term)
+    if not term:
+        return []
+    columns = "v.english, v.russian, v.repetitions, v.ease_factor, v.interval_hours, v.next_due"
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        if _fts_enabled and len(term) >= NGRAM_SIZE:
+            cursor = await db.execute(
+                f"""
+                SELECT {columns}
+                FROM vocab_search s
+                JOIN user_vocabulary v ON v.id = s.rowid
+                WHERE vocab_search MATCH ? AND s.user_id = ?
+                """,
+                ('"' + term.replace('"', '""') + '"', user_id)
+            )
+        else:
+            cursor = await db.execute(
+                f"SELECT {columns} FROM user_vocabulary v WHERE v.user_id = ?",
+                (user_id,)
+            )
+        rows = await cursor.fetchall()
+    ranked = []
+    for row in rows:
+        rank = match_rank(term, row['english'], row['russian'])
+        if rank < 3:
+            ranked.append((rank, len(row['english']), row['english'], row))
+    ranked.sort(key=lambda item: item[:3])
+    return [_word_row(item[3]) for item in ranked[:limit]]
+
+async def get_vocabulary_count(user_id: int) -> int:
+    """Количество слов пользователя из user_vocab_stats (без COUNT по словарю)"""
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT word_count FROM user_vocab_stats WHERE user_id = ?",
+            (user_id,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+async def get_vocabulary_page(user_id: int, limit: int, sort_by: str = 'alpha', due_only: bool = False,
+                              after_english: Optional[str] = None, backward: bool = False) -> List[Dict[str, Any]]:
+    """
+    Страница словаря с keyset-пагинацией: вместо OFFSET страница начинается
+    сразу после слова after_english (или перед ним при backward=True) в
+    порядке сортировки, поэтому стоимость не зависит от номера страницы.
+    Якорь - сам ключ сортировки: english уникален в словаре пользователя.
+    Если при сортировке по дате слово-якорь удалено, возвращается пустой список.
+    """
+    keys = "next_due, english" if sort_by == 'date' else "english"
+    where_clause = "WHERE user_id = ?"
+    params = [user_id]
+    if due_only:
+        where_clause += " AND next_due <= ?"
+        params.append(int(time.time()))
+    if after_english is not None:
+        if sort_by == 'date':
+            where_clause += f"""
+            AND ({keys}) {'<' if backward else '>'} (
+                SELECT {keys} FROM user_vocabulary WHERE user_id = ? AND english = ?
+            )"""
+            params += [user_id, after_english]
+        else:
+            where_clause += f" AND english {'<' if backward else '>'} ?"
+            params.append(after_english)
+    direction = 'DESC' if backward else 'ASC'
+    order_clause = "ORDER BY " + ", ".join(f"{key} {direction}" for key in keys.split(", "))
+    
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
             f"""
-            SELECT english, russian, next_repetition_date
+            SELECT word_id, english, russian, next_due
             FROM user_vocabulary
             {where_clause}
             {order_clause}
-            LIMIT ? OFFSET ?
+            LIMIT ?
             """,
-            params + [limit, offset]
+            params + [limit]
         )
         rows = await cursor.fetchall()
-        
-        result = []
-        for row in rows:
-            d = dict(row)
-            if d.get('next_repetition_date'):
-                try:
-                    d['next_repetition_date'] = datetime.fromisoformat(d['next_repetition_date'])
-                except:
-                    d['next_repetition_date'] = datetime.now()
-            result.append(d)
-        
-        return result, count
+    words = [_word_row(row) for row in rows]
+    if backward:
+        words.reverse()
+    return words
 
 async def save_user_cookies(user_id: int, cookies: str) -> None:
-    await init_db()
+    pool = await get_pool()
     now = datetime.now().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.acquire() as db:
         await db.execute(
             """
             INSERT INTO user_cookies (user_id, cookies, updated_at)
@@ -351,8 +834,8 @@ async def save_user_cookies(user_id: int, cookies: str) -> None:
         await db.commit()
 
 async def get_user_cookies(user_id: int) -> Optional[str]:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
             "SELECT cookies FROM user_cookies WHERE user_id = ?",
             (user_id,)
@@ -361,8 +844,8 @@ async def get_user_cookies(user_id: int) -> Optional[str]:
         return row[0] if row else None
 
 async def save_training_results(user_id: int, training_type: str, results: Dict) -> None:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
+    pool = await get_pool()
+    async with pool.acquire() as db:
         await db.execute(
             """
             INSERT INTO training_results (user_id, training_type, results)
@@ -373,9 +856,8 @@ async def save_training_results(user_id: int, training_type: str, results: Dict)
         await db.commit()
 
 async def get_pending_training_results(user_id: int, training_type: str) -> Optional[Dict]:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    pool = await get_pool()
+    async with pool.acquire() as db:
         cursor = await db.execute(
             """
             SELECT id, results FROM training_results
@@ -390,16 +872,54 @@ async def get_pending_training_results(user_id: int, training_type: str) -> Opti
         return None
 
 async def delete_training_results(result_id: int) -> None:
-    await init_db()
-    async with aiosqlite.connect(DB_PATH) as db:
+    pool = await get_pool()
+    async with pool.acquire() as db:
         await db.execute(
             "DELETE FROM training_results WHERE id = ?",
             (result_id,)
         )
         await db.commit()
 
-async def close_pool():
-    pass
+async def get_fsm_record(storage_key: str, now: int) -> Optional[tuple]:
+    """Возвращает (state, data) записи FSM, если она не истекла"""
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            "SELECT state, data FROM fsm_storage WHERE storage_key = ? AND expires_at > ?",
+            (storage_key, now)
+        )
+        row = await cursor.fetchone()
+        return (row['state'], row['data']) if row else None
+
+async def save_fsm_records(upserts: List[tuple], deletes: List[str]) -> None:
+    """
+    Пакетная запись FSM одной транзакцией.
+    upserts: [(storage_key, state, data, expires_at)], deletes: [storage_key].
+    """
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        if upserts:
+            await db.executemany(
+                """
+                INSERT INTO fsm_storage (storage_key, state, data, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (storage_key) DO UPDATE SET
+                    state = excluded.state,
+                    data = excluded.data,
+                    expires_at = excluded.expires_at
+                """,
+                upserts
+            )
+        if deletes:
+            await db.executemany(
+                "DELETE FROM fsm_storage WHERE storage_key = ?",
+                [(key,) for key in deletes]
+            )
+        await db.commit()
 
-async def get_pool():
-    return None
+async def delete_expired_fsm_records(now: int) -> int:
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        cursor = await db.execute("DELETE FROM fsm_storage WHERE expires_at <= ?", (now,))
+        await db.commit()
+        return cursor.rowcount
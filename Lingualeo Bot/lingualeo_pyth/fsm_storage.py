@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import pickle
+import time
+import zlib
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+# Сколько живет сессия без активности (секунды)
+DEFAULT_TTL = 7 * 24 * 3600
+# Как часто измененные записи сбрасываются в базу (секунды)
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Наибольшая пауза между повторами, если база не принимает запись (секунды)
+MAX_FLUSH_BACKOFF = 30.0
+
+
+def serialize_data(data: Dict[str, Any]) -> bytes:
+    return zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 6)
+
+
+def deserialize_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    if not blob:
+        return {}
+    return pickle.loads(zlib.decompress(blob))
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'expires_at', 'dirty')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], expires_at: int):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+        self.dirty = False
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram поверх базы бота (db / db_sqlite).
+
+    Чтения обслуживаются из кэша в памяти, при промахе запись один раз
+    читается из таблицы fsm_storage. Изменения копятся в кэше и раз в
+    flush_interval секунд пишутся в базу одной транзакцией; close()
+    сбрасывает оставшиеся изменения. Данные хранятся как pickle + zlib,
+    каждая запись живет ttl секунд с последнего изменения.
+
+    Кэш рассчитан на то, что обновления одного пользователя обрабатывает
+    один процесс.
+    """
+
+    def __init__(self, database, ttl: int = DEFAULT_TTL, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.database = database
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(prefix='fsm', with_destiny=True)
+        self._cache: Dict[str, _Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _get_record(self, key: StorageKey) -> _Record:
+        storage_key = self.key_builder.build(key)
+        record = self._cache.get(storage_key)
+        now = int(time.time())
+        if record is not None and (record.dirty or record.expires_at > now):
+            return record
+        row = await self.database.get_fsm_record(storage_key, now)
+        record = self._cache.get(storage_key)
+        if record is not None and record.dirty:
+            # Пока читали из базы, запись успели изменить
+            return record
+        if row:
+            record = _Record(row[0], deserialize_data(row[1]), now + self.ttl)
+        else:
+            record = _Record(None, {}, now + self.ttl)
+        self._cache[storage_key] = record
+        return record
+
+    def _mark_dirty(self, record: _Record):
+        record.expires_at = int(time.time()) + self.ttl
+        record.dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Записи, измененные во время flush() или возвращенные в очередь после
+        # ошибки, сбрасывает эта же задача: _mark_dirty новую не запустит
+        delay = self.flush_interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                delay = self.flush_interval
+            except Exception as e:
+                delay = min(max(delay * 2, 1.0), MAX_FLUSH_BACKOFF)
+                logger.error(f"Ошибка записи FSM в базу: {e}; повтор через {delay:.0f} с")
+            if not any(record.dirty for record in self._cache.values()):
+                return
+
+    async def flush(self):
+        """Пишет все измененные записи в базу одной транзакцией"""
+        async with self._flush_lock:
+            upserts, deletes = [], []
+            for storage_key, record in self._cache.items():
+                if not record.dirty:
+                    continue
+                record.dirty = False
+                if record.state is None and not record.data:
+                    deletes.append(storage_key)
+                else:
+                    upserts.append((storage_key, record.state, serialize_data(record.data), record.expires_at))
+            if not upserts and not deletes:
+                return
+            try:
+                await self.database.save_fsm_records(upserts, deletes)
+            except BaseException:
+                # Вернем записи в очередь, чтобы не потерять их при следующей попытке
+                for storage_key in [u[0] for u in upserts] + deletes:
+                    if storage_key in self._cache:
+                        self._cache[storage_key].dirty = True
+                raise
+            self._evict_clean()
+            logger.debug(f"FSM сохранено в базу: {len(upserts)} записей, удалено {len(deletes)}")
+
+    def _evict_clean(self):
+        """Освобождает из кэша пустые и истекшие записи, уже сохраненные в базе"""
+        now = int(time.time())
+        stale = [
+            storage_key for storage_key, record in self._cache.items()
+            if not record.dirty and (record.expires_at <= now or (record.state is None and not record.data))
+        ]
+        for storage_key in stale:
+            del self._cache[storage_key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = await self._get_record(key)
+        record.data = data.copy()
+        self._mark_dirty(record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
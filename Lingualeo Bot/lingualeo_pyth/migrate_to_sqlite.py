@@ -33,8 +33,8 @@ async def migrate():
             print(f"  Found {len(words)} words")
             
             if words:
-                count = await sqlite_db.bulk_upsert_vocabulary(user_id, words)
-                print(f"  Migrated {count} words to SQLite")
+                inserted, updated = await sqlite_db.bulk_upsert_vocabulary(user_id, words)
+                print(f"  Migrated {inserted + updated} words to SQLite ({inserted} new, {updated} updated)")
             
             cookies = await pg_db.get_user_cookies(user_id)
             if cookies:
@@ -51,6 +51,7 @@ async def migrate():
                 print(f"  Migrated training results for user {user_id}")
     
     await pg_db.close_pool()
+    await sqlite_db.close_pool()
     print("\nMigration complete!")
     print(f"SQLite database saved to: {sqlite_db.DB_PATH}")
 
@@ -0,0 +1,273 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, List, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageReplyMarkup, EditMessageText, GetUpdates
+
+logger = logging.getLogger(__name__)
+
+# Ответы на действия пользователя отправляются раньше фоновых уведомлений
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Сколько раз повторять запрос после 429 Too Many Requests
+MAX_RETRIES = 5
+
+# Правки одного сообщения, которые можно схлопнуть: в очереди остается последняя
+COLLAPSIBLE_METHODS = (EditMessageText, EditMessageReplyMarkup, EditMessageCaption)
+
+_send_priority: ContextVar[int] = ContextVar('send_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def bulk_priority():
+    """Запросы к Telegram внутри блока идут с низким приоритетом (фоновые уведомления)"""
+    token = _send_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _send_priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity; block() - пауза после 429"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 - уже есть)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 0
+
+
+class _Pending:
+    __slots__ = ('chat_id', 'priority', 'seq', 'collapse_key', 'grant', 'outcome', 'superseded_by')
+
+    def __init__(self, chat_id: Any, priority: int, seq: int, collapse_key: Optional[Hashable]):
+        loop = asyncio.get_running_loop()
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq
+        self.collapse_key = collapse_key
+        # grant: True - можно отправлять, False - запрос заменен более новым
+        self.grant: asyncio.Future = loop.create_future()
+        # outcome: ответ Telegram (или ошибка) для запросов, которые этот заменил
+        self.outcome: asyncio.Future = loop.create_future()
+        self.outcome.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.superseded_by: Optional['_Pending'] = None
+
+
+class SendScheduler:
+    """
+    Очередь исходящих запросов к Telegram с общим лимитом и лимитом на чат.
+
+    Запрос ждет токен общей корзины (~30 сообщений в секунду на бота) и
+    корзины своего чата (личный чат - около 1 сообщения в секунду, группа -
+    20 в минуту). Из ожидающих первым получает токен запрос с более высоким
+    приоритетом, внутри приоритета - более ранний. Правка сообщения,
+    ожидающая отправки, заменяется более новой правкой того же сообщения.
+    """
+
+    def __init__(self, global_rate: float = 30.0, global_burst: Optional[float] = None,
+                 chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_rate: float = 20 / 60, group_burst: float = 3.0):
+        self.global_rate = global_rate
+        # По умолчанию общий запас - одна секунда лимита
+        self.global_burst = global_burst or global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._pending: List[_Pending] = []
+        self._latest: Dict[Hashable, _Pending] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.collapsed = 0
+
+    def _chat_bucket(self, chat_id: Any, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id и @username - группы и каналы
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            rate, burst = (self.group_rate, self.group_burst) if is_group else (self.chat_rate, self.chat_burst)
+            bucket = self._chats[chat_id] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def submit(self, chat_id: Any, priority: int, collapse_key: Optional[Hashable] = None,
+               seq: Optional[int] = None) -> _Pending:
+        """Ставит запрос в очередь; результат - entry.grant"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._global = self._global or TokenBucket(self.global_rate, self.global_burst, time.monotonic())
+            self._task = asyncio.create_task(self._run())
+        entry = _Pending(chat_id, priority, next(self._seq) if seq is None else seq, collapse_key)
+        if collapse_key is not None:
+            previous = self._latest.get(collapse_key)
+            if previous is not None and not previous.grant.done():
+                previous.superseded_by = entry
+                previous.grant.set_result(False)
+                self._pending.remove(previous)
+                self.collapsed += 1
+            self._latest[collapse_key] = entry
+        self._pending.append(entry)
+        self._wakeup.set()
+        return entry
+
+    def release(self, entry: _Pending):
+        """Запрос завершен: больше не заменяется новыми правками"""
+        if entry.collapse_key is not None and self._latest.get(entry.collapse_key) is entry:
+            del self._latest[entry.collapse_key]
+
+    def block(self, chat_id: Any, seconds: float):
+        """Пауза после 429: для чата или (без chat_id) для всех запросов"""
+        until = time.monotonic() + seconds
+        if chat_id is None:
+            self._global.block(until)
+        else:
+            self._chat_bucket(chat_id, time.monotonic()).block(until)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            wait = None
+            global_delay = self._global.delay(now)
+            if self._pending and global_delay > 0:
+                wait = global_delay
+            elif self._pending:
+                # Ожидание, отмененное вызывающим, токен не получает
+                self._pending = [entry for entry in self._pending if not entry.grant.done()]
+                self._pending.sort(key=lambda e: (e.priority, e.seq))
+                for entry in self._pending:
+                    delay = self._chat_bucket(entry.chat_id, now).delay(now)
+                    if delay == 0:
+                        self._global.take()
+                        self._chats[entry.chat_id].take()
+                        self._pending.remove(entry)
+                        entry.grant.set_result(True)
+                        wait = 0
+                        break
+                    wait = delay if wait is None else min(wait, delay)
+            if wait == 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: все запросы с chat_id проходят через SendScheduler,
+    а 429 Too Many Requests не доходят до обработчиков - запрос ждет
+    retry_after и повторяется (до MAX_RETRIES раз).
+    """
+
+    def __init__(self, scheduler: SendScheduler, max_retries: int = MAX_RETRIES):
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        # Повторы после 429 (для метрик)
+        self.retries = 0
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await self._with_retries(make_request, bot, method)
+
+        collapse_key = None
+        if isinstance(method, COLLAPSIBLE_METHODS) and method.message_id is not None:
+            collapse_key = (type(method).__name__, chat_id, method.message_id)
+        entry = self.scheduler.submit(chat_id, _send_priority.get(), collapse_key)
+        try:
+            return await self._send(make_request, bot, method, entry)
+        finally:
+            self.scheduler.release(entry)
+            if not entry.outcome.done():
+                # Вызов отменен до ответа: замененные им правки отправятся сами (см. _send)
+                entry.outcome.cancel()
+
+    async def _send(self, make_request, bot, method, entry: _Pending):
+        if not await entry.grant:
+            # Правку заменила более новая: ее результат и есть итог этой
+            newer = entry.superseded_by
+            try:
+                response = await asyncio.shield(newer.outcome)
+            except asyncio.CancelledError:
+                if not newer.outcome.cancelled():
+                    raise
+                # Более новую правку отменили до ответа: отправляем эту сами
+                retry = self.scheduler.submit(entry.chat_id, entry.priority, seq=entry.seq)
+                await retry.grant
+            except Exception as e:
+                entry.outcome.set_exception(e)
+                raise
+            else:
+                entry.outcome.set_result(response)
+                return response
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    entry.outcome.set_exception(e)
+                    raise
+                logger.warning(f"429 в чате {entry.chat_id}: ждем {e.retry_after} с (попытка {attempt + 1})")
+                self.retries += 1
+                self.scheduler.block(entry.chat_id, e.retry_after)
+                # Повтор сохраняет место в очереди: тот же приоритет и номер
+                retry = self.scheduler.submit(entry.chat_id, entry.priority, seq=entry.seq)
+                await retry.grant
+                continue
+            except Exception as e:
+                entry.outcome.set_exception(e)
+                raise
+            entry.outcome.set_result(response)
+            return response
+
+    async def _with_retries(self, make_request, bot, method):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"429 на {type(method).__name__}: ждем {e.retry_after} с")
+                self.retries += 1
+                await asyncio.sleep(e.retry_after)
@@ -0,0 +1,174 @@
+"""
+Стенд для send_scheduler: бот с поддельной сессией, которая вместо Telegram
+применяет его лимиты (общий и на чат) и отвечает 429 retry_after при
+превышении.
+
+Нагрузка - всплеск, как при массовой тренировке:
+  - фоновые уведомления (bulk_priority) в --bulk-chats чатов;
+  - ответы пользователям (по --answers сообщения в --chats чатов);
+  - --edits правок одного сообщения подряд (прогресс, карточка тренировки).
+
+Прогон без планировщика показывает, сколько 429 дошло бы до обработчиков,
+прогон с RateLimitMiddleware - пропускную способность, задержки ответов и
+уведомлений и число схлопнутых правок.
+
+Запуск: python send_scheduler_harness.py [--chats 40] [--bulk-chats 150]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Chat, Message
+
+from send_scheduler import RateLimitMiddleware, SendScheduler, TokenBucket, bulk_priority
+
+
+class FakeTelegramSession(BaseSession):
+    """Сессия с лимитами Telegram: общий global_rate/с и chat_rate/с с запасом chat_burst на чат"""
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate, time.monotonic())
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.delivered: List[float] = []
+        self.rejected = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        chat_id = method.chat_id
+        chat = self.chat_buckets.get(chat_id)
+        if chat is None:
+            chat = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        if self.global_bucket.delay(now) > 0 or chat.delay(now) > 0:
+            self.rejected += 1
+            raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=1)
+        self.global_bucket.take()
+        chat.take()
+        self.delivered.append(now)
+        return Message(
+            message_id=getattr(method, 'message_id', None) or len(self.delivered),
+            date=int(time.time()),
+            chat=Chat(id=chat_id, type='private'),
+            text=getattr(method, 'text', None),
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def run(args, with_scheduler: bool) -> dict:
+    session = FakeTelegramSession(args.global_rate, args.chat_rate, args.chat_burst, args.latency)
+    scheduler = SendScheduler(global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=args.chat_burst)
+    if with_scheduler:
+        session.middleware(RateLimitMiddleware(scheduler))
+    bot = Bot(token='123456:HARNESS', session=session)
+    latencies = defaultdict(list)
+    errors = 0
+
+    async def send(kind: str, coro_factory):
+        nonlocal errors
+        start = time.monotonic()
+        try:
+            await coro_factory()
+        except TelegramRetryAfter:
+            errors += 1
+            return
+        latencies[kind].append(time.monotonic() - start)
+
+    async def bulk(chat_id: int):
+        with bulk_priority():
+            await send('bulk', lambda: bot.send_message(chat_id, 'Сервер принял результаты тренировки'))
+
+    async def interactive(chat_id: int):
+        for i in range(args.answers):
+            await send('interactive', lambda: bot.send_message(chat_id, f'Ответ {i + 1}'))
+
+    async def edits(chat_id: int):
+        pending = [
+            asyncio.create_task(send('edit', lambda n=n: bot.edit_message_text(f'Карточка {n}', chat_id=chat_id, message_id=1)))
+            for n in range(args.edits)
+        ]
+        await asyncio.gather(*pending)
+
+    started = time.monotonic()
+    await asyncio.gather(
+        *(bulk(1_000_000 + i) for i in range(args.bulk_chats)),
+        *(interactive(i + 1) for i in range(args.chats)),
+        edits(999),
+    )
+    elapsed = time.monotonic() - started
+    await scheduler.close()
+    return {
+        'elapsed': elapsed,
+        'delivered': len(session.delivered),
+        'rejected': session.rejected,
+        'errors': errors,
+        'collapsed': scheduler.collapsed,
+        'latencies': latencies,
+    }
+
+
+def report(name: str, result: dict):
+    elapsed = result['elapsed']
+    print(f"\n{name}")
+    print(f"  доставлено {result['delivered']} за {elapsed:.2f} с ({result['delivered'] / elapsed:.1f} сообщ./с)")
+    print(f"  429 от сервера: {result['rejected']}, ошибок у вызывающих: {result['errors']}, "
+          f"схлопнуто правок: {result['collapsed']}")
+    for kind in ('interactive', 'bulk', 'edit'):
+        values = result['latencies'][kind]
+        if values:
+            print(f"  {kind:>11}: p50 {percentile(values, 0.5):.2f} с, p95 {percentile(values, 0.95):.2f} с, "
+                  f"max {max(values):.2f} с ({len(values)} шт.)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=40, help='Пользователей, получающих ответы')
+    parser.add_argument('--answers', type=int, default=3, help='Ответов каждому пользователю подряд')
+    parser.add_argument('--bulk-chats', type=int, default=150, help='Фоновых уведомлений (по одному на чат)')
+    parser.add_argument('--edits', type=int, default=20, help='Правок одного сообщения')
+    parser.add_argument('--global-rate', type=float, default=30.0, help='Общий лимит, сообщ./с')
+    parser.add_argument('--chat-rate', type=float, default=1.0, help='Лимит на чат, сообщ./с')
+    parser.add_argument('--chat-burst', type=float, default=3.0, help='Запас сообщений на чат')
+    parser.add_argument('--latency', type=float, default=0.02, help='Задержка поддельного сервера, с')
+    args = parser.parse_args()
+
+    report("Без планировщика", await run(args, with_scheduler=False))
+    result = await run(args, with_scheduler=True)
+    report("С RateLimitMiddleware", result)
+
+    # 429 из-за разброса задержек допустимы: планировщик повторяет их сам
+    expected = args.chats * args.answers + args.bulk_chats + args.edits - result['collapsed']
+    ok = result['errors'] == 0 and result['delivered'] == expected
+    interactive, bulk = result['latencies']['interactive'], result['latencies']['bulk']
+    if interactive and bulk:
+        ok &= percentile(interactive, 0.5) <= percentile(bulk, 0.5)
+    print("\nПроверка пройдена" if ok else "\nПроверка НЕ пройдена")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед первым повтором и верхняя граница задержки (секунды)
+BASE_DELAY = 5.0
+MAX_DELAY = 600.0
+# Сколько попыток подряд делать, прежде чем сообщить об ошибке и ждать новой сессии
+MAX_ATTEMPTS = 8
+# Сколько wait_sent ждет отправки по умолчанию (секунды)
+WAIT_TIMEOUT = 15.0
+# Как часто wait_sent проверяет очередь пользователя (секунды)
+WAIT_POLL_INTERVAL = 0.5
+
+
+class SubmissionError(Exception):
+    """Сервер принял запрос, но не подтвердил сохранение (статус не ok)"""
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Временная ли ошибка: сеть, таймаут, 5xx/429 или ответ без статуса ok.
+    Нет cookies (ValueError), 401 и прочие 4xx повтором не исправить.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, (httpx.TransportError, SubmissionError, asyncio.TimeoutError))
+
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY, cap: float = MAX_DELAY) -> float:
+    """Экспоненциальная задержка перед попыткой attempt (с 1) со случайным разбросом 50-100%"""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class SubmissionQueue:
+    """
+    Очередь отправки результатов ENG-RUS тренировки на сервер (write-behind).
+
+    enqueue() сливает ответы сессии в файл пользователя <directory>/<user_id>.json
+    ({"words": {word_id: translate_id}, "labels": {word_id: подпись}}) и сразу
+    возвращается; отправкой занимается фоновая задача пользователя. Несколько
+    сессий, ожидающих отправки, уходят одним запросом word_set_repetition.
+    Временные ошибки повторяются с экспоненциальной задержкой и разбросом,
+    после успеха из файла удаляются только отправленные ответы. Файлы
+    переживают перезапуск: start() возобновляет отправку всего, что осталось.
+
+    submit(user_id, words) отправляет ответы и возвращает ответ сервера;
+    on_status(user_id, labels, response, error) сообщает итог попытки -
+    response при успехе или error, когда повторы прекращены.
+    """
+
+    def __init__(self, directory: str,
+                 submit: Callable[[int, Dict[str, Any]], Awaitable[dict]],
+                 on_status: Optional[Callable[[int, Dict[str, str], Optional[dict], Optional[Exception]], Awaitable[None]]] = None,
+                 base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.directory = directory
+        self.submit = submit
+        self.on_status = on_status
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Прерывают ожидание перед повтором (см. wait_sent)
+        self._wakeups: Dict[int, asyncio.Event] = {}
+        self._lock = asyncio.Lock()
+        # Повторы после временных ошибок и остановленные отправки (для метрик)
+        self.retries = 0
+        self.failures = 0
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"{user_id}.json")
+
+    def _load(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return {'words': {}, 'labels': {}}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Не удалось прочитать очередь отправки {path}: {e}")
+            return {'words': {}, 'labels': {}}
+        entry.setdefault('words', {})
+        entry.setdefault('labels', {})
+        return entry
+
+    def _save(self, user_id: int, entry: Dict[str, Dict[str, Any]]):
+        path = self._path(user_id)
+        if not entry['words']:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _merge(self, user_id: int, words: Dict[str, Any], labels: Dict[str, str]) -> int:
+        entry = self._load(user_id)
+        entry['words'].update({str(word_id): value for word_id, value in words.items()})
+        entry['labels'].update({str(word_id): label for word_id, label in labels.items()})
+        self._save(user_id, entry)
+        return len(entry['words'])
+
+    def _remove_sent(self, user_id: int, sent: Dict[str, Any]):
+        entry = self._load(user_id)
+        for word_id, value in sent.items():
+            # Ответ, измененный новой сессией во время отправки, остается в очереди
+            if entry['words'].get(word_id) == value:
+                del entry['words'][word_id]
+                entry['labels'].pop(word_id, None)
+        self._save(user_id, entry)
+
+    def pending(self, user_id: int) -> int:
+        """Количество ответов пользователя, ожидающих отправки"""
+        return len(self._load(user_id)['words'])
+
+    async def enqueue(self, user_id: int, words: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> int:
+        """
+        Сохраняет ответы на диск и запускает отправку, если она еще не идет.
+        Возвращает количество ответов пользователя в очереди.
+        """
+        async with self._lock:
+            total = await asyncio.to_thread(self._merge, user_id, words, labels or {})
+            self._schedule(user_id)
+        logger.info(f"В очередь отправки добавлено {len(words)} ответов пользователя {user_id}, всего {total}")
+        return total
+
+    def _schedule(self, user_id: int):
+        if user_id not in self._tasks:
+            self._tasks[user_id] = asyncio.create_task(self._drain(user_id))
+
+    async def start(self, owns_user: Optional[Callable[[int], bool]] = None):
+        """
+        Возобновляет отправку очередей, оставшихся с прошлого запуска.
+        owns_user ограничивает пользователей, если процессов несколько.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        async with self._lock:
+            for name in os.listdir(self.directory):
+                user_id, ext = os.path.splitext(name)
+                if ext == '.json' and user_id.lstrip('-').isdigit():
+                    if owns_user is None or owns_user(int(user_id)):
+                        self._schedule(int(user_id))
+        if self._tasks:
+            logger.info(f"Возобновлена отправка очередей результатов: {len(self._tasks)} пользователей")
+
+    async def _drain(self, user_id: int):
+        attempt = 0
+        while True:
+            async with self._lock:
+                entry = await asyncio.to_thread(self._load, user_id)
+                if not entry['words']:
+                    self._tasks.pop(user_id, None)
+                    self._wakeups.pop(user_id, None)
+                    return
+            words, labels = entry['words'], entry['labels']
+            try:
+                response = await self.submit(user_id, words)
+                if not response or response.get('status') != 'ok':
+                    raise SubmissionError(f"ответ сервера: {response}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                if not is_transient(e) or attempt >= self.max_attempts:
+                    logger.error(f"Отправка результатов пользователя {user_id} остановлена после {attempt} попыток: {e}")
+                    self.failures += 1
+                    async with self._lock:
+                        self._tasks.pop(user_id, None)
+                        self._wakeups.pop(user_id, None)
+                    await self._report(user_id, labels, None, e)
+                    return
+                self.retries += 1
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logger.warning(f"Отправка результатов пользователя {user_id} не удалась (попытка {attempt}): {e}; повтор через {delay:.1f} с")
+                wakeup = self._wakeups.setdefault(user_id, asyncio.Event())
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            attempt = 0
+            async with self._lock:
+                await asyncio.to_thread(self._remove_sent, user_id, words)
+            logger.info(f"Отправлено {len(words)} ответов пользователя {user_id}")
+            await self._report(user_id, {word_id: labels.get(word_id, word_id) for word_id in words}, response, None)
+
+    async def wait_sent(self, user_id: int, timeout: float = WAIT_TIMEOUT) -> bool:
+        """
+        Ждет (не дольше timeout), пока ответы пользователя не уйдут на сервер.
+        Отложенный повтор выполняется сразу, остановленная после ошибок
+        отправка запускается заново. True - в очереди пользователя ничего нет.
+        """
+        if not await asyncio.to_thread(self.pending, user_id):
+            return True
+        async with self._lock:
+            self._schedule(user_id)
+        wakeup = self._wakeups.get(user_id)
+        if wakeup is not None:
+            wakeup.set()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(WAIT_POLL_INTERVAL, remaining))
+            if not await asyncio.to_thread(self.pending, user_id):
+                return True
+
+    async def _report(self, user_id: int, labels: Dict[str, str], response: Optional[dict], error: Optional[Exception]):
+        if self.on_status is None:
+            return
+        try:
+            await self.on_status(user_id, labels, response, error)
+        except Exception as e:
+            logger.warning(f"Не удалось сообщить о статусе отправки пользователю {user_id}: {e}")
+
+    async def close(self):
+        """Останавливает фоновые отправки; неотправленное остается на диске"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
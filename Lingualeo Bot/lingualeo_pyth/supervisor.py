@@ -0,0 +1,249 @@
+"""
+Супервизор многопроцессного режима бота.
+
+Запускает N процессов-воркеров tg_bot и сам принимает обновления Telegram
+(long polling или webhook из WEBHOOK_SETTINGS). Каждое обновление уходит
+воркеру по from_user.id, поэтому все обновления пользователя обрабатывает
+один процесс: его FSM, cookies, журналы тренировок, очередь отправки и
+кэши в памяти не делятся между процессами. Обновления одного пользователя
+пересылаются строго по очереди (следующее - после обработки предыдущего),
+разных пользователей - параллельно.
+
+Общее хранилище FSM - база (PostgreSQL или SQLite в режиме WAL); схема
+применяется один раз супервизором до запуска воркеров.
+
+Запуск: python supervisor.py [--workers N] [--base-port 8100]
+Упавший воркер перезапускается; его обновления ждут перезапуска.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tg_bot
+
+logger = logging.getLogger('supervisor')
+
+# Порт первого воркера; воркер i слушает 127.0.0.1:BASE_PORT + i
+BASE_PORT = 8100
+# Long polling getUpdates (секунды)
+POLL_TIMEOUT = 30
+# Пауза перед перезапуском упавшего воркера и между повторами пересылки (секунды)
+RESTART_DELAY = 1.0
+# Сколько пытаться переслать обновление воркеру, который не отвечает (секунды)
+FORWARD_RETRY_SECONDS = 60.0
+
+
+def update_user_id(update: dict) -> Optional[int]:
+    """
+    Пользователь, от которого пришло обновление (from.id / user.id),
+    или чат, если пользователя нет. None - обновление без отправителя.
+    """
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return int(user['id'])
+        chat = event.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return int(chat['id'])
+    return None
+
+
+def shard_for(user_id: int, workers: int) -> int:
+    """Номер воркера пользователя"""
+    return user_id % workers
+
+
+class Supervisor:
+    def __init__(self, workers: int, base_port: int = BASE_PORT):
+        self.workers = workers
+        self.base_port = base_port
+        # Секрет между супервизором и воркерами, новый на каждый запуск
+        self.secret = secrets.token_urlsafe(32)
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self._watchers: List[asyncio.Task] = []
+        # Последняя пересылка каждого пользователя: следующая ждет ее завершения
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stopping = False
+
+    def worker_url(self, index: int) -> str:
+        return f"http://127.0.0.1:{self.base_port + index}{tg_bot.WEBHOOK_SETTINGS['path']}"
+
+    async def _spawn(self, index: int) -> asyncio.subprocess.Process:
+        env = dict(
+            os.environ,
+            LINGUALEO_WORKER_INDEX=str(index),
+            LINGUALEO_WORKERS=str(self.workers),
+            LINGUALEO_WORKER_SECRET=self.secret,
+        )
+        return await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__),
+            '--worker', str(index), '--workers', str(self.workers),
+            '--base-port', str(self.base_port),
+            env=env,
+        )
+
+    async def _watch(self, index: int):
+        """Держит воркер index запущенным"""
+        while not self._stopping:
+            process = self._processes[index] = await self._spawn(index)
+            logger.info(f"Воркер {index} запущен (pid {process.pid}, порт {self.base_port + index})")
+            code = await process.wait()
+            if self._stopping:
+                return
+            logger.error(f"Воркер {index} завершился с кодом {code}, перезапуск через {RESTART_DELAY} с")
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=5))
+        self._watchers = [asyncio.create_task(self._watch(i)) for i in range(self.workers)]
+
+    def dispatch(self, update: dict):
+        """Ставит обновление в очередь пересылки его пользователя"""
+        user_id = update_user_id(update)
+        key = user_id if user_id is not None else update.get('update_id', 0)
+        index = shard_for(key, self.workers)
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._forward(index, update, previous))
+        self._tails[key] = task
+
+        def release(done: asyncio.Task):
+            if self._tails.get(key) is done:
+                del self._tails[key]
+        task.add_done_callback(release)
+
+    async def _forward(self, index: int, update: dict, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            # Предыдущее обновление пользователя должно быть обработано первым
+            await asyncio.gather(previous, return_exceptions=True)
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.secret}
+        deadline = time.monotonic() + FORWARD_RETRY_SECONDS
+        while True:
+            try:
+                async with self._session.post(self.worker_url(index), json=update, headers=headers) as response:
+                    if response.status >= 400:
+                        logger.error(f"Воркер {index} вернул {response.status} на обновление {update.get('update_id')}")
+                    return
+            except aiohttp.ClientConnectionError as e:
+                # Воркер еще запускается или перезапускается после падения
+                if self._stopping or time.monotonic() >= deadline:
+                    logger.error(f"Обновление {update.get('update_id')} не доставлено воркеру {index}: {e}")
+                    return
+                await asyncio.sleep(RESTART_DELAY)
+
+    async def poll(self, bot):
+        """Получает обновления long polling и раздает их воркерам"""
+        await bot.delete_webhook()
+        allowed_updates = tg_bot.dp.resolve_used_update_types()
+        offset = None
+        logger.info(f"Супервизор: long polling, воркеров {self.workers}")
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates,
+                    request_timeout=POLL_TIMEOUT + 10,
+                )
+            except Exception as e:
+                logger.warning(f"Ошибка getUpdates: {e}")
+                await asyncio.sleep(RESTART_DELAY)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                self.dispatch(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+
+    async def serve_webhook(self, bot):
+        """Принимает обновления webhook и раздает их воркерам"""
+        settings = tg_bot.WEBHOOK_SETTINGS
+
+        async def handle(request: web.Request) -> web.Response:
+            if settings['secret'] and not secrets.compare_digest(
+                request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), settings['secret']
+            ):
+                return web.Response(status=401)
+            self.dispatch(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(settings['path'], handle)
+
+        async def register_webhook():
+            await bot.set_webhook(
+                settings['url'] + settings['path'],
+                secret_token=settings['secret'] or None,
+                allowed_updates=tg_bot.dp.resolve_used_update_types(),
+            )
+            logger.info(f"Супервизор: webhook {settings['url']}{settings['path']}, воркеров {self.workers}")
+
+        await tg_bot.serve_app(app, settings['host'], settings['port'], register_webhook)
+
+    async def stop(self):
+        self._stopping = True
+        for process in self._processes:
+            if process is not None and process.returncode is None:
+                process.terminate()
+        await asyncio.gather(*self._watchers, return_exceptions=True)
+        for process in self._processes:
+            if process is not None:
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    process.kill()
+        if self._session is not None:
+            await self._session.close()
+
+
+async def prepare_storage():
+    """Применяет схему базы один раз, чтобы воркеры не выполняли миграции одновременно"""
+    if tg_bot.USE_DATABASE:
+        await tg_bot.database.get_pool()
+        await tg_bot.database.close_pool()
+
+
+async def run_supervisor(workers: int, base_port: int):
+    tg_bot.check_and_create_pid_file()
+    await prepare_storage()
+    supervisor = Supervisor(workers, base_port)
+    await supervisor.start()
+    try:
+        if tg_bot.WEBHOOK_SETTINGS['url']:
+            await supervisor.serve_webhook(tg_bot.bot)
+        else:
+            await supervisor.poll(tg_bot.bot)
+    finally:
+        await supervisor.stop()
+        await tg_bot.bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Количество процессов-воркеров')
+    parser.add_argument('--base-port', type=int, default=BASE_PORT, help='Порт первого воркера (127.0.0.1)')
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is None:
+        asyncio.run(run_supervisor(args.workers, args.base_port))
+        return
+
+    index, workers = args.worker, args.workers
+    asyncio.run(tg_bot.run_worker(
+        args.base_port + index,
+        os.environ['LINGUALEO_WORKER_SECRET'],
+        lambda user_id: shard_for(user_id, workers) == index,
+    ))
+
+
+if __name__ == "__main__":
+    main()
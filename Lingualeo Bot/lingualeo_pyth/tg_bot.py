@@ -3,8 +3,11 @@ import os
 import asyncio
 import logging
 import json
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Callable, Optional
 import atexit
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "").strip()
@@ -22,25 +25,51 @@ if str(current_dir) not in sys.path:
     sys.path.insert(0, str(current_dir))
 
 # Импортируем необходимые библиотеки
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.types import (
+    Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 
 # Импортируем локальные модули с fallback для разных способов запуска
 try:
     # Пробуем относительные импорты (если запущено как модуль)
     from . import keys
-    from ..api_client import LingualeoAPIClient, fix_process_training_answer_batch
-    from ..config import get_user_cookies_path, get_global_cookies_path
+    from .answer_journal import get_journal
+    from .fsm_storage import DatabaseStorage
+    from .training_prefetch import PrefetchCache, fingerprint
+    from .submission_queue import SubmissionQueue
+    from .send_scheduler import SendScheduler, RateLimitMiddleware, bulk_priority
+    from ..api_client import LingualeoAPIClient, fix_process_training_answer_batch_async
+    from ..config import get_user_cookies_path, get_global_cookies_path, WEBHOOK_SETTINGS, TELEGRAM_RATE_LIMITS, TRAINING_CARD_EDIT_IN_PLACE, METRICS_SETTINGS, ADMIN_IDS
+    from ..http_transport import close_async_client
+    from ..metrics import REGISTRY, HandlerMetricsMiddleware, instrument_module, latency_rows
+    from ..csv_vocab import update_vocabulary_file, sorted_vocabulary, search_vocabulary, prefix_index
+    from ..search_index import PrefixIndex
+    from ..vocab_sync import normalize_export_words_async, vocabulary_digest, diff_vocabulary, VocabularyDelta, frame_vocabulary_hashes, merge_delta_into_frame
 except ImportError:
     try:
         # Пробуем абсолютные импорты из родительской директории
         import keys
-        from api_client import LingualeoAPIClient, fix_process_training_answer_batch
-        from config import get_user_cookies_path, get_global_cookies_path
+        from answer_journal import get_journal
+        from fsm_storage import DatabaseStorage
+        from training_prefetch import PrefetchCache, fingerprint
+        from submission_queue import SubmissionQueue
+        from send_scheduler import SendScheduler, RateLimitMiddleware, bulk_priority
+        from api_client import LingualeoAPIClient, fix_process_training_answer_batch_async
+        from config import get_user_cookies_path, get_global_cookies_path, WEBHOOK_SETTINGS, TELEGRAM_RATE_LIMITS, TRAINING_CARD_EDIT_IN_PLACE, METRICS_SETTINGS, ADMIN_IDS
+        from http_transport import close_async_client
+        from metrics import REGISTRY, HandlerMetricsMiddleware, instrument_module, latency_rows
+        from csv_vocab import update_vocabulary_file, sorted_vocabulary, search_vocabulary, prefix_index
+        from search_index import PrefixIndex
+        from vocab_sync import normalize_export_words_async, vocabulary_digest, diff_vocabulary, VocabularyDelta, frame_vocabulary_hashes, merge_delta_into_frame
     except ImportError:
         # Fallback: добавляем текущую директорию в путь и пробуем снова
         current_dir = Path(__file__).parent
@@ -52,8 +81,18 @@ except ImportError:
             sys.path.insert(0, str(parent_dir))
 
         import keys
-        from api_client import LingualeoAPIClient, fix_process_training_answer_batch
-        from config import get_user_cookies_path, get_global_cookies_path
+        from answer_journal import get_journal
+        from fsm_storage import DatabaseStorage
+        from training_prefetch import PrefetchCache, fingerprint
+        from submission_queue import SubmissionQueue
+        from send_scheduler import SendScheduler, RateLimitMiddleware, bulk_priority
+        from api_client import LingualeoAPIClient, fix_process_training_answer_batch_async
+        from config import get_user_cookies_path, get_global_cookies_path, WEBHOOK_SETTINGS, TELEGRAM_RATE_LIMITS, TRAINING_CARD_EDIT_IN_PLACE, METRICS_SETTINGS, ADMIN_IDS
+        from http_transport import close_async_client
+        from metrics import REGISTRY, HandlerMetricsMiddleware, instrument_module, latency_rows
+        from csv_vocab import update_vocabulary_file, sorted_vocabulary, search_vocabulary, prefix_index
+        from search_index import PrefixIndex
+        from vocab_sync import normalize_export_words_async, vocabulary_digest, diff_vocabulary, VocabularyDelta, frame_vocabulary_hashes, merge_delta_into_frame
 
 if USE_POSTGRESQL:
     try:
@@ -79,7 +118,10 @@ current_dir = Path(__file__).parent
 logs_dir = current_dir / 'logs'
 logs_dir.mkdir(exist_ok=True)
 
-log_filename = f"bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+# Воркеры supervisor.py пишут каждый в свой файл
+worker_index = os.environ.get('LINGUALEO_WORKER_INDEX')
+log_suffix = f"_w{worker_index}" if worker_index else ""
+log_filename = f"bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}{log_suffix}.log"
 log_path = logs_dir / log_filename
 
 # Создаем форматтер с более подробной информацией
@@ -106,8 +148,26 @@ logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
 bot = Bot(token=keys.token)
-storage = MemoryStorage()
+# Исходящие запросы идут через очередь с лимитами Telegram; воркеры
+# supervisor.py делят общий лимит бота поровну
+send_scheduler = SendScheduler(
+    global_rate=TELEGRAM_RATE_LIMITS['global_rate'] / int(os.environ.get('LINGUALEO_WORKERS', '1')),
+    chat_rate=TELEGRAM_RATE_LIMITS['chat_rate'],
+    chat_burst=TELEGRAM_RATE_LIMITS['chat_burst'],
+    group_rate=TELEGRAM_RATE_LIMITS['group_rate'],
+)
+rate_limit_middleware = RateLimitMiddleware(send_scheduler)
+bot.session.middleware(rate_limit_middleware)
+# Замеры вызовов базы (в т.ч. из DatabaseStorage) для /metrics и /stats
+if USE_DATABASE:
+    instrument_module(database, exclude=('get_pool', 'close_pool', 'init_db'))
+# FSM хранится в базе, чтобы тренировки переживали перезапуск бота
+storage = DatabaseStorage(database) if USE_DATABASE else MemoryStorage()
 dp = Dispatcher(storage=storage)
+# Время обработки: всего обновления и каждого обработчика по имени
+dp.update.outer_middleware(HandlerMetricsMiddleware('lingualeo_update_seconds'))
+for observer in (dp.message, dp.callback_query, dp.inline_query):
+    observer.middleware(HandlerMetricsMiddleware())
 
 # Определение состояний
 class Form(StatesGroup):
@@ -120,6 +180,70 @@ class Form(StatesGroup):
     waiting_for_server_response_confirmation = State()
     waiting_for_final_confirmation = State()
 
+async def run_blocking(func, *args, **kwargs):
+    """
+    Выполняет синхронный код (pandas, файловый ввод-вывод) в пуле потоков,
+    чтобы не блокировать event loop диспетчера для остальных пользователей.
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+# Сколько индексов inline-поиска держать в памяти (режим базы данных); вытесняется
+# давно не искавший пользователь, его индекс строится заново при следующем запросе
+INLINE_INDEX_CACHE_SIZE = 200
+
+# Индексы inline-поиска пользователей: user_id -> задача построения PrefixIndex, в порядке обращений
+inline_index_tasks: "OrderedDict[int, asyncio.Task]" = OrderedDict()
+
+async def build_inline_index(user_id: int) -> PrefixIndex:
+    words = await database.get_user_vocabulary(user_id)
+    logger.info(f"Построен индекс inline-поиска пользователя {user_id}: {len(words)} слов")
+    return PrefixIndex.build((w['english'], w['russian'], w.get('next_repetition_date')) for w in words)
+
+async def get_inline_index(user_id: int) -> Optional[PrefixIndex]:
+    """
+    Префиксный индекс словаря для inline-поиска. В режиме базы строится
+    одним запросом при первом обращении и живет до invalidate_inline_index
+    или вытеснения из кэша (INLINE_INDEX_CACHE_SIZE); в режиме CSV берется
+    из кэша csv_vocab, который следит за файлом.
+    """
+    if not USE_DATABASE:
+        vocab_path = get_user_vocabulary_path(user_id)
+        if not os.path.exists(vocab_path):
+            return None
+        return await run_blocking(prefix_index, vocab_path)
+    task = inline_index_tasks.get(user_id)
+    if task is None:
+        # Одна задача на пользователя: запросы, пришедшие во время построения, ждут ее
+        task = inline_index_tasks[user_id] = asyncio.create_task(build_inline_index(user_id))
+    inline_index_tasks.move_to_end(user_id)
+    while len(inline_index_tasks) > INLINE_INDEX_CACHE_SIZE:
+        inline_index_tasks.popitem(last=False)
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        if inline_index_tasks.get(user_id) is task:
+            del inline_index_tasks[user_id]
+        raise
+
+def invalidate_inline_index(user_id: int):
+    """Сбрасывает индекс inline-поиска после изменения словаря или дат повторения"""
+    inline_index_tasks.pop(user_id, None)
+
+def slim_training_words(records) -> list:
+    """
+    Оставляет у слов RUS-ENG сессии только то, что нужно тренировке:
+    word_id, english и russian в нативных типах Python. Прогресс SRS
+    берется из словаря при завершении сессии, а не из FSM.
+    """
+    return [
+        {
+            'word_id': int(record['word_id']),
+            'english': str(record.get('english') or ''),
+            'russian': str(record.get('russian') or ''),
+        }
+        for record in records
+    ]
+
 def get_training_results_path(user_id: int) -> str:
     """Получает путь к файлу с результатами тренировки пользователя"""
     current_dir = Path(__file__).parent
@@ -130,42 +254,19 @@ def get_user_vocabulary_path(user_id: int) -> str:
     current_dir = Path(__file__).parent
     return str(current_dir / "User_Vocabularies" / f"vocabulary_{user_id}.csv")
 
-def save_training_results(user_id: int, training_results: dict) -> bool:
-    """Сохраняет результаты тренировки в локальный файл"""
+async def save_training_answer(user_id: int, word_id: str, result: int) -> bool:
+    """Дописывает ответ ENG-RUS тренировки в журнал пользователя"""
     try:
-        path = get_training_results_path(user_id)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-
-        # Загружаем существующие результаты, если файл есть
-        existing_results = {}
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    existing_results = json.load(f)
-            except json.JSONDecodeError:
-                logger.warning(f"Файл результатов поврежден, создаем новый: {path}")
-
-        # Объединяем с новыми результатами
-        existing_results.update(training_results)
-
-        # Сохраняем в файл
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(existing_results, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"Результаты тренировки сохранены локально: {len(training_results)} ответов для пользователя {user_id}")
+        await get_journal(get_training_results_path(user_id)).append(word_id, result)
         return True
     except Exception as e:
         logger.error(f"Ошибка сохранения результатов тренировки: {e}")
         return False
 
 def load_training_results(user_id: int) -> dict:
-    """Загружает результаты тренировки из локального файла"""
+    """Восстанавливает результаты тренировки из снимка и журнала ответов"""
     try:
-        path = get_training_results_path(user_id)
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return get_journal(get_training_results_path(user_id)).replay()
     except Exception as e:
         logger.error(f"Ошибка загрузки результатов тренировки: {e}")
         return {}
@@ -180,30 +281,23 @@ def get_ruseng_results_path(user_id: int) -> str:
     current_dir = Path(__file__).parent
     return str(current_dir / f"ruseng_results_{user_id}.json")
 
-def save_ruseng_results(user_id: int, ruseng_results: dict) -> bool:
+async def save_ruseng_answer(user_id: int, word_id: str, is_correct: bool) -> bool:
     """
-    Сохраняет результаты RUS-ENG тренировки в локальный файл.
+    Дописывает ответ RUS-ENG тренировки в журнал пользователя.
     
     ⚠️ ЛОКАЛЬНАЯ ТРЕНИРОВКА: Результаты НЕ отправляются на сервер Lingualeo.
     """
     try:
-        path = get_ruseng_results_path(user_id)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(ruseng_results, f, ensure_ascii=False, indent=2)
-        logger.info(f"RUS-ENG результаты сохранены: {len(ruseng_results)} ответов для пользователя {user_id}")
+        await get_journal(get_ruseng_results_path(user_id)).append(word_id, is_correct)
         return True
     except Exception as e:
         logger.error(f"Ошибка сохранения RUS-ENG результатов: {e}")
         return False
 
 def load_ruseng_results(user_id: int) -> dict:
-    """Загружает результаты RUS-ENG тренировки из локального файла"""
+    """Восстанавливает результаты RUS-ENG тренировки из снимка и журнала ответов"""
     try:
-        path = get_ruseng_results_path(user_id)
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return get_journal(get_ruseng_results_path(user_id)).replay()
     except Exception as e:
         logger.error(f"Ошибка загрузки RUS-ENG результатов: {e}")
         return {}
@@ -246,7 +340,7 @@ async def _handle_wrong_answer(data: dict, word_index: int, selected_option: int
     except Exception as e:
         logger.error(f"Ошибка при обработке неправильного ответа: {e}")
 
-def clear_training_results(user_id: int) -> tuple[bool, bool]:
+async def clear_training_results(user_id: int) -> tuple[bool, bool]:
     """Очищает файл с результатами тренировки
 
     Returns:
@@ -254,10 +348,9 @@ def clear_training_results(user_id: int) -> tuple[bool, bool]:
     """
     try:
         path = get_training_results_path(user_id)
-        file_existed = os.path.exists(path)
+        file_existed = await get_journal(path).clear()
 
         if file_existed:
-            os.remove(path)
             logger.info(f"Файл результатов тренировки очищен: {path}")
         else:
             logger.info(f"Файл результатов тренировки не найден для очистки: {path}")
@@ -282,7 +375,7 @@ def verify_cache_cleanup(user_id: int) -> dict:
         path = get_training_results_path(user_id)
 
         # Проверяем текущее состояние файла
-        file_exists_after = os.path.exists(path)
+        file_exists_after = get_journal(path).exists()
 
         # Определяем статус очистки
         if file_exists_after:
@@ -316,24 +409,15 @@ def check_cache_status_before_training(user_id: int) -> dict:
         }
     """
     try:
-        path = get_training_results_path(user_id)
+        journal = get_journal(get_training_results_path(user_id))
 
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                cache_size = len(data)
-                return {
-                    'has_cache': True,
-                    'cache_size': cache_size,
-                    'cache_status': f"📋 Найден кеш с {cache_size} результатами тренировки"
-                }
-            except json.JSONDecodeError:
-                return {
-                    'has_cache': True,
-                    'cache_size': 0,
-                    'cache_status': "⚠️ Найден поврежденный файл кеша"
-                }
+        if journal.exists():
+            cache_size = len(journal.replay())
+            return {
+                'has_cache': True,
+                'cache_size': cache_size,
+                'cache_status': f"📋 Найден кеш с {cache_size} результатами тренировки"
+            }
         else:
             return {
                 'has_cache': False,
@@ -388,13 +472,13 @@ async def start_ruseng_training(message: Message, state: FSMContext):
         if USE_DATABASE:
             due_words_list = await database.get_due_words(message.from_user.id, limit=10)
             if not due_words_list:
-                total_words = len(await database.get_user_vocabulary(message.from_user.id))
+                total_words = await database.get_vocabulary_count(message.from_user.id)
                 if total_words == 0:
                     await message.answer("❌ У вас нет словаря. Сначала обновите словарь командой /update_vocab")
                 else:
                     await message.answer("✅ Все слова изучены! Нет слов для повторения прямо сейчас.")
                 return
-            training_words = due_words_list
+            training_words = slim_training_words(due_words_list)
         else:
             vocab_path = get_user_vocabulary_path(message.from_user.id)
             if not os.path.exists(vocab_path):
@@ -402,7 +486,7 @@ async def start_ruseng_training(message: Message, state: FSMContext):
                 return
 
             import pandas as pd
-            df = pd.read_csv(vocab_path)
+            df = await run_blocking(pd.read_csv, vocab_path)
             df['next_repetition_date'] = pd.to_datetime(df['next_repetition_date'])
 
             now = datetime.now()
@@ -413,11 +497,12 @@ async def start_ruseng_training(message: Message, state: FSMContext):
                 return
 
             sample_size = min(10, len(due_words))
-            training_words = due_words.sample(n=sample_size).to_dict('records')
+            training_words = slim_training_words(due_words.sample(n=sample_size).to_dict('records'))
+            del df, due_words
         
         # Восстанавливаем результаты из кеша (защита от краша)
         # ⚠️ ЛОКАЛЬНАЯ ТРЕНИРОВКА: автосохранение защищает от потери данных
-        saved_results = load_ruseng_results(message.from_user.id)
+        saved_results = await run_blocking(load_ruseng_results, message.from_user.id)
         
         # Фильтруем сохранённые результаты — оставляем только слова из текущего батча
         current_word_ids = {str(w.get('word_id')) for w in training_words}
@@ -456,9 +541,9 @@ async def start_ruseng_training(message: Message, state: FSMContext):
             total_answers=restored_total,
             wrong_answers=[],
             user_id=message.from_user.id,
-            vocab_df=df if not USE_DATABASE else None,
             training_type='rus_eng',
-            ruseng_results=filtered_results
+            ruseng_results=filtered_results,
+            card_message_id=None
         )
         await state.set_state(Form.training_mode)
 
@@ -470,6 +555,185 @@ async def start_ruseng_training(message: Message, state: FSMContext):
         logger.error(f"Ошибка при запуске RUS-ENG тренировки: {e}")
         await message.answer("❌ Ошибка при запуске тренировки. Попробуйте позже.")
 
+def prepare_training_words(training_data: dict) -> list:
+    """
+    Приводит ответ Lingualeo (ProcessTraining 'game' или GetWords 'data') к
+    словам ENG-RUS тренировки и дополняет варианты перевода до 4 переводами
+    других слов порции.
+    """
+    # Обрабатываем данные в зависимости от источника
+    import random
+    user_words = []
+
+    logger.info(f"Обрабатываем training_data, ключи: {list(training_data.keys())}")
+
+    if 'game' in training_data:
+        # Данные из ProcessTraining API
+        game_data = training_data.get('game', {})
+        raw_words = game_data.get('user_words', [])
+        logger.info(f"Данные из ProcessTraining API: {len(raw_words)} слов")
+        
+        # Извлекаем/создаем translates list для каждого слова
+        for word in raw_words:
+            word_id = word.get('word_id', 0)
+            word_value = word.get('word_value', '')
+            correct_translate_value = word.get('correct_translate_value', '')
+            translate_id = word.get('translate_id', 1)
+            
+            # Создаем translates list: первый - правильный перевод
+            translates = [{'id': translate_id, 'value': correct_translate_value}]
+            
+            # Если в API есть translates, используем их
+            if 'translates' in word and isinstance(word['translates'], list):
+                for tr in word['translates']:
+                    if isinstance(tr, dict) and tr.get('id') != translate_id:
+                        translates.append({'id': tr.get('id', 0), 'value': tr.get('value', '')})
+            
+            # Добавляем слово с translates
+            user_words.append({
+                'word_id': word_id,
+                'word_value': word_value,
+                'correct_translate_value': correct_translate_value,
+                'translate_id': translate_id,
+                'translates': translates,
+                'progress_percent': word.get('progress_percent', 50)
+            })
+            
+    elif 'data' in training_data:
+        # Данные из GetWords API
+        words_data = training_data.get('data', [])
+        logger.info(f"Данные из GetWords API: {len(words_data)} слов")
+        # Конвертируем формат GetWords в формат для тренировки
+        for word in words_data[:10]:  # Берем первые 10 слов
+            translate_id = word.get('translate_id', 1)
+            correct_translate_value = word.get('translate', '')
+            
+            # Создаем translates list
+            translates = [{'id': translate_id, 'value': correct_translate_value}]
+            
+            user_words.append({
+                'word_id': word.get('id', 0),
+                'word_value': word.get('word', ''),
+                'correct_translate_value': correct_translate_value,
+                'translate_id': translate_id,
+                'translates': translates,
+                'progress_percent': 50  # По умолчанию средний прогресс
+            })
+        logger.info(f"Конвертировано в формат тренировки: {len(user_words)} слов")
+    
+    # Pad translates если меньше 4 вариантов - добавляем неправильные варианты из других слов
+    for i, word in enumerate(user_words):
+        if len(word['translates']) < 4:
+            # Берем переводы из других слов как неправильные варианты
+            other_words = [w for j, w in enumerate(user_words) if j != i]
+            random.shuffle(other_words)
+            
+            # Собираем существующие значения переводов для проверки дубликатов
+            existing_values = [t['value'] for t in word['translates']]
+            
+            for other_word in other_words:
+                if len(word['translates']) >= 4:
+                    break
+                other_value = other_word.get('correct_translate_value', '')
+                # Проверяем что этого перевода еще нет (по значению, не по ID)
+                if other_value and other_value not in existing_values:
+                    # Используем word_id другого слова как уникальный ID для неправильного варианта
+                    word['translates'].append({
+                        'id': other_word.get('word_id', 0),
+                        'value': other_value
+                    })
+                    existing_values.append(other_value)
+            
+            logger.debug(f"Слово '{word['word_value']}' translates padded to {len(word['translates'])} вариантов")
+
+    return user_words
+
+async def fetch_training_words(user_id: int, cookies_content: str) -> Optional[list]:
+    """
+    Загружает с сервера и готовит порцию слов ENG-RUS тренировки.
+    Возвращает None, если ответ пустой или статус не ok; ошибки запроса пробрасываются.
+    """
+    client = LingualeoAPIClient(user_id=user_id)
+    client.cookies = cookies_content
+    client.headers['Cookie'] = cookies_content
+
+    training_data = await client.get_training_words_async(user_id)
+    logger.info(f"Получено данных: {len(str(training_data))}")
+    logger.info(f"Статус training_data: {training_data.get('status') if training_data else 'None'}")
+
+    if not training_data or training_data.get('status') != 'ok':
+        logger.error(f"Ошибка: training_data пустой или статус не ok: {training_data}")
+        return None
+    return prepare_training_words(training_data)
+
+def training_cookies_path() -> Path:
+    """cookies_current.txt, с которым работает ENG-RUS тренировка (single-user deployment)"""
+    return Path(__file__).parent.parent / "cookies_current.txt"
+
+# Заранее загруженные порции ENG-RUS тренировки: user_id -> задача загрузки
+training_prefetch = PrefetchCache()
+
+def schedule_training_prefetch(user_id: int):
+    """
+    Начинает в фоне загрузку следующей порции ENG-RUS тренировки, чтобы
+    "Следующая тренировка" открывалась без ожидания сервера. Вызывается после
+    отправки результатов: до нее Lingualeo вернул бы ту же самую порцию.
+    Порция привязана к cookies и живет training_prefetch.ttl секунд.
+    """
+    try:
+        cookies_content = training_cookies_path().read_text(encoding='utf-8').strip()
+    except OSError:
+        return
+    if cookies_content:
+        training_prefetch.schedule(
+            user_id, fingerprint(cookies_content),
+            lambda: fetch_training_words(user_id, cookies_content)
+        )
+        logger.info(f"Запущена фоновая загрузка следующей порции для пользователя {user_id}")
+
+def get_submission_queue_dir() -> str:
+    """Каталог очереди отправки результатов ENG-RUS тренировки"""
+    return str(Path(__file__).parent / "Submission_Queue")
+
+async def submit_training_results(user_id: int, words: dict) -> dict:
+    """Отправляет накопленные ответы пользователя одним запросом word_set_repetition"""
+    client = LingualeoAPIClient(user_id=user_id)
+    if not await client.load_user_cookies_async(user_id):
+        raise ValueError("Cookies not found. Login first.")
+    return await fix_process_training_answer_batch_async(client, words)
+
+async def report_submission_status(user_id: int, labels: dict, server_response: Optional[dict], error: Optional[Exception]):
+    """Сообщает пользователю, чем закончилась фоновая отправка результатов"""
+    # Фоновое уведомление уступает очередь ответам на действия пользователей
+    with bulk_priority():
+        await send_submission_status(user_id, labels, server_response, error)
+
+async def send_submission_status(user_id: int, labels: dict, server_response: Optional[dict], error: Optional[Exception]):
+    if error is not None:
+        await bot.send_message(
+            user_id,
+            f"❌ Не удалось отправить результаты тренировки на сервер: {error}\n\n"
+            "Ответы сохранены и будут отправлены вместе со следующей тренировкой "
+            "или командой /send_results. Если ошибка повторяется, войдите заново командой /login"
+        )
+        return
+
+    schedule_training_prefetch(user_id)
+    result_text = f"✅ Сервер принял результаты тренировки: {len(labels)} ответов\n"
+    server_words = {str(w.get('word_id', '')): w for w in (server_response or {}).get('words') or []}
+    interval_lines = []
+    for word_id, label in labels.items():
+        server_word = server_words.get(word_id)
+        if server_word:
+            interval_text = calculate_next_repetition(server_word.get('repeat_at', ''), server_word.get('repeat_interval', 480))
+            interval_lines.append(f"• {label}: {interval_text}")
+    if interval_lines:
+        result_text += "\nREVIEW INTERVALS:\n\n" + "\n".join(interval_lines)
+    await bot.send_message(user_id, result_text)
+
+# Фоновая отправка результатов ENG-RUS тренировки с повторами
+submission_queue = SubmissionQueue(get_submission_queue_dir(), submit_training_results, report_submission_status)
+
 @dp.message(Command("rep_engrus"))
 async def start_training(message: Message, state: FSMContext):
     """Запуск тренировки английских слов с русским переводом
@@ -477,11 +741,23 @@ async def start_training(message: Message, state: FSMContext):
     Использует cookies_current.txt для single-user deployment.
     """
     logger.info(f"start_training вызвана пользователем {message.from_user.id}")
+    await begin_engrus_training(message, state, message.from_user.id)
 
+@dp.callback_query(lambda c: c.data == 'start_next_engrus')
+async def start_next_training(callback: CallbackQuery, state: FSMContext):
+    """Кнопка "Следующая тренировка" после итогов ENG-RUS сессии"""
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await begin_engrus_training(callback.message, state, callback.from_user.id)
+
+async def begin_engrus_training(message: Message, state: FSMContext, user_id: int):
+    """
+    Начинает ENG-RUS сессию: берет порцию, загруженную заранее
+    schedule_training_prefetch, или загружает ее с сервера.
+    """
     try:
         # Загружаем cookies из cookies_current.txt
-        script_dir = Path(__file__).parent.parent
-        cookies_path = script_dir / "cookies_current.txt"
+        cookies_path = training_cookies_path()
         
         if not cookies_path.exists():
             await message.answer("❌ Файл cookies_current.txt не найден. Положите cookies в этот файл.")
@@ -495,116 +771,37 @@ async def start_training(message: Message, state: FSMContext):
             return
         
         logger.info(f"Cookies загружены из {cookies_path}")
-        
-        # Создаем клиент и устанавливаем cookies
-        client = LingualeoAPIClient(user_id=message.from_user.id)
-        client.cookies = cookies_content
-        client.headers['Cookie'] = cookies_content
 
-        logger.info("Аутентификация успешна, заголовки обновлены")
-
-        # Получаем слова для тренировки
-        logger.info(f"Начинаем получение слов для тренировки пользователя {message.from_user.id}")
-
-        try:
-            training_data = await client.get_training_words_async(message.from_user.id)
-            logger.info(f"Получено данных: {len(str(training_data))}")
-        except Exception as e:
-            logger.error(f"Ошибка получения данных для тренировки: {e}")
-            await message.answer("Ошибка получения данных для тренировки. Попробуйте войти в аккаунт заново командой /login")
-            return
-
-        logger.info(f"Статус training_data: {training_data.get('status') if training_data else 'None'}")
-
-        if not training_data or training_data.get('status') != 'ok':
-            logger.error(f"Ошибка: training_data пустой или статус не ok: {training_data}")
-            await message.answer("Ошибка получения данных для тренировки")
-            return
+        # Порция, загруженная заранее, если она не устарела и cookies те же
+        user_words = await training_prefetch.take(user_id, fingerprint(cookies_content))
+        if user_words:
+            logger.info(f"Используем заранее загруженную порцию: {len(user_words)} слов")
+        else:
+            # Пока ответы прошлой сессии не приняты, Lingualeo вернул бы те же слова
+            if await run_blocking(submission_queue.pending, user_id):
+                await message.answer("⏳ Дожидаемся, пока сервер примет результаты прошлой тренировки...")
+            if not await submission_queue.wait_sent(user_id):
+                logger.info(f"Результаты пользователя {user_id} еще в очереди отправки, тренировка не начата")
+                await message.answer(
+                    "📤 Результаты прошлой тренировки еще не приняты сервером, без них он вернет те же слова.\n\n"
+                    "Начните тренировку после сообщения о том, что сервер принял результаты, "
+                    "или отправьте их командой /send_results"
+                )
+                return
 
-        # Обрабатываем данные в зависимости от источника
-        user_words = []
-        import random
+            # Получаем слова для тренировки
+            logger.info(f"Начинаем получение слов для тренировки пользователя {user_id}")
 
-        logger.info(f"Обрабатываем training_data, ключи: {list(training_data.keys())}")
+            try:
+                user_words = await fetch_training_words(user_id, cookies_content)
+            except Exception as e:
+                logger.error(f"Ошибка получения данных для тренировки: {e}")
+                await message.answer("Ошибка получения данных для тренировки. Попробуйте войти в аккаунт заново командой /login")
+                return
 
-        if 'game' in training_data:
-            # Данные из ProcessTraining API
-            game_data = training_data.get('game', {})
-            raw_words = game_data.get('user_words', [])
-            logger.info(f"Данные из ProcessTraining API: {len(raw_words)} слов")
-            
-            # Извлекаем/создаем translates list для каждого слова
-            for word in raw_words:
-                word_id = word.get('word_id', 0)
-                word_value = word.get('word_value', '')
-                correct_translate_value = word.get('correct_translate_value', '')
-                translate_id = word.get('translate_id', 1)
-                
-                # Создаем translates list: первый - правильный перевод
-                translates = [{'id': translate_id, 'value': correct_translate_value}]
-                
-                # Если в API есть translates, используем их
-                if 'translates' in word and isinstance(word['translates'], list):
-                    for tr in word['translates']:
-                        if isinstance(tr, dict) and tr.get('id') != translate_id:
-                            translates.append({'id': tr.get('id', 0), 'value': tr.get('value', '')})
-                
-                # Добавляем слово с translates
-                user_words.append({
-                    'word_id': word_id,
-                    'word_value': word_value,
-                    'correct_translate_value': correct_translate_value,
-                    'translate_id': translate_id,
-                    'translates': translates,
-                    'progress_percent': word.get('progress_percent', 50)
-                })
-                
-        elif 'data' in training_data:
-            # Данные из GetWords API
-            words_data = training_data.get('data', [])
-            logger.info(f"Данные из GetWords API: {len(words_data)} слов")
-            # Конвертируем формат GetWords в формат для тренировки
-            for word in words_data[:10]:  # Берем первые 10 слов
-                translate_id = word.get('translate_id', 1)
-                correct_translate_value = word.get('translate', '')
-                
-                # Создаем translates list
-                translates = [{'id': translate_id, 'value': correct_translate_value}]
-                
-                user_words.append({
-                    'word_id': word.get('id', 0),
-                    'word_value': word.get('word', ''),
-                    'correct_translate_value': correct_translate_value,
-                    'translate_id': translate_id,
-                    'translates': translates,
-                    'progress_percent': 50  # По умолчанию средний прогресс
-                })
-            logger.info(f"Конвертировано в формат тренировки: {len(user_words)} слов")
-        
-        # Pad translates если меньше 4 вариантов - добавляем неправильные варианты из других слов
-        for i, word in enumerate(user_words):
-            if len(word['translates']) < 4:
-                # Берем переводы из других слов как неправильные варианты
-                other_words = [w for j, w in enumerate(user_words) if j != i]
-                random.shuffle(other_words)
-                
-                # Собираем существующие значения переводов для проверки дубликатов
-                existing_values = [t['value'] for t in word['translates']]
-                
-                for other_word in other_words:
-                    if len(word['translates']) >= 4:
-                        break
-                    other_value = other_word.get('correct_translate_value', '')
-                    # Проверяем что этого перевода еще нет (по значению, не по ID)
-                    if other_value and other_value not in existing_values:
-                        # Используем word_id другого слова как уникальный ID для неправильного варианта
-                        word['translates'].append({
-                            'id': other_word.get('word_id', 0),
-                            'value': other_value
-                        })
-                        existing_values.append(other_value)
-                
-                logger.debug(f"Слово '{word['word_value']}' translates padded to {len(word['translates'])} вариантов")
+            if user_words is None:
+                await message.answer("Ошибка получения данных для тренировки")
+                return
 
         logger.info(f"Финальное количество слов для тренировки: {len(user_words)}")
 
@@ -618,14 +815,13 @@ async def start_training(message: Message, state: FSMContext):
             logger.info(f"Слово {i+1}: {word.get('word_value')} -> {word.get('correct_translate_value')}, repeat_at: {word.get('repeat_at')}")
 
         # Загружаем существующие результаты тренировки, если есть
-        existing_results = load_training_results(message.from_user.id)
+        existing_results = await run_blocking(load_training_results, user_id)
         if existing_results:
             logger.info(f"Загружены существующие результаты тренировки: {len(existing_results)} ответов")
         else:
             logger.info("Новые результаты тренировки")
 
         # Сохраняем слова для тренировки в состояние
-        # Очищаем vocab_df чтобы не путать с RUS-ENG тренировкой
         await state.update_data(
             training_words=user_words,
             current_word_index=0,
@@ -633,14 +829,14 @@ async def start_training(message: Message, state: FSMContext):
             total_answers=0,
             wrong_answers=[],
             training_results=existing_results,
-            user_id=message.from_user.id,
-            vocab_df=None,
-            training_type='eng_rus'
+            user_id=user_id,
+            training_type='eng_rus',
+            card_message_id=None
         )
         await state.set_state(Form.training_mode)
 
         # Начинаем тренировку с первым словом
-        await send_next_word(message, state, client)
+        await send_next_word(message, state)
 
     except Exception as e:
         logger.error(f"Ошибка при запуске тренировки: {str(e)}")
@@ -660,10 +856,12 @@ async def update_vocabulary(message: Message, state: FSMContext):
 
         await message.answer("📥 Загружаю весь словарь из Lingualeo...")
 
-        # Загружаем слова
+        # Загружаем слова потоково: ответ разбирается по мере получения
         try:
-            user_words = client.export_all_words()
-            if not user_words:
+            remote_words = await normalize_export_words_async(
+                client.iter_export_words_async(message.from_user.id)
+            )
+            if not remote_words:
                 await message.answer("❌ Нет слов для обновления")
                 return
         except Exception as e:
@@ -671,35 +869,40 @@ async def update_vocabulary(message: Message, state: FSMContext):
             await message.answer("❌ Ошибка загрузки слов из Lingualeo")
             return
 
-        # Загружаем текущий словарь
-        vocab_path = get_user_vocabulary_path(message.from_user.id)
-        existing_words = {}
-        if os.path.exists(vocab_path):
-            import pandas as pd
-            df = pd.read_csv(vocab_path)
-            existing_words = {row['word_id']: row for _, row in df.iterrows()}
-
-        # Сравниваем
-        new_words = []
-        updated_words = []
-        for word in user_words:
-            word_id = word.get('id')
-            if word_id not in existing_words:
-                new_words.append(word)
-            else:
-                updated_words.append(word)
+        user_id = message.from_user.id
+        remote_digest = vocabulary_digest(remote_words)
 
-        # Показываем изменения
-        text = f"📋 Найдено {len(user_words)} слов в Lingualeo.\n"
-        if new_words:
-            text += f"🆕 Новых слов: {len(new_words)}\n"
-        if updated_words:
-            text += f"🔄 Уже существующих слов: {len(updated_words)}\n"
-
-        if not new_words and not updated_words:
-            await message.answer("✅ Словарь актуален, изменений нет.")
+        # Сравниваем хеши слов с локальным словарем, в FSM кладем только дельту
+        if USE_DATABASE:
+            sync_state = await database.get_sync_state(user_id)
+            if sync_state and sync_state.get('vocabulary_digest') == remote_digest:
+                await message.answer(f"✅ Словарь актуален ({len(remote_words)} слов), изменений нет.")
+                return
+            local_hashes = await database.get_vocabulary_hashes(user_id)
+        else:
+            vocab_path = get_user_vocabulary_path(user_id)
+            local_hashes = {}
+            if os.path.exists(vocab_path):
+                import pandas as pd
+                df = await run_blocking(pd.read_csv, vocab_path)
+                local_hashes = frame_vocabulary_hashes(df)
+
+        delta = diff_vocabulary(remote_words, local_hashes)
+        if delta.is_empty:
+            if USE_DATABASE:
+                await database.save_sync_state(user_id, remote_digest, len(remote_words))
+            await message.answer(f"✅ Словарь актуален ({len(remote_words)} слов), изменений нет.")
             return
 
+        # Показываем изменения
+        text = f"📋 Найдено {len(remote_words)} слов в Lingualeo.\n"
+        if delta.new_words:
+            text += f"🆕 Новых слов: {len(delta.new_words)}\n"
+        if delta.changed_words:
+            text += f"✏️ Изменившихся слов: {len(delta.changed_words)}\n"
+        if delta.removed_word_ids:
+            text += f"🗑 Удаленных из Lingualeo: {len(delta.removed_word_ids)}\n"
+        text += f"🔄 Без изменений: {delta.unchanged_count}\n"
         text += "\nГотовы обновить словарь?"
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -707,7 +910,15 @@ async def update_vocabulary(message: Message, state: FSMContext):
             [InlineKeyboardButton(text="❌ ОТМЕНА", callback_data="cancel_update_vocab")]
         ])
 
-        await state.update_data(new_words=new_words, updated_words=updated_words, user_words=user_words)
+        await state.update_data(
+            vocab_delta={
+                'new_words': delta.new_words,
+                'changed_words': delta.changed_words,
+                'removed_word_ids': delta.removed_word_ids,
+            },
+            vocab_digest=remote_digest,
+            vocab_word_count=len(remote_words),
+        )
         await state.set_state(Form.waiting_for_final_confirmation)
         await message.answer(text, reply_markup=keyboard)
 
@@ -724,9 +935,15 @@ async def send_saved_results(message: Message):
     try:
         # Загружаем сохраненные результаты
         logger.info(f"Загружаем сохраненные результаты для пользователя {user_id}")
-        training_results = load_training_results(user_id)
+        training_results = await run_blocking(load_training_results, user_id)
 
         if not training_results:
+            pending = await run_blocking(submission_queue.pending, user_id)
+            if pending:
+                # Очередь прекратила повторы (например, из-за cookies) - запускаем заново
+                await submission_queue.enqueue(user_id, {})
+                await message.answer(f"📤 В очереди отправки {pending} ответов. Отправляем повторно, о результате сообщу отдельно.")
+                return
             logger.info(f"Нет сохраненных результатов для пользователя {user_id}")
             await message.answer("❌ У вас нет сохраненных результатов тренировки для отправки.")
             return
@@ -746,11 +963,12 @@ async def send_saved_results(message: Message):
         logger.info("Cookies загружены, отправляем результаты на сервер")
         try:
             # Отправляем результаты на сервер с использованием исправленной функции
-            server_response = fix_process_training_answer_batch(client, training_results)
+            server_response = await fix_process_training_answer_batch_async(client, training_results)
             logger.info(f"Результаты успешно отправлены: {type(server_response)}")
+            schedule_training_prefetch(user_id)
 
             # Очищаем локальные результаты после успешной отправки
-            cleanup_success, file_existed = clear_training_results(user_id)
+            cleanup_success, file_existed = await clear_training_results(user_id)
             if cleanup_success:
                 if file_existed:
                     logger.info(f"Локальные результаты очищены для пользователя {user_id}")
@@ -823,6 +1041,8 @@ async def do_login(message: Message, state: FSMContext):
                 # No error - login successful
                 logger.info(f"Успешный логин для пользователя {user_id}")
                 logger.info(f"Response keys: {list(response.keys())}")
+                # Порция, загруженная со старой сессией, больше не нужна
+                training_prefetch.invalidate(user_id)
 
                 # Копируем cookies в глобальный файл для совместимости
                 try:
@@ -887,6 +1107,8 @@ async def add_word(message: Message, state: FSMContext):
                 await state.clear()
                 return
             response_text = await client.add_word_async(word, translation, message.from_user.id)
+            # Новое слово меняет порцию тренировки на сервере
+            training_prefetch.invalidate(message.from_user.id)
             await message.answer(response_text)
             await state.clear()
         else:
@@ -895,6 +1117,32 @@ async def add_word(message: Message, state: FSMContext):
         logger.error(f"Ошибка: {str(e)}")
         await message.answer("Произошла ошибка. Попробуй позже.")
 
+async def show_training_card(message: Message, state: FSMContext, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+    """
+    Показывает карточку тренировки (слово с вариантами или итог сессии).
+
+    При TRAINING_CARD_EDIT_IN_PLACE вся сессия - одно сообщение: карточка
+    редактируется вместе с клавиатурой, старые кнопки исчезают. Если править
+    нечего или правка не удалась (сообщение удалено, слишком старое),
+    отправляется новое сообщение и дальше редактируется оно.
+    """
+    if not TRAINING_CARD_EDIT_IN_PLACE:
+        await message.answer(text, reply_markup=reply_markup)
+        return
+
+    data = await state.get_data()
+    card_message_id = data.get('card_message_id')
+    if card_message_id:
+        try:
+            await message.bot.edit_message_text(
+                text, chat_id=message.chat.id, message_id=card_message_id, reply_markup=reply_markup
+            )
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"Не удалось обновить карточку тренировки {card_message_id}, отправляем новую: {e}")
+    sent = await message.answer(text, reply_markup=reply_markup)
+    await state.update_data(card_message_id=sent.message_id)
+
 async def send_next_ruseng_word(message: Message, state: FSMContext):
     """
     Отправляет следующее слово для RUS-ENG тренировки.
@@ -966,12 +1214,13 @@ async def send_next_ruseng_word(message: Message, state: FSMContext):
     total_words = len(training_words)
     counter_text = f"({current_index + 1}\\{total_words}) "
 
-    await message.answer(
+    await show_training_card(
+        message, state,
         f"{counter_text}Выберите перевод слова:\n\n🇷🇺 {russian_word}",
         reply_markup=keyboard
     )
 
-async def send_next_word(message: Message, state: FSMContext, client: LingualeoAPIClient):
+async def send_next_word(message: Message, state: FSMContext, client: LingualeoAPIClient = None):
     """Отправляет следующее слово для тренировки"""
     import random
     
@@ -1051,7 +1300,8 @@ async def send_next_word(message: Message, state: FSMContext, client: LingualeoA
     total_words = len(training_words)
     counter_text = f"({current_index + 1}\\{total_words}) "
 
-    await message.answer(
+    await show_training_card(
+        message, state,
         f"{counter_text}Выберите перевод слова:\n\n🇬🇧 {word_value}",
         reply_markup=keyboard
     )
@@ -1145,8 +1395,8 @@ async def handle_training_answer(callback: CallbackQuery, state: FSMContext):
             ruseng_results[callback_word_id] = is_correct
             await state.update_data(ruseng_results=ruseng_results)
             
-            # Автосохранение после каждого ответа (защита от потери данных)
-            save_ruseng_results(user_id, ruseng_results)
+            # Автосохранение после каждого ответа: дозапись в журнал (защита от потери данных)
+            await save_ruseng_answer(user_id, callback_word_id, is_correct)
             logger.info(f"RUS-ENG: word_id={callback_word_id}, is_correct={is_correct}, total_results={len(ruseng_results)}")
         else:
             # ENG-RUS: результаты отправляются на сервер Lingualeo
@@ -1156,8 +1406,8 @@ async def handle_training_answer(callback: CallbackQuery, state: FSMContext):
             training_results[str(current_word_id)] = 1 if is_correct else 2
             await state.update_data(training_results=training_results)
             
-            # Сохраняем результаты в файл после каждого ответа (автосохранение)
-            save_training_results(user_id, training_results)
+            # Дописываем ответ в журнал после каждого ответа (автосохранение)
+            await save_training_answer(user_id, str(current_word_id), training_results[str(current_word_id)])
 
         # Отправляем обратную связь пользователю
         if is_correct:
@@ -1172,10 +1422,8 @@ async def handle_training_answer(callback: CallbackQuery, state: FSMContext):
                 # RUS-ENG тренировка
                 await send_next_ruseng_word(callback.message, state)
             else:
-                # ENG-RUS тренировка
-                client = LingualeoAPIClient(user_id=user_id)
-                await client.load_user_cookies_async(user_id)
-                await send_next_word(callback.message, state, client)
+                # ENG-RUS тренировка (показ слова не обращается к API - клиент не нужен)
+                await send_next_word(callback.message, state)
         else:
             # Определяем тип тренировки для завершения
             if data.get('training_type') == 'rus_eng':
@@ -1205,96 +1453,37 @@ async def finish_training(message: Message, state: FSMContext):
 
     logger.info(f"Локальные результаты тренировки: {len(training_results)} ответов")
 
-    # Автоматически отправляем результаты на сервер
-    server_send_success = False
-    server_response = None
-    client = None
-    cache_cleanup_info = None
-
+    # Результаты уходят на сервер через фоновую очередь: сессия не ждет сети,
+    # а о результате отправки пользователь получит отдельное сообщение
+    user_id = data.get('user_id', message.from_user.id)  # Fallback на message.from_user.id
+    labels = {
+        str(word.get('word_id', '')): f"{word.get('word_value', '')} — {word.get('correct_translate_value', '')}"
+        for word in training_words
+    }
     try:
-        # Получаем user_id из состояния тренировки
-        data = await state.get_data()
-        user_id = data.get('user_id', message.from_user.id)  # Fallback на message.from_user.id
-        logger.info(f"Попытка отправки результатов на сервер для пользователя {user_id}")
-
-        client = LingualeoAPIClient(user_id=user_id)
-        if await client.load_user_cookies_async(user_id):
-            # Отправляем результаты на сервер с использованием исправленной функции
-            server_response = fix_process_training_answer_batch(client, training_results)
-
-            if server_response and server_response.get('status') == 'ok':
-                server_send_success = True
-                logger.info("Результаты успешно отправлены на сервер")
-
-                # Очищаем локальные результаты ТОЛЬКО после успешной отправки на сервер
-                cleanup_success, file_existed = clear_training_results(user_id)
-
-                # Проверяем реальное состояние кеша ПОСЛЕ очистки
-                file_exists_after_cleanup = os.path.exists(get_training_results_path(user_id))
-
-                if cleanup_success:
-                    if file_existed and not file_exists_after_cleanup:
-                        # Файл существовал и был успешно удален
-                        logger.info("Локальные результаты тренировки очищены после успешной отправки")
-                        cache_cleanup_info = {
-                            'cache_cleared': True,
-                            'file_existed_before': True,
-                            'file_exists_after': False,
-                            'cleanup_status': "✅ Кеш успешно очищен после успешной отправки"
-                        }
-                    elif not file_existed and not file_exists_after_cleanup:
-                        # Файл не существовал и не существует (кеш был пуст)
-                        logger.info("Файл результатов тренировки не найден для очистки")
-                        cache_cleanup_info = {
-                            'cache_cleared': True,
-                            'file_existed_before': False,
-                            'file_exists_after': False,
-                            'cleanup_status': "✅ Кеш был пуст - нет данных для очистки"
-                        }
-                    else:
-                        # Неожиданное состояние
-                        logger.warning(f"Неожиданное состояние кеша: existed={file_existed}, exists_after={file_exists_after_cleanup}")
-                        cache_cleanup_info = {
-                            'cache_cleared': False,
-                            'file_existed_before': file_existed,
-                            'file_exists_after': file_exists_after_cleanup,
-                            'cleanup_status': "⚠️ Неожиданное состояние кеша после очистки"
-                        }
-                else:
-                    logger.error("Не удалось очистить локальные результаты тренировки")
-                    cache_cleanup_info = {
-                        'cache_cleared': False,
-                        'file_existed_before': False,
-                        'file_exists_after': True,
-                        'cleanup_status': "❌ Ошибка очистки кеша после отправки"
-                    }
-            else:
-                logger.error(f"Ошибка отправки на сервер: {server_response}")
-                cache_cleanup_info = {
-                    'cache_cleared': False,
-                    'file_existed_before': True,
-                    'file_exists_after': True,
-                    'cleanup_status': "❌ Кеш не очищен - ошибка отправки на сервер"
-                }
-        else:
-            logger.error("Не удалось загрузить cookies для отправки результатов")
-            cache_cleanup_info = {
-                'cache_cleared': False,
-                'file_existed_before': True,
-                'file_exists_after': True,
-                'cleanup_status': "❌ Кеш не очищен - ошибка аутентификации"
-            }
+        pending = await submission_queue.enqueue(user_id, training_results, labels)
+        # Ответы уже сохранены в очереди на диске - журнал сессии больше не нужен
+        cleanup_success, file_existed = await clear_training_results(user_id)
+        cache_cleanup_info = {
+            'queued': True,
+            'cache_cleared': cleanup_success,
+            'file_existed_before': file_existed,
+            'file_exists_after': not cleanup_success,
+            'cleanup_status': f"📤 Результаты поставлены в очередь отправки ({pending} ответов), кеш очищен"
+            if cleanup_success else "⚠️ Результаты в очереди отправки, но не удалось очистить кеш"
+        }
     except Exception as e:
-        logger.error(f"Ошибка отправки результатов на сервер: {e}")
+        logger.error(f"Не удалось поставить результаты в очередь отправки: {e}")
         cache_cleanup_info = {
+            'queued': False,
             'cache_cleared': False,
             'file_existed_before': True,
             'file_exists_after': True,
-            'cleanup_status': f"❌ Кеш не очищен - ошибка сервера: {e}"
+            'cleanup_status': "❌ Кеш не очищен - результаты сохранены локально, отправьте их командой /send_results"
         }
 
     # Показываем финальную статистику с интервалами
-    await show_final_statistics(message, state, server_send_success, server_response, cache_cleanup_info)
+    await show_final_statistics(message, state, False, None, cache_cleanup_info)
 
 async def finish_ruseng_training(message: Message, state: FSMContext):
     """
@@ -1310,7 +1499,6 @@ async def finish_ruseng_training(message: Message, state: FSMContext):
     correct_answers = data.get('correct_answers', 0)
     total_answers = data.get('total_answers', 0)
     training_words = data.get('training_words', [])
-    vocab_df = data.get('vocab_df')
     ruseng_results = data.get('ruseng_results', {})
     user_id = data.get('user_id', message.from_user.id)
 
@@ -1321,63 +1509,35 @@ async def finish_ruseng_training(message: Message, state: FSMContext):
     words_processed = 0
     words_skipped = 0
 
-    if USE_DATABASE:
-        for word in training_words:
-            word_id_str = str(word.get('word_id'))
-            english = word.get('english', '')
-            
-            if word_id_str not in ruseng_results:
-                logger.warning(f"Нет результата для слова {word_id_str}, пропускаем")
-                words_skipped += 1
-                continue
-                
-            is_correct = ruseng_results.get(word_id_str, False)
-            await database.update_word_after_training(user_id, english, is_correct)
-            words_processed += 1
-            logger.info(f"Обновлено слово {english}: is_correct={is_correct}")
+    session_results = {}
+    for word in training_words:
+        word_id_str = str(word.get('word_id'))
         
-        logger.info(f"База данных обновлена: {words_processed} слов, пропущено {words_skipped}")
-    else:
-        now = datetime.now()
-        for word in training_words:
-            word_id = word.get('word_id')
-            word_id_str = str(word_id)
+        if word_id_str not in ruseng_results:
+            logger.warning(f"Нет результата для слова {word_id_str}, пропускаем")
+            words_skipped += 1
+            continue
             
-            if word_id_str not in ruseng_results:
-                logger.warning(f"Нет результата для слова {word_id}, пропускаем")
-                words_skipped += 1
-                continue
-                
-            is_correct = ruseng_results.get(word_id_str, False)
-            words_processed += 1
-
-            if is_correct:
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'repetitions'] += 1
-                repetitions = vocab_df.loc[vocab_df['word_id'] == word_id, 'repetitions'].values[0]
-                ease_factor = vocab_df.loc[vocab_df['word_id'] == word_id, 'ease_factor'].values[0]
-                new_interval = repetitions * ease_factor
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'interval_hours'] = new_interval
-                next_date = now + timedelta(hours=new_interval)
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'next_repetition_date'] = next_date
-            else:
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'repetitions'] = 0
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'interval_hours'] = 12
-                next_date = now + timedelta(hours=12)
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'next_repetition_date'] = next_date
-                vocab_df.loc[vocab_df['word_id'] == word_id, 'ease_factor'] = max(1.3, vocab_df.loc[vocab_df['word_id'] == word_id, 'ease_factor'].values[0] - 0.2)
+        session_results[word_id_str] = ruseng_results.get(word_id_str, False)
 
+    if USE_DATABASE:
+        # Все интервалы сессии записываются одной транзакцией
+        words_processed = await database.apply_training_results(user_id, session_results)
+        invalidate_inline_index(user_id)
+        logger.info(f"База данных обновлена: {words_processed} слов, пропущено {words_skipped}")
+    else:
+        # Словарь читается с диска только сейчас (в FSM сессии его нет),
+        # вся сессия применяется одним векторным обновлением и атомарной записью
         vocab_path = get_user_vocabulary_path(user_id)
         try:
-            vocab_df['next_repetition_date'] = vocab_df['next_repetition_date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            vocab_df.to_csv(vocab_path, index=False, encoding='utf-8-sig')
-            logger.info(f"Словарь сохранен в {vocab_path}")
+            words_processed = await run_blocking(update_vocabulary_file, vocab_path, session_results, datetime.now())
+            logger.info(f"Словарь сохранен в {vocab_path}: {words_processed} слов")
         except Exception as e:
             logger.error(f"Ошибка сохранения словаря: {e}")
     
     try:
         ruseng_path = get_ruseng_results_path(user_id)
-        if os.path.exists(ruseng_path):
-            os.remove(ruseng_path)
+        if await get_journal(ruseng_path).clear():
             logger.info(f"Очищен временный файл RUS-ENG результатов: {ruseng_path}")
     except Exception as e:
         logger.warning(f"Не удалось очистить файл RUS-ENG результатов: {e}")
@@ -1396,7 +1556,8 @@ async def finish_ruseng_training(message: Message, state: FSMContext):
 Интервалы обновлены. Следующая тренировка через несколько часов/дней.
     """
 
-    await message.answer(result_text)
+    # Итог заменяет карточку последнего слова
+    await show_training_card(message, state, result_text)
     logger.info("RUS-ENG тренировка завершена, статистика отправлена")
     await state.clear()
 
@@ -1458,10 +1619,17 @@ async def show_final_statistics(message: Message, state: FSMContext, server_send
                 found_words += 1
 
         result_text += f"\n✅ Words with intervals found: {found_words} out of {len(training_words)}"
+    elif cache_cleanup_info and cache_cleanup_info.get('queued'):
+        result_text += "\n📤 Review intervals will arrive in a separate message once the server confirms the results"
     else:
         result_text += "\n❌ Could not get intervals from server"
 
-    await message.answer(result_text)
+    # Следующая порция загружается в фоне, как только очередь отправит результаты (schedule_training_prefetch)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="▶️ Следующая тренировка", callback_data="start_next_engrus")]
+    ])
+    # Итог заменяет карточку последнего слова
+    await show_training_card(message, state, result_text, reply_markup=keyboard)
     await state.clear()
 
 @dp.callback_query(lambda c: c.data in ['confirm_training_end', 'cancel_training_end'])
@@ -1544,7 +1712,9 @@ async def handle_server_send(callback: CallbackQuery, state: FSMContext):
             return
 
         # Отправляем результаты на сервер с использованием исправленной функции
-        server_response = fix_process_training_answer_batch(client, training_results)
+        server_response = await fix_process_training_answer_batch_async(client, training_results)
+        if server_response and server_response.get('status') == 'ok':
+            schedule_training_prefetch(callback.from_user.id)
 
         # Сохраняем ответ сервера в состояние
         await state.update_data(server_response=server_response)
@@ -1601,7 +1771,7 @@ async def handle_cleanup_confirmation(callback: CallbackQuery, state: FSMContext
     await callback.answer()
 
     # Очищаем локальные результаты
-    cleanup_success, file_existed = clear_training_results(callback.from_user.id)
+    cleanup_success, file_existed = await clear_training_results(callback.from_user.id)
     if cleanup_success:
         if file_existed:
             await callback.message.answer("✅ Локальные результаты успешно очищены!\n\nТеперь можно продолжить с расчетом интервалов.")
@@ -1685,33 +1855,27 @@ async def handle_final_confirmation(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
         data = await state.get_data()
-        user_words = data.get('user_words', [])
+        delta = VocabularyDelta(**data.get('vocab_delta', {}))
         user_id = callback.from_user.id
 
-        processed_words = []
-        for word in user_words:
-            processed_words.append({
-                'word_id': word.get('id'),
-                'english': word.get('wd', ''),
-                'russian': word.get('trc', ''),
-                'next_repetition_date': datetime.now(),
-                'interval_hours': 12,
-                'ease_factor': 2.5,
-                'repetitions': 0
-            })
-
         if USE_DATABASE:
-            count = await database.bulk_upsert_vocabulary(user_id, processed_words)
-            await callback.message.answer(f"✅ Словарь обновлен в базе данных! Добавлено/обновлено {count} слов.")
+            await database.apply_vocabulary_delta(
+                user_id, delta.new_words, delta.changed_words, delta.removed_word_ids,
+                data.get('vocab_digest'), data.get('vocab_word_count', 0)
+            )
+            invalidate_inline_index(user_id)
         else:
             import pandas as pd
-            for w in processed_words:
-                w['next_repetition_date'] = w['next_repetition_date'].strftime('%Y-%m-%d %H:%M:%S')
-            df = pd.DataFrame(processed_words)
             vocab_path = get_user_vocabulary_path(user_id)
+            df = await run_blocking(pd.read_csv, vocab_path) if os.path.exists(vocab_path) else None
+            df = merge_delta_into_frame(df, delta, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             os.makedirs(os.path.dirname(vocab_path), exist_ok=True)
-            df.to_csv(vocab_path, index=False, encoding='utf-8-sig')
-            await callback.message.answer(f"✅ Словарь обновлен! Добавлено {len(user_words)} слов.")
+            await run_blocking(df.to_csv, vocab_path, index=False, encoding='utf-8-sig')
+
+        await callback.message.answer(
+            f"✅ Словарь обновлен! Новых слов: {len(delta.new_words)}, "
+            f"изменено: {len(delta.changed_words)}, удалено: {len(delta.removed_word_ids)}."
+        )
         
         await state.clear()
         return
@@ -1832,45 +1996,32 @@ async def check_words_to_repeat(message: Message):
             return
 
         logger.info("Запускаю скрипт get_repeat_count.py")
-        # Запускаем скрипт с увеличенным таймаутом и логированием каждую секунду
         logger.info(f"Команда: {sys.executable} {script_path}")
 
-        # Запускаем процесс в отдельном потоке для отслеживания времени
-        import threading
-        import time
-
-        def monitor_process(proc, start_time):
-            elapsed = 0
-            while proc.poll() is None:  # Пока процесс не завершился
-                time.sleep(1)
-                elapsed += 1
-                logger.info(f"{elapsed} сек - скрипт выполняется...")
-            logger.info(f"Скрипт завершился через {elapsed} сек")
-
-        # Запускаем процесс с user_id
-        process = subprocess.Popen([sys.executable, str(script_path), str(user_id)],
-                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                 text=True, cwd=str(script_dir))
-
-        # Запускаем мониторинг в отдельном потоке
-        monitor_thread = threading.Thread(target=monitor_process, args=(process, time.time()))
-        monitor_thread.start()
+        # Асинхронный подпроцесс: ожидание не блокирует event loop для других пользователей
+        start_time = asyncio.get_running_loop().time()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(script_path), str(user_id),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            cwd=str(script_dir)
+        )
 
         # Ждем завершения процесса
         try:
-            stdout, stderr = process.communicate(timeout=120)
-            result = subprocess.CompletedProcess(
-                args=[sys.executable, str(script_path)],
-                returncode=process.returncode,
-                stdout=stdout,
-                stderr=stderr
-            )
-        except subprocess.TimeoutExpired:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=120)
+        except asyncio.TimeoutError:
             process.kill()
+            await process.wait()
             raise subprocess.TimeoutExpired(cmd=[sys.executable, str(script_path)], timeout=120)
 
-        # Ждем завершения потока мониторинга
-        monitor_thread.join()
+        result = subprocess.CompletedProcess(
+            args=[sys.executable, str(script_path)],
+            returncode=process.returncode,
+            stdout=stdout.decode('utf-8', errors='replace'),
+            stderr=stderr.decode('utf-8', errors='replace')
+        )
+        elapsed = asyncio.get_running_loop().time() - start_time
+        logger.info(f"Скрипт завершился через {elapsed:.1f} сек")
 
         logger.info("Скрипт завершил выполнение")
 
@@ -1977,11 +2128,7 @@ async def word_status(message: Message):
             return
         
         import pandas as pd
-        df = pd.read_csv(vocab_path)
-        
-        mask = (df['english'].str.lower().str.contains(search_word, na=False)) | \
-               (df['russian'].str.lower().str.contains(search_word, na=False))
-        matches = df[mask]
+        matches = await run_blocking(search_vocabulary, vocab_path, search_word)
         
         if len(matches) == 0:
             await message.answer(f"❌ Слово '{search_word}' не найдено в словаре")
@@ -2021,6 +2168,42 @@ async def word_status(message: Message):
         await message.answer(header + "\n---".join(results), parse_mode="Markdown")
 
 
+@dp.inline_query()
+async def inline_word_lookup(inline_query: InlineQuery):
+    """
+    Inline-поиск по словарю (@bot слово): слова, начинающиеся с введенного
+    текста, с переводом и статусом повторения. Запросы приходят на каждое
+    нажатие клавиши, поэтому ответ берется из индекса в памяти без базы.
+    Inline-режим включается у бота в @BotFather (/setinline).
+    """
+    user_id = inline_query.from_user.id
+    query = inline_query.query.strip()
+    try:
+        index = await get_inline_index(user_id) if query else None
+    except Exception as e:
+        logger.error(f"Ошибка построения индекса inline-поиска для {user_id}: {e}")
+        index = None
+    
+    results = []
+    if index is not None:
+        now = datetime.now()
+        for i, (english, russian, next_date) in enumerate(index.search(query, limit=20)):
+            if next_date is None or next_date != next_date:
+                status = "⚪ Дата повторения неизвестна"
+            elif next_date <= now:
+                status = "🔴 Готово к повторению"
+            else:
+                status = f"🟢 Следующее: {next_date.strftime('%d.%m %H:%M')}"
+            results.append(InlineQueryResultArticle(
+                id=str(i),
+                title=f"{english} — {russian}",
+                description=status,
+                input_message_content=InputTextMessageContent(message_text=f"{english} — {russian}")
+            ))
+    
+    await inline_query.answer(results, cache_time=5, is_personal=True)
+
+
 @dp.message(Command("dictionary"))
 async def show_dictionary(message: Message, state: FSMContext):
     """Показывает словарь с пагинацией"""
@@ -2031,38 +2214,67 @@ async def show_dictionary(message: Message, state: FSMContext):
     per_page = 10
     
     if USE_DATABASE:
-        words, total = await database.get_vocabulary_page(user_id, 0, per_page, 'alpha', False)
+        total = await database.get_vocabulary_count(user_id)
         if total == 0:
             await message.answer("❌ У вас нет словаря. Сначала обновите словарь командой /update_vocab")
             return
         await state.update_data(dict_page=page, dict_sort='alpha')
-        await send_dictionary_page_db(message, user_id, page, per_page, 'alpha')
+        await send_dictionary_page_db(message, state, user_id, page, per_page, 'alpha', total)
     else:
         vocab_path = get_user_vocabulary_path(user_id)
         if not os.path.exists(vocab_path):
             await message.answer("❌ У вас нет локального словаря. Сначала обновите словарь командой /update_vocab")
             return
         
-        import pandas as pd
-        df = pd.read_csv(vocab_path)
+        df_sorted = await run_blocking(sorted_vocabulary, vocab_path, 'alpha')
         
         await state.update_data(dict_page=page, dict_sort='alpha')
-        await send_dictionary_page(message, df, page, per_page, 'alpha')
+        await send_dictionary_page(message, df_sorted, page, per_page, 'alpha')
 
 
-async def send_dictionary_page_db(message: Message, user_id: int, page: int, per_page: int, sort_by: str):
-    """Отправляет страницу словаря из базы данных"""
+def dictionary_sort_buttons(sort_by: str) -> list:
+    return [
+        InlineKeyboardButton(text="🔤 А-Я" if sort_by != 'alpha' else "✅ А-Я", callback_data="dict_sort_alpha"),
+        InlineKeyboardButton(text="📅 Дата" if sort_by != 'date' else "✅ Дата", callback_data="dict_sort_date"),
+        InlineKeyboardButton(text="🔴 Готовы" if sort_by != 'due' else "✅ Готовы", callback_data="dict_sort_due")
+    ]
+
+
+async def send_dictionary_page_db(message: Message, state: FSMContext, user_id: int, page: int, per_page: int,
+                                  sort_by: str, total_words: Optional[int] = None, anchor: Optional[str] = None,
+                                  backward: bool = False):
+    """
+    Отправляет страницу словаря из базы данных.
+
+    Страницы листаются по ключу (keyset): крайние слова страницы (english)
+    запоминаются в FSM как якоря, а в callback_data кнопок лежит направление
+    и общее количество слов, поэтому следующая страница не требует OFFSET
+    и повторного COUNT (само слово могло бы не уложиться в 64 байта
+    callback_data).
+    """
     due_only = sort_by == 'due'
-    words, total_words = await database.get_vocabulary_page(user_id, page * per_page, per_page, sort_by, due_only)
+    if total_words is None:
+        if due_only:
+            total_words = await database.count_due_words(user_id)
+        else:
+            total_words = await database.get_vocabulary_count(user_id)
     
-    total_pages = (total_words + per_page - 1) // per_page
+    if anchor is None:
+        page = 0
+    words = await database.get_vocabulary_page(user_id, per_page, sort_by, due_only, anchor, backward)
+    if not words and anchor is not None:
+        # Слово-якорь удалено (например, при синхронизации) - начинаем сначала
+        page = 0
+        words = await database.get_vocabulary_page(user_id, per_page, sort_by, due_only)
     
-    if total_words == 0:
+    if total_words == 0 or not words:
         await message.answer("📚 Словарь пуст" if sort_by != 'due' else "✅ Нет слов для повторения!")
         return
     
+    total_pages = (total_words + per_page - 1) // per_page
     start_idx = page * per_page
     end_idx = min(start_idx + len(words), total_words)
+    await state.update_data(dict_anchors={'p': words[0]['english'], 'n': words[-1]['english']})
     
     lines = [f"📚 Словарь ({start_idx+1}-{end_idx} из {total_words})\n"]
     
@@ -2082,42 +2294,30 @@ async def send_dictionary_page_db(message: Message, user_id: int, page: int, per
     
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"dict_page_{page-1}_{sort_by}"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="▶️ Далее", callback_data=f"dict_page_{page+1}_{sort_by}"))
-    
-    sort_buttons = [
-        InlineKeyboardButton(text="🔤 А-Я" if sort_by != 'alpha' else "✅ А-Я", callback_data=f"dict_sort_alpha_{page}"),
-        InlineKeyboardButton(text="📅 Дата" if sort_by != 'date' else "✅ Дата", callback_data=f"dict_sort_date_{page}"),
-        InlineKeyboardButton(text="🔴 Готовы" if sort_by != 'due' else "✅ Готовы", callback_data=f"dict_sort_due_{page}")
-    ]
+        nav_buttons.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=f"dict_page_{page-1}_{sort_by}_p_{total_words}"
+        ))
+    if page < total_pages - 1 and len(words) == per_page:
+        nav_buttons.append(InlineKeyboardButton(
+            text="▶️ Далее",
+            callback_data=f"dict_page_{page+1}_{sort_by}_n_{total_words}"
+        ))
     
     keyboard_rows = []
     if nav_buttons:
         keyboard_rows.append(nav_buttons)
-    keyboard_rows.append(sort_buttons)
+    keyboard_rows.append(dictionary_sort_buttons(sort_by))
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
     
     await message.answer("\n".join(lines), reply_markup=keyboard)
 
 
-async def send_dictionary_page(message: Message, df, page: int, per_page: int, sort_by: str):
-    """Отправляет страницу словаря"""
+async def send_dictionary_page(message: Message, df_sorted, page: int, per_page: int, sort_by: str):
+    """Отправляет страницу словаря из уже отсортированного DataFrame (см. sorted_vocabulary)"""
     import pandas as pd
     
-    # Сортировка
-    if sort_by == 'alpha':
-        df_sorted = df.sort_values('english', ascending=True)
-    elif sort_by == 'date':
-        df_sorted = df.sort_values('next_repetition_date', ascending=True)
-    elif sort_by == 'due':
-        now = datetime.now()
-        df['next_repetition_date'] = pd.to_datetime(df['next_repetition_date'])
-        df_sorted = df[df['next_repetition_date'] <= now].sort_values('next_repetition_date')
-    else:
-        df_sorted = df
-    
     total_words = len(df_sorted)
     total_pages = (total_words + per_page - 1) // per_page
     
@@ -2125,25 +2325,26 @@ async def send_dictionary_page(message: Message, df, page: int, per_page: int, s
         await message.answer("📚 Словарь пуст")
         return
     
+    page = min(page, total_pages - 1)
     start_idx = page * per_page
     end_idx = min(start_idx + per_page, total_words)
     page_df = df_sorted.iloc[start_idx:end_idx]
     
     # Формируем текст
     lines = [f"📚 Словарь ({start_idx+1}-{end_idx} из {total_words})\n"]
+    now = datetime.now()
     
     for _, row in page_df.iterrows():
-        english = row.get('english', 'N/A')[:30]
-        russian = row.get('russian', 'N/A')[:20]
+        english = str(row.get('english', 'N/A'))[:30]
+        russian = str(row.get('russian', 'N/A'))[:20]
         
-        try:
-            next_dt = pd.to_datetime(row.get('next_repetition_date'))
-            if next_dt <= datetime.now():
-                status = "🔴"
-            else:
-                status = "🟢"
-        except:
+        next_dt = row.get('next_repetition_date')
+        if pd.isna(next_dt):
             status = "⚪"
+        elif next_dt <= now:
+            status = "🔴"
+        else:
+            status = "🟢"
         
         lines.append(f"{status} {english} — {russian}")
     
@@ -2154,18 +2355,11 @@ async def send_dictionary_page(message: Message, df, page: int, per_page: int, s
     if page < total_pages - 1:
         nav_buttons.append(InlineKeyboardButton(text="▶️ Далее", callback_data=f"dict_page_{page+1}_{sort_by}"))
     
-    # Кнопки сортировки
-    sort_buttons = [
-        InlineKeyboardButton(text="🔤 А-Я" if sort_by != 'alpha' else "✅ А-Я", callback_data=f"dict_sort_alpha_{page}"),
-        InlineKeyboardButton(text="📅 Дата" if sort_by != 'date' else "✅ Дата", callback_data=f"dict_sort_date_{page}"),
-        InlineKeyboardButton(text="🔴 Готовы" if sort_by != 'due' else "✅ Готовы", callback_data=f"dict_sort_due_{page}")
-    ]
-    
     # Формируем клавиатуру без пустых строк
     keyboard_rows = []
     if nav_buttons:
         keyboard_rows.append(nav_buttons)
-    keyboard_rows.append(sort_buttons)
+    keyboard_rows.append(dictionary_sort_buttons(sort_by))
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
     
@@ -2174,36 +2368,129 @@ async def send_dictionary_page(message: Message, df, page: int, per_page: int, s
 
 @dp.callback_query(lambda c: c.data.startswith('dict_page_') or c.data.startswith('dict_sort_'))
 async def handle_dictionary_navigation(callback: CallbackQuery, state: FSMContext):
-    """Обработка навигации по словарю"""
+    """
+    Обработка навигации по словарю.
+
+    dict_page_<page>_<sort>[_<n|p>_<total>] - страница (для базы - от якоря
+    из FSM), dict_sort_<sort> - первая страница в другой сортировке.
+    """
     user_id = callback.from_user.id
     data = callback.data
+    parts = data.split('_')
     
-    if data.startswith('dict_page_'):
-        parts = data.split('_')
-        page = int(parts[2])
-        sort_by = parts[3] if len(parts) > 3 else 'alpha'
-    elif data.startswith('dict_sort_'):
-        parts = data.split('_')
-        sort_by = parts[2]
-        page = int(parts[3]) if len(parts) > 3 else 0
+    page = 0
+    anchor = None
+    backward = False
+    total_words = None
+    try:
+        if data.startswith('dict_page_'):
+            page = int(parts[2])
+            sort_by = parts[3] if len(parts) > 3 else 'alpha'
+            if len(parts) == 6:
+                backward = parts[4] == 'p'
+                total_words = int(parts[5])
+                anchor = (await state.get_data()).get('dict_anchors', {}).get(parts[4])
+        else:
+            sort_by = parts[2]
+    except (ValueError, IndexError):
+        # Кнопка устаревшего формата: сообщение не трогаем
+        logger.warning(f"Некорректные данные навигации по словарю: {data}")
+        await callback.answer("❌ Кнопка устарела, откройте словарь заново: /dictionary")
+        return
     
     await callback.message.delete()
     
     if USE_DATABASE:
-        await send_dictionary_page_db(callback.message, user_id, page, 10, sort_by)
+        await send_dictionary_page_db(callback.message, state, user_id, page, 10, sort_by,
+                                      total_words, anchor, backward)
     else:
         vocab_path = get_user_vocabulary_path(user_id)
         if not os.path.exists(vocab_path):
             await callback.answer("❌ Словарь не найден")
             return
         
-        import pandas as pd
-        df = pd.read_csv(vocab_path)
-        await send_dictionary_page(callback.message, df, page, 10, sort_by)
+        df_sorted = await run_blocking(sorted_vocabulary, vocab_path, sort_by)
+        await send_dictionary_page(callback.message, df_sorted, page, 10, sort_by)
     
     await callback.answer()
 
 
+def format_latency_table(title: str, rows: list, limit: int = 10) -> str:
+    """Таблица задержек для /stats: вызовов, p50 и p95 в мс, ошибок"""
+    lines = [title, f"{'':<26} {'вызовов':>7} {'p50мс':>6} {'p95мс':>6} {'ош.':>4}"]
+    for name, count, p50, p95, _, errors in rows[:limit]:
+        lines.append(f"{name[:26]:<26} {count:>7} {p50 * 1000:>6.0f} {p95 * 1000:>6.0f} {errors:>4}")
+    return "\n".join(lines)
+
+@dp.message(Command("stats"))
+async def show_stats(message: Message):
+    """Сводка метрик процесса (как /metrics) для администраторов из ADMIN_IDS"""
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("⛔ Команда доступна только администраторам бота.")
+        return
+
+    uptime = timedelta(seconds=int(time.time() - REGISTRY.started))
+    process = f" (воркер {worker_index})" if worker_index else ""
+    sections = [f"📊 Статистика процесса{process}, работает {uptime}"]
+    for title, metric, label, error_metric in (
+        ("Обработчики", 'lingualeo_handler_seconds', 'handler', 'lingualeo_handler_errors_total'),
+        ("База данных", 'lingualeo_db_seconds', 'op', 'lingualeo_db_errors_total'),
+        ("API Lingualeo", 'lingualeo_http_seconds', 'endpoint', 'lingualeo_http_errors_total'),
+    ):
+        rows = latency_rows(metric, label, error_metric=error_metric)
+        if rows:
+            sections.append("```\n" + format_latency_table(title, rows) + "\n```")
+    sections.append(
+        f"🔁 Повторы: Telegram 429 - {rate_limit_middleware.retries}, "
+        f"отправка результатов - {submission_queue.retries} (остановлено {submission_queue.failures}); "
+        f"схлопнуто правок карточек: {send_scheduler.collapsed}"
+    )
+    await message.answer("\n".join(sections), parse_mode="Markdown")
+
+def collect_queue_metrics():
+    """Счетчики, которые уже ведут планировщик отправки и очередь результатов"""
+    yield 'lingualeo_telegram_retries_total', 'counter', {}, rate_limit_middleware.retries
+    yield 'lingualeo_telegram_collapsed_edits_total', 'counter', {}, send_scheduler.collapsed
+    yield 'lingualeo_submission_retries_total', 'counter', {}, submission_queue.retries
+    yield 'lingualeo_submission_failures_total', 'counter', {}, submission_queue.failures
+
+REGISTRY.add_collector(collect_queue_metrics)
+
+metrics_runner: Optional[web.AppRunner] = None
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode('utf-8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+    )
+
+async def start_metrics_server():
+    """Запускает локальный GET /metrics (METRICS_SETTINGS); воркер i - на port + i"""
+    global metrics_runner
+    if not METRICS_SETTINGS['port'] or metrics_runner is not None:
+        return
+    host, port = METRICS_SETTINGS['host'], METRICS_SETTINGS['port'] + int(worker_index or 0)
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        # Занятый порт не должен мешать работе бота
+        logger.warning(f"Не удалось запустить /metrics на {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+    metrics_runner = runner
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+async def stop_metrics_server():
+    global metrics_runner
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+        metrics_runner = None
+
+
 def check_and_create_pid_file():
     import tempfile
     pid_file = os.path.join(tempfile.gettempdir(), 'lingualeo_bot.pid')
@@ -2227,9 +2514,100 @@ def check_and_create_pid_file():
         f.write(str(os.getpid()))
     atexit.register(lambda: os.path.exists(pid_file) and os.remove(pid_file))
 
+async def on_shutdown():
+    """Освобождает общие ресурсы процесса при остановке бота"""
+    training_prefetch.close()
+    await stop_metrics_server()
+    await submission_queue.close()
+    await send_scheduler.close()
+    await close_async_client()
+    if USE_DATABASE:
+        await database.close_pool()
+
+def build_webhook_app(bot: Bot, secret_token: Optional[str] = None, handle_in_background: bool = True) -> web.Application:
+    """
+    aiohttp-приложение, принимающее обновления Telegram на WEBHOOK_SETTINGS['path'].
+
+    Каждое обновление обрабатывается отдельной задачей (handle_in_background):
+    Telegram сразу получает 200, а медленный обработчик одного пользователя не
+    задерживает остальных. Воркеры supervisor.py отвечают только после
+    обработки, чтобы супервизор соблюдал порядок обновлений пользователя.
+    Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=handle_in_background,
+        secret_token=secret_token or None,
+    ).register(app, path=WEBHOOK_SETTINGS['path'])
+    # startup/shutdown диспетчера (в т.ч. on_shutdown) привязываются к жизни приложения
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def serve_app(app: web.Application, host: str, port: int, on_started=None):
+    """Запускает aiohttp-приложение и работает до остановки процесса"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"HTTP-сервер слушает {host}:{port}{WEBHOOK_SETTINGS['path']}")
+
+    try:
+        if on_started is not None:
+            await on_started()
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+async def run_webhook():
+    """Запускает aiohttp-сервер и регистрирует webhook в Telegram"""
+    settings = WEBHOOK_SETTINGS
+
+    async def register_webhook():
+        await bot.set_webhook(
+            settings['url'] + settings['path'],
+            secret_token=settings['secret'] or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook зарегистрирован: {settings['url']}{settings['path']}")
+
+    await serve_app(build_webhook_app(bot, settings['secret']), settings['host'], settings['port'], register_webhook)
+
+async def prepare_process(owns_user: Optional[Callable[[int], bool]] = None):
+    """
+    Общая подготовка процесса бота: база и FSM, досылка результатов.
+    owns_user - фильтр пользователей процесса (воркеры supervisor.py).
+    """
+    if USE_DATABASE:
+        # Открываем соединение и применяем схему один раз при старте
+        await database.get_pool()
+        expired = await database.delete_expired_fsm_records(int(time.time()))
+        if expired:
+            logger.info(f"Удалено истекших FSM-сессий: {expired}")
+    # Досылаем результаты, не отправленные до остановки
+    await submission_queue.start(owns_user)
+    await start_metrics_server()
+    dp.shutdown.register(on_shutdown)
+
+async def run_worker(port: int, secret: str, owns_user: Callable[[int], bool]):
+    """
+    Процесс-воркер supervisor.py: принимает на 127.0.0.1:port обновления
+    своей доли пользователей и обрабатывает их по одному на пользователя.
+    """
+    await prepare_process(owns_user)
+    await serve_app(build_webhook_app(bot, secret, handle_in_background=False), '127.0.0.1', port)
+
 async def main():
     check_and_create_pid_file()
-    await dp.start_polling(bot)
+    await prepare_process()
+    if WEBHOOK_SETTINGS['url']:
+        await run_webhook()
+    else:
+        # Long polling - режим по умолчанию; оставшийся webhook помешал бы getUpdates
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Сколько живет заранее подготовленная порция слов (секунды)
+DEFAULT_TTL = 300
+
+
+def fingerprint(text: str) -> str:
+    """Короткий отпечаток строки (например, cookies), чтобы не хранить ее саму"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class _Entry:
+    __slots__ = ('task', 'fingerprint', 'expires_at')
+
+    def __init__(self, task: asyncio.Task, fingerprint: str, expires_at: float):
+        self.task = task
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+
+
+class PrefetchCache:
+    """
+    Фоновая подготовка данных заранее, с коротким временем жизни.
+
+    schedule() запускает загрузку в фоне, take() забирает результат (дожидаясь
+    загрузки, если она еще идет). Результат отбрасывается, если истек ttl,
+    изменился отпечаток (например, cookies) или ключ сброшен invalidate().
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, _Entry] = {}
+
+    def schedule(self, key: Hashable, fingerprint: str, factory: Callable[[], Awaitable[Any]]):
+        """Запускает фоновую загрузку для key, заменяя предыдущую"""
+        self.invalidate(key)
+        task = asyncio.create_task(factory())
+        task.add_done_callback(self._log_failure)
+        self._entries[key] = _Entry(task, fingerprint, time.monotonic() + self.ttl)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Фоновая загрузка не удалась: {task.exception()}")
+
+    async def take(self, key: Hashable, fingerprint: str) -> Optional[Any]:
+        """Забирает подготовленные данные или None, если их нет или они устарели"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry.fingerprint != fingerprint or entry.expires_at <= time.monotonic():
+            entry.task.cancel()
+            return None
+        try:
+            return await entry.task
+        except Exception:
+            return None
+
+    def invalidate(self, key: Hashable):
+        """Отбрасывает подготовленные или загружаемые данные для key"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.task.cancel()
+
+    def close(self):
+        for key in list(self._entries):
+            self.invalidate(key)
@@ -0,0 +1,142 @@
+"""
+Самопроверка webhook-режима без Telegram.
+
+Поднимает приложение tg_bot.build_webhook_app на локальном порту с ботом,
+запросы которого к Bot API не уходят в сеть, а записываются, и отправляет
+поддельные обновления /start:
+  - запрос с неверным секретом отклоняется (401);
+  - пачка обновлений отправляется параллельно, каждое сразу получает 200;
+  - на каждое обновление бот отвечает sendMessage в нужный чат.
+
+Запуск: python webhook_selftest.py [--updates 50] [--timeout 10]
+Для SQLite используется временная база, рабочая lingualeo.db не трогается.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import Chat, Message
+
+import tg_bot
+
+SECRET = 'selftest-secret'
+
+
+class RecordingSession(BaseSession):
+    """Сессия Bot API, которая записывает вызовы вместо отправки в Telegram"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[TelegramMethod] = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=len(self.calls),
+                date=int(time.time()),
+                chat=Chat(id=method.chat_id, type='private'),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def fake_update(update_id: int, user_id: int, text: str = '/start') -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Selftest'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+        },
+    }
+
+
+async def run(updates: int, timeout: float) -> bool:
+    session = RecordingSession()
+    bot = Bot(token='123456:SELFTEST', session=session)
+    app = tg_bot.build_webhook_app(bot, SECRET)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}{tg_bot.WEBHOOK_SETTINGS['path']}"
+    ok = True
+
+    try:
+        async with ClientSession() as client:
+            async with client.post(url, json=fake_update(0, 1), headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'}) as response:
+                rejected = response.status == 401
+                print(f"Неверный секрет: HTTP {response.status} {'OK' if rejected else 'ОШИБКА'}")
+                ok &= rejected
+
+            async def post(i: int) -> int:
+                headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+                async with client.post(url, json=fake_update(i, 1000 + i), headers=headers) as response:
+                    return response.status
+
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(post(i) for i in range(1, updates + 1)))
+            accepted = time.perf_counter() - start
+            all_ok = all(status == 200 for status in statuses)
+            print(f"Принято {statuses.count(200)}/{updates} обновлений за {accepted * 1000:.1f} ms")
+            ok &= all_ok
+
+        # Обработчики работают в фоне после ответа 200 - ждем их ответы
+        expected = {1000 + i for i in range(1, updates + 1)}
+        deadline = time.monotonic() + timeout
+        answered = set()
+        while time.monotonic() < deadline:
+            answered = {call.chat_id for call in session.calls if isinstance(call, SendMessage)}
+            if expected <= answered:
+                break
+            await asyncio.sleep(0.05)
+        handled = time.perf_counter() - start
+        answered_all = expected <= answered
+        print(f"Ответов бота: {len(expected & answered)}/{updates} за {handled * 1000:.1f} ms "
+              f"{'OK' if answered_all else 'ОШИБКА'}")
+        ok &= answered_all
+    finally:
+        await runner.cleanup()
+        # Закрываем пул базы и HTTP-клиент, как при остановке бота
+        await tg_bot.on_shutdown()
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=50, help='Сколько поддельных обновлений отправить')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Сколько ждать ответов бота (секунды)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not tg_bot.USE_POSTGRESQL:
+            tg_bot.database.DB_PATH = os.path.join(tmp_dir, 'selftest.db')
+        ok = await run(args.updates, args.timeout)
+    print("Самопроверка пройдена" if ok else "Самопроверка НЕ пройдена")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
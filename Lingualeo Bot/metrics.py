@@ -0,0 +1,259 @@
+import bisect
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+# Границы корзин гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Счетчики по корзинам, сумма и количество наблюдений"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        # Последняя корзина - значения больше верхней границы (+Inf)
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def quantile(self, q: float, buckets: Tuple[float, ...]) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины, как histogram_quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(buckets):
+                    return buckets[-1]
+                lower = buckets[i - 1] if i else 0.0
+                return lower + (buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return buckets[-1]
+
+
+class Registry:
+    """
+    Метрики процесса в памяти: гистограммы задержек и счетчики с метками.
+
+    Запись - пара обращений к словарю и bisect по 12 границам, без блокировок
+    и ввода-вывода (все вызовы идут из одного event loop). render() отдает
+    текст в формате экспозиции Prometheus; значения, которые уже считают
+    другие объекты (повторы, схлопнутые правки), подключаются через
+    add_collector и читаются только при выгрузке.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]] = []
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, labels: Labels, seconds: float):
+        series = self._histograms.get(name)
+        if series is None:
+            series = self._histograms[name] = {}
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(len(self.buckets))
+        histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram.sum += seconds
+        histogram.count += 1
+
+    def inc(self, name: str, labels: Labels, value: float = 1):
+        series = self._counters.get(name)
+        if series is None:
+            series = self._counters[name] = {}
+        series[labels] = series.get(labels, 0) + value
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]):
+        """collector() возвращает (имя, тип counter/gauge, метки, значение) на момент выгрузки"""
+        self._collectors.append(collector)
+
+    def histograms(self, name: str) -> Dict[Labels, Histogram]:
+        return self._histograms.get(name, {})
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        return self._counters.get(name, {})
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)"""
+        lines = []
+        for name, series in sorted(self._histograms.items()):
+            self._header(lines, name, 'histogram')
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, series in sorted(self._counters.items()):
+            self._header(lines, name, 'counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value!r}")
+        collected: Dict[str, List[Tuple[str, Dict[str, Any], float]]] = {}
+        for collector in self._collectors:
+            for name, kind, labels, value in collector():
+                collected.setdefault(name, []).append((kind, labels, value))
+        for name, samples in sorted(collected.items()):
+            self._header(lines, name, samples[0][0])
+            for _, labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple((k, str(v)) for k, v in labels.items()))} {value!r}")
+        lines.append("# TYPE lingualeo_process_start_time_seconds gauge")
+        lines.append(f"lingualeo_process_start_time_seconds {self.started!r}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+
+REGISTRY.describe('lingualeo_update_seconds', 'Время обработки обновления Telegram: фильтры и обработчик')
+REGISTRY.describe('lingualeo_handler_seconds', 'Время работы обработчика aiogram')
+REGISTRY.describe('lingualeo_handler_errors_total', 'Исключения, вышедшие из обработчика')
+REGISTRY.describe('lingualeo_db_seconds', 'Время вызова функции модуля базы данных')
+REGISTRY.describe('lingualeo_db_errors_total', 'Ошибки вызовов базы данных')
+REGISTRY.describe('lingualeo_http_seconds', 'Время запроса к API Lingualeo до получения заголовков ответа')
+REGISTRY.describe('lingualeo_http_errors_total', 'Ошибки запросов к API Lingualeo: исключения и статусы 4xx/5xx')
+
+
+def _timed(func: Callable, registry: Registry, metric: str, error_metric: str, op: str) -> Callable:
+    labels = (('op', op),)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            registry.inc(error_metric, labels + (('error', type(e).__name__),))
+            raise
+        finally:
+            registry.observe(metric, labels, time.perf_counter() - start)
+    return wrapper
+
+
+def instrument_module(module, metric: str = 'lingualeo_db_seconds', error_metric: str = 'lingualeo_db_errors_total',
+                      exclude: Iterable[str] = (), registry: Registry = REGISTRY) -> int:
+    """
+    Оборачивает публичные async-функции модуля (db / db_sqlite) замером
+    времени с меткой op=<имя функции>. Вызовы через атрибут модуля
+    (database.get_due_words) попадают в замер. Возвращает число функций.
+    """
+    exclude = set(exclude)
+    wrapped = 0
+    for name, func in list(vars(module).items()):
+        if name.startswith('_') or name in exclude or not inspect.iscoroutinefunction(func):
+            continue
+        if func.__module__ != module.__name__ or hasattr(func, '__wrapped__'):
+            continue
+        setattr(module, name, _timed(func, registry, metric, error_metric, name))
+        wrapped += 1
+    return wrapped
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx, замеряющий запросы по пути URL (/ProcessTraining, /GetWords, ...)"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, registry: Registry = REGISTRY):
+        self.transport = transport
+        self.registry = registry
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        labels = (('endpoint', request.url.path),)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            self.registry.inc('lingualeo_http_errors_total', labels + (('error', type(e).__name__),))
+            raise
+        finally:
+            self.registry.observe('lingualeo_http_seconds', labels, time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.registry.inc('lingualeo_http_errors_total', labels + (('error', f"http_{response.status_code}"),))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class HandlerMetricsMiddleware:
+    """
+    Middleware aiogram, замеряющее обработку событий.
+
+    Как внешнее (dp.update.outer_middleware) пишет lingualeo_update_seconds
+    с меткой типа события; как внутреннее (dp.message.middleware и т.п.) -
+    lingualeo_handler_seconds с именем функции обработчика, которое
+    известно только после фильтров.
+    """
+
+    def __init__(self, metric: str = 'lingualeo_handler_seconds', registry: Registry = REGISTRY):
+        self.metric = metric
+        self.registry = registry
+
+    async def __call__(self, handler, event, data: Dict[str, Any]):
+        handler_object = data.get('handler')
+        if handler_object is not None:
+            name = getattr(handler_object.callback, '__name__', 'unknown')
+            labels = (('handler', name),)
+        else:
+            labels = (('event', getattr(event, 'event_type', type(event).__name__)),)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            if handler_object is not None:
+                self.registry.inc('lingualeo_handler_errors_total', labels + (('error', type(e).__name__),))
+            raise
+        finally:
+            self.registry.observe(self.metric, labels, time.perf_counter() - start)
+
+
+def latency_rows(name: str, label: str, registry: Registry = REGISTRY,
+                 error_metric: Optional[str] = None) -> List[Tuple[str, int, float, float, float, int]]:
+    """
+    Строки для /stats: (значение метки, вызовов, p50, p95, сумма секунд, ошибок),
+    по убыванию суммарного времени.
+    """
+    buckets = registry.buckets
+    errors: Dict[str, float] = {}
+    if error_metric:
+        for labels, value in registry.counters(error_metric).items():
+            key = dict(labels).get(label, '')
+            errors[key] = errors.get(key, 0) + value
+    rows = []
+    for labels, histogram in registry.histograms(name).items():
+        key = dict(labels).get(label, '')
+        rows.append((
+            key, histogram.count, histogram.quantile(0.5, buckets), histogram.quantile(0.95, buckets),
+            histogram.sum, int(errors.get(key, 0)),
+        ))
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return rows
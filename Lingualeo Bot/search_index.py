@@ -0,0 +1,163 @@
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Длина n-грамм индекса; более короткие запросы ищутся по n-граммам своей длины
+NGRAM_SIZE = 3
+
+
+def normalize_term(text) -> str:
+    """Приводит текст к виду для поиска: casefold (в т.ч. кириллица) без крайних пробелов"""
+    if not isinstance(text, str):
+        return ''
+    return text.casefold().strip()
+
+
+def match_rank(term: str, *texts) -> int:
+    """
+    Ранг совпадения нормализованного term с текстами слова:
+    0 - точное совпадение, 1 - совпадение с начала, 2 - вхождение, 3 - нет.
+    """
+    rank = 3
+    for text in texts:
+        text = normalize_term(text)
+        if text == term:
+            return 0
+        if text.startswith(term):
+            rank = 1
+        elif rank > 2 and term in text:
+            rank = 2
+    return rank
+
+
+_TOKEN_SPLIT = re.compile(r"[\s\-/,;()]+")
+
+
+def _ngrams(text: str, size: int) -> Set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NgramIndex:
+    """
+    Поисковый индекс словаря в памяти для режима без базы данных.
+
+    Для каждого слова индексируются n-граммы длины 1..NGRAM_SIZE английского
+    и русского текста. Запрос длиной до NGRAM_SIZE символов - это одна
+    выборка из словаря n-грамм, более длинный - пересечение списков его
+    n-грамм (от самого короткого) и проверка вхождения у оставшихся слов.
+    """
+
+    def __init__(self, size: int = NGRAM_SIZE):
+        self.size = size
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: List[Tuple[str, str]] = []
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]], size: int = NGRAM_SIZE) -> 'NgramIndex':
+        """Строит индекс по парам (english, russian); номер пары - позиция слова"""
+        index = cls(size)
+        for english, russian in pairs:
+            index.add(english, russian)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, english, russian) -> int:
+        position = len(self._texts)
+        texts = (normalize_term(english), normalize_term(russian))
+        self._texts.append(texts)
+        grams = set()
+        for text in texts:
+            for n in range(1, self.size + 1):
+                grams |= _ngrams(text, n)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(position)
+        return position
+
+    def _candidates(self, term: str) -> Set[int]:
+        if len(term) <= self.size:
+            return self._postings.get(term, set())
+        postings = []
+        for gram in _ngrams(term, self.size):
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, term: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Позиции слов, содержащих term, по рангу: точные совпадения, затем
+        совпадения с начала, затем вхождения; внутри ранга - короче и по алфавиту.
+        """
+        term = normalize_term(term)
+        if not term:
+            return []
+        ranked = []
+        for position in self._candidates(term):
+            rank = match_rank(term, *self._texts[position])
+            if rank < 3:
+                english = self._texts[position][0]
+                ranked.append((rank, len(english), english, position))
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [item[3] for item in ranked]
+
+
+class PrefixIndex:
+    """
+    Отсортированный индекс префиксов для поиска по мере набора (inline-режим).
+
+    Ключи - нормализованный английский и русский текст целиком и каждое
+    слово внутри него, поиск - bisect по отсортированному списку ключей и
+    чтение подряд идущих ключей с нужным префиксом, без обращения к базе.
+    """
+
+    def __init__(self, entries: List[Tuple[str, str, Any]]):
+        self.entries = entries
+        pairs = set()
+        for position, (english, russian, _) in enumerate(entries):
+            for text in (normalize_term(english), normalize_term(russian)):
+                if not text:
+                    continue
+                pairs.add((text, position))
+                for token in _TOKEN_SPLIT.split(text):
+                    if token and token != text:
+                        pairs.add((token, position))
+        pairs = sorted(pairs)
+        self._keys = [key for key, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, str, Any]]) -> 'PrefixIndex':
+        """Строит индекс по записям (english, russian, данные слова)"""
+        return cls([(str(english or ''), str(russian or ''), payload) for english, russian, payload in entries])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, prefix: str, limit: int = 20) -> List[Tuple[str, str, Any]]:
+        """Записи, у которых текст или одно из слов начинается с prefix (точные первыми)"""
+        prefix = normalize_term(prefix)
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        for i in range(bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            position = self._positions[i]
+            if position not in seen:
+                seen.add(position)
+                found.append(self.entries[position])
+                if len(found) >= limit:
+                    break
+        return found
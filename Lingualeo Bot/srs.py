@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+
+# Параметры интервального повторения (вариант SM-2 с интервалами в часах)
+FIRST_INTERVAL_HOURS = 1.0
+SECOND_INTERVAL_HOURS = 6.0
+WRONG_INTERVAL_HOURS = 0.5
+EASE_BONUS = 0.1
+EASE_PENALTY = 0.2
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+
+
+def next_states(repetitions, ease_factor, interval_hours, correct) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Следующее состояние для пачки слов. Все аргументы - массивы одинаковой длины
+    (или скаляры). Возвращает (repetitions, ease_factor, interval_hours).
+
+    Правильный ответ: repetitions + 1; интервал 1 ч, затем 6 ч, затем interval * ease;
+    ease + 0.1. Неправильный: repetitions = 0, интервал 0.5 ч, ease - 0.2.
+    Ease не опускается ниже 1.3.
+    """
+    repetitions = np.asarray(repetitions, dtype='int64')
+    ease_factor = np.asarray(ease_factor, dtype='float64')
+    interval_hours = np.asarray(interval_hours, dtype='float64')
+    correct = np.asarray(correct, dtype=bool)
+
+    new_repetitions = np.where(correct, repetitions + 1, 0)
+    new_interval = np.select(
+        [~correct, new_repetitions == 1, new_repetitions == 2],
+        [WRONG_INTERVAL_HOURS, FIRST_INTERVAL_HOURS, SECOND_INTERVAL_HOURS],
+        default=interval_hours * ease_factor,
+    )
+    new_ease = np.maximum(MIN_EASE, np.where(correct, ease_factor + EASE_BONUS, ease_factor - EASE_PENALTY))
+    return new_repetitions, new_ease, new_interval
+
+
+def next_state(repetitions: int, ease_factor: float, interval_hours: float, correct: bool) -> Tuple[int, float, float]:
+    """next_states для одного слова: (repetitions, ease_factor, interval_hours) в типах Python"""
+    reps, ease, interval = next_states(repetitions, ease_factor, interval_hours, correct)
+    return int(reps), float(ease), float(interval)
+
+
+def due_dates(now: datetime, interval_hours) -> np.ndarray:
+    """Даты следующего повторения (datetime64[us]) для массива интервалов"""
+    offsets = (np.asarray(interval_hours, dtype='float64') * 3600 * 1e6).astype('int64').astype('timedelta64[us]')
+    return np.datetime64(now, 'us') + offsets
+
+
+def scheduled_intervals(repetitions, ease_factor) -> np.ndarray:
+    """
+    Интервал, который текущий алгоритм дал бы слову с этим числом
+    повторений подряд при данном ease (используется при пересчете расписания).
+    """
+    repetitions = np.asarray(repetitions, dtype='int64')
+    ease_factor = np.asarray(ease_factor, dtype='float64')
+    return np.select(
+        [repetitions <= 0, repetitions == 1, repetitions == 2],
+        [WRONG_INTERVAL_HOURS, FIRST_INTERVAL_HOURS, SECOND_INTERVAL_HOURS],
+        default=SECOND_INTERVAL_HOURS * np.power(ease_factor, np.maximum(repetitions - 2, 0)),
+    )
+
+
+def reschedule(repetitions, ease_factor, interval_hours, due) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пересчитывает расписание пачки слов после смены алгоритма.
+
+    Момент последнего повторения восстанавливается как due - interval,
+    от него откладывается новый интервал. Возвращает (interval_hours, due)
+    с due в datetime64[us].
+    """
+    old_interval = np.asarray(interval_hours, dtype='float64')
+    due = np.asarray(due, dtype='datetime64[us]')
+    reviewed_at = due - (old_interval * 3600 * 1e6).astype('int64').astype('timedelta64[us]')
+    new_interval = scheduled_intervals(repetitions, ease_factor)
+    new_due = reviewed_at + (new_interval * 3600 * 1e6).astype('int64').astype('timedelta64[us]')
+    return new_interval, new_due
@@ -0,0 +1,115 @@
+"""
+Проверки search_index.py: ранжирование NgramIndex (/wordstatus без базы),
+поиск по мере набора в PrefixIndex (inline-режим) и приведение регистра,
+в том числе для кириллицы.
+
+Использование:
+python test_search_index.py    (или pytest test_search_index.py)
+"""
+import random
+
+from search_index import NgramIndex, PrefixIndex, match_rank, normalize_term
+
+WORDS = [
+    ('scatter', 'разбрасывать'),
+    ('cat', 'Кошка'),
+    ('category', 'категория'),
+    ('concatenate', 'сцеплять'),
+    ('bobcat', 'рысь'),
+    ('dog', 'собака'),
+    ('ice cream', 'Мороженое'),
+    ('Straße', 'улица'),
+]
+
+
+def english_of(index_positions):
+    return [WORDS[position][0] for position in index_positions]
+
+
+def test_ngram_ranking():
+    index = NgramIndex.build(WORDS)
+    # Точное совпадение, затем с начала, затем вхождения (короче - раньше)
+    assert english_of(index.search('cat')) == ['cat', 'category', 'bobcat', 'scatter', 'concatenate']
+
+
+def test_ngram_long_query_uses_intersection():
+    index = NgramIndex.build(WORDS)
+    assert english_of(index.search('cate')) == ['category', 'concatenate']
+    assert index.search('catx') == []
+
+
+def test_ngram_short_queries_and_limit():
+    index = NgramIndex.build(WORDS)
+    assert english_of(index.search('do')) == ['dog']
+    assert len(index.search('a')) > 2
+    assert english_of(index.search('cat', limit=2)) == ['cat', 'category']
+    assert index.search('') == [] and index.search('   ') == []
+
+
+def test_ngram_cyrillic_case_folding():
+    index = NgramIndex.build(WORDS)
+    assert english_of(index.search('КОШ')) == ['cat']
+    assert english_of(index.search('кошка')) == ['cat']
+    assert english_of(index.search('МОРОЖЕНОЕ')) == ['ice cream']
+    # casefold, а не lower: ß совпадает с ss
+    assert english_of(index.search('STRASSE')) == ['Straße']
+
+
+def test_ngram_matches_full_scan():
+    rng = random.Random(17)
+    alphabet = 'abcdeабвгд'
+    words = [
+        (''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 9))),
+         ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 9))))
+        for _ in range(500)
+    ]
+    index = NgramIndex.build(words)
+    for _ in range(200):
+        term = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+        expected = sorted(
+            (match_rank(term, english, russian), len(english), english, position)
+            for position, (english, russian) in enumerate(words)
+            if match_rank(term, english, russian) < 3
+        )
+        assert index.search(term) == [item[3] for item in expected], term
+
+
+def test_prefix_search_by_token():
+    index = PrefixIndex.build((english, russian, i) for i, (english, russian) in enumerate(WORDS))
+    assert [payload for _, _, payload in index.search('cre')] == [6]
+    assert [payload for _, _, payload in index.search('ice c')] == [6]
+    # Вхождение не с начала слова префиксом не считается
+    assert index.search('ream') == []
+
+
+def test_prefix_exact_first_and_no_duplicates():
+    index = PrefixIndex.build((english, russian, i) for i, (english, russian) in enumerate(WORDS))
+    found = [english for english, _, _ in index.search('cat')]
+    assert found[0] == 'cat'
+    assert sorted(found) == ['cat', 'category']
+    assert len(index.search('cat', limit=1)) == 1
+
+
+def test_prefix_cyrillic_case_folding():
+    index = PrefixIndex.build([('ice cream', 'Мороженое', None), ('cat', 'Кошка', None)])
+    assert [english for english, _, _ in index.search('МОР')] == ['ice cream']
+    assert [english for english, _, _ in index.search('кош')] == ['cat']
+    assert normalize_term('  КоШкА ') == 'кошка'
+
+
+def main():
+    tests = [(name, func) for name, func in globals().items() if name.startswith('test_') and callable(func)]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+    print(f"\nПройдено {len(tests) - failed} из {len(tests)}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Проверки lingualeo_pyth/send_scheduler.py на поддельной сессии Telegram
+с его лимитами (см. send_scheduler_harness.py):
+  - 429 не доходят до вызывающих, все сообщения доставлены;
+  - правки одного сообщения схлопываются, каждый вызов получает ответ;
+  - ответы пользователям получают токен раньше фоновых уведомлений;
+  - 429 retry_after повторяется после паузы.
+
+Использование:
+python test_send_scheduler.py    (или pytest test_send_scheduler.py)
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lingualeo_pyth'))
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from send_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimitMiddleware, SendScheduler, TokenBucket, bulk_priority
+from send_scheduler_harness import FakeTelegramSession
+
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3.0
+
+
+def make_bot(session):
+    return Bot(token='123456:TEST', session=session)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2.0, capacity=2.0, now=0.0)
+    assert bucket.delay(0.0) == 0.0
+    bucket.take()
+    bucket.take()
+    assert abs(bucket.delay(0.0) - 0.5) < 1e-9
+    assert bucket.delay(0.5) == 0.0
+    bucket.block(10.0)
+    assert abs(bucket.delay(4.0) - 6.0) < 1e-9
+
+
+def test_burst_without_errors():
+    async def run():
+        session = FakeTelegramSession(GLOBAL_RATE, CHAT_RATE, CHAT_BURST, latency=0.01)
+        scheduler = SendScheduler(global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST)
+        session.middleware(RateLimitMiddleware(scheduler))
+        bot = make_bot(session)
+
+        async def answers(chat_id):
+            for i in range(4):
+                await bot.send_message(chat_id, f'Ответ {i}')
+
+        async def notify(chat_id):
+            with bulk_priority():
+                await bot.send_message(chat_id, 'Сервер принял результаты')
+
+        try:
+            await asyncio.gather(
+                *(answers(i + 1) for i in range(10)),
+                *(notify(1000 + i) for i in range(40)),
+            )
+        finally:
+            await scheduler.close()
+        return session
+
+    session = asyncio.run(run())
+    # Без планировщика эта нагрузка превышает оба лимита (см. send_scheduler_harness.py)
+    assert len(session.delivered) == 10 * 4 + 40
+
+
+def test_edits_collapse():
+    async def run():
+        session = FakeTelegramSession(GLOBAL_RATE, CHAT_RATE, CHAT_BURST, latency=0.01)
+        scheduler = SendScheduler(global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST)
+        session.middleware(RateLimitMiddleware(scheduler))
+        bot = make_bot(session)
+        try:
+            # Первые правки забирают запас чата, остальные ждут и заменяют друг друга
+            results = await asyncio.gather(*(
+                bot.edit_message_text(f'Карточка {n}', chat_id=7, message_id=1) for n in range(10)
+            ))
+        finally:
+            await scheduler.close()
+        return session, scheduler, results
+
+    session, scheduler, results = asyncio.run(run())
+    assert scheduler.collapsed > 0
+    assert len(session.delivered) == 10 - scheduler.collapsed
+    assert all(result is not None for result in results)
+    # Замененные правки получают ответ последней правки
+    assert results[-1].text == 'Карточка 9'
+
+
+def test_cancelled_edit_releases_superseded():
+    async def run():
+        session = FakeTelegramSession(GLOBAL_RATE, CHAT_RATE, CHAT_BURST, latency=0.01)
+        scheduler = SendScheduler(global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST)
+        session.middleware(RateLimitMiddleware(scheduler))
+        bot = make_bot(session)
+        try:
+            # Запас чата израсходован, обе правки ждут токен, вторая заменяет первую
+            for i in range(int(CHAT_BURST)):
+                await bot.send_message(7, f'Ответ {i}')
+            older = asyncio.create_task(bot.edit_message_text('Карточка 1', chat_id=7, message_id=1))
+            await asyncio.sleep(0.05)
+            newer = asyncio.create_task(bot.edit_message_text('Карточка 2', chat_id=7, message_id=1))
+            await asyncio.sleep(0.05)
+            newer.cancel()
+            # Замененная правка не должна ждать отмененную вечно
+            return await asyncio.wait_for(older, timeout=3)
+        finally:
+            await scheduler.close()
+
+    message = asyncio.run(run())
+    assert message.text == 'Карточка 1'
+
+
+def test_interactive_before_bulk():
+    async def run():
+        scheduler = SendScheduler(global_rate=5.0, global_burst=1.0)
+        try:
+            first = scheduler.submit(1, PRIORITY_BULK)
+            await first.grant
+            # Общий токен израсходован: следующий получит тот, у кого выше приоритет
+            bulk = scheduler.submit(2, PRIORITY_BULK)
+            interactive = scheduler.submit(3, PRIORITY_INTERACTIVE)
+            done, _ = await asyncio.wait({bulk.grant, interactive.grant}, return_when=asyncio.FIRST_COMPLETED)
+            return interactive.grant in done and bulk.grant not in done
+        finally:
+            await scheduler.close()
+
+    assert asyncio.run(run())
+
+
+def test_retry_after_is_retried():
+    class FlakySession(FakeTelegramSession):
+        def __init__(self):
+            super().__init__(GLOBAL_RATE, CHAT_RATE, CHAT_BURST, latency=0.0)
+            self.failures = 1
+
+        async def make_request(self, bot, method, timeout=None):
+            if self.failures:
+                self.failures -= 1
+                raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=1)
+            return await super().make_request(bot, method, timeout)
+
+    async def run():
+        session = FlakySession()
+        scheduler = SendScheduler(global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST)
+        middleware = RateLimitMiddleware(scheduler)
+        session.middleware(middleware)
+        bot = make_bot(session)
+        start = time.monotonic()
+        try:
+            message = await bot.send_message(5, 'Привет')
+        finally:
+            await scheduler.close()
+        return message, middleware.retries, time.monotonic() - start
+
+    message, retries, elapsed = asyncio.run(run())
+    assert message.text == 'Привет'
+    assert retries == 1
+    assert elapsed >= 0.9
+
+
+def main():
+    tests = [(name, func) for name, func in globals().items() if name.startswith('test_') and callable(func)]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✅ {name}")
+        except Exception as e:
+            # 429 или другая ошибка, дошедшая до вызывающего, - тоже провал
+            failed += 1
+            print(f"❌ {name}: {type(e).__name__}: {e}")
+    print(f"\nПройдено {len(tests) - failed} из {len(tests)}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
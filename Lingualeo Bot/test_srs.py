@@ -0,0 +1,118 @@
+"""
+Проверки srs.py: пакетный расчет совпадает с прежним правилом, которое
+выполнялось для каждого слова отдельно (update_word_after_training).
+
+Использование:
+python test_srs.py    (или pytest test_srs.py)
+"""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import srs
+
+
+def per_row_rule(repetitions, ease_factor, interval_hours, correct):
+    """Прежний расчет для одного слова из db.py / db_sqlite.py"""
+    if correct:
+        repetitions += 1
+        if repetitions == 1:
+            interval_hours = 1.0
+        elif repetitions == 2:
+            interval_hours = 6.0
+        else:
+            interval_hours = interval_hours * ease_factor
+        ease_factor = max(1.3, ease_factor + 0.1)
+    else:
+        repetitions = 0
+        interval_hours = 0.5
+        ease_factor = max(1.3, ease_factor - 0.2)
+    return repetitions, ease_factor, interval_hours
+
+
+def random_states(count, seed=13):
+    rng = random.Random(seed)
+    return [
+        (rng.randint(0, 10), rng.uniform(1.3, 3.0), rng.uniform(0.5, 2000.0), rng.random() < 0.5)
+        for _ in range(count)
+    ]
+
+
+def test_next_states_matches_per_row_rule():
+    states = random_states(2000)
+    reps, ease, interval, correct = (list(column) for column in zip(*states))
+    new_reps, new_ease, new_interval = srs.next_states(reps, ease, interval, correct)
+    expected = [per_row_rule(*state) for state in states]
+    assert new_reps.tolist() == [e[0] for e in expected]
+    assert np.allclose(new_ease, [e[1] for e in expected])
+    assert np.allclose(new_interval, [e[2] for e in expected])
+
+
+def test_next_state_single_word():
+    for state in random_states(200, seed=7):
+        reps, ease, interval = srs.next_state(*state)
+        assert isinstance(reps, int) and isinstance(ease, float) and isinstance(interval, float)
+        expected = per_row_rule(*state)
+        assert reps == expected[0]
+        assert abs(ease - expected[1]) < 1e-9
+        assert abs(interval - expected[2]) < 1e-9
+
+
+def test_series_of_answers():
+    """Цепочка ответов одного слова: 1 ч, 6 ч, затем interval * ease; ошибка сбрасывает"""
+    state = (0, srs.DEFAULT_EASE, 0.0)
+    intervals = []
+    for correct in (True, True, True, False, True):
+        state = srs.next_state(*state, correct)
+        intervals.append(state[2])
+    assert intervals[:2] == [1.0, 6.0]
+    # Третий ответ: ease уже 2.5 + 0.1 + 0.1
+    assert abs(intervals[2] - 6.0 * 2.7) < 1e-9
+    assert intervals[3] == srs.WRONG_INTERVAL_HOURS
+    assert intervals[4] == srs.FIRST_INTERVAL_HOURS
+    assert state[0] == 1
+
+
+def test_ease_floor():
+    _, ease, _ = srs.next_states([3, 0], [1.35, 1.3], [10.0, 1.0], [False, False])
+    assert ease.tolist() == [srs.MIN_EASE, srs.MIN_EASE]
+
+
+def test_due_dates():
+    now = datetime(2026, 1, 5, 12, 0, 0)
+    due = srs.due_dates(now, [0.5, 1.0, 30.0])
+    assert due.astype(datetime).tolist() == [now + timedelta(hours=h) for h in (0.5, 1.0, 30.0)]
+
+
+def test_reschedule_keeps_review_moment():
+    repetitions = np.array([0, 1, 2, 3, 5])
+    ease = np.array([2.5, 2.5, 2.1, 2.5, 1.8])
+    old_interval = np.array([12.0, 12.0, 24.0, 36.0, 100.0])
+    due = np.array(['2026-01-10T00:00:00'] * 5, dtype='datetime64[us]')
+
+    new_interval, new_due = srs.reschedule(repetitions, ease, old_interval, due)
+
+    assert np.allclose(new_interval, [0.5, 1.0, 6.0, 6.0 * 2.5, 6.0 * 1.8 ** 3])
+    # Момент последнего повторения (due - interval) не меняется
+    reviewed_before = due - (old_interval * 3600 * 1e6).astype('int64').astype('timedelta64[us]')
+    reviewed_after = new_due - (new_interval * 3600 * 1e6).astype('int64').astype('timedelta64[us]')
+    assert (np.abs((reviewed_after - reviewed_before).astype('int64')) <= 1).all()
+
+
+def main():
+    tests = [(name, func) for name, func in globals().items() if name.startswith('test_') and callable(func)]
+    failed = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+    print(f"\nПройдено {len(tests) - failed} из {len(tests)}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
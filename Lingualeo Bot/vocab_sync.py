@@ -0,0 +1,157 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Dict, Iterable, List, Optional
+
+
+def word_content_hash(english: str, russian: str) -> str:
+    """
+    Хеш содержимого слова: меняется только при изменении слова или перевода.
+    """
+    raw = f"{english or ''}\x1f{russian or ''}".encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def normalize_export_word(raw_word: Dict) -> Dict:
+    """
+    Приводит слово из ответа loadCompactWords к формату словаря бота.
+    """
+    english = raw_word.get('wd') or ''
+    russian = raw_word.get('trc') or ''
+    return {
+        'word_id': raw_word.get('id'),
+        'english': english,
+        'russian': russian,
+        'content_hash': word_content_hash(english, russian),
+    }
+
+
+def normalize_export_words(raw_words: Iterable[Dict]) -> Dict[int, Dict]:
+    """
+    Нормализует экспорт Lingualeo в {word_id: word}, отбрасывая дубликаты и слова без ID.
+    """
+    words = {}
+    for raw_word in raw_words:
+        _add_export_word(words, raw_word)
+    return words
+
+
+async def normalize_export_words_async(raw_words: AsyncIterable[Dict]) -> Dict[int, Dict]:
+    """
+    То же, что normalize_export_words, для потокового экспорта: в памяти
+    остаются только нормализованные слова, а не весь ответ API.
+    """
+    words = {}
+    async for raw_word in raw_words:
+        _add_export_word(words, raw_word)
+    return words
+
+
+def _add_export_word(words: Dict[int, Dict], raw_word: Dict):
+    word = normalize_export_word(raw_word)
+    if word['word_id'] is None or not word['english'] or word['word_id'] in words:
+        return
+    words[word['word_id']] = word
+
+
+def vocabulary_digest(words: Dict[int, Dict]) -> str:
+    """
+    Дайджест всего словаря {word_id: word} (не зависит от порядка слов).
+    Совпадение с сохраненным дайджестом означает, что синхронизировать нечего.
+    """
+    digest = hashlib.sha1()
+    for word_id in sorted(words):
+        digest.update(f"{word_id}:{words[word_id]['content_hash']};".encode('utf-8'))
+    return digest.hexdigest()
+
+
+@dataclass
+class VocabularyDelta:
+    """Разница между словарем Lingualeo и локальным словарем"""
+    new_words: List[Dict] = field(default_factory=list)
+    changed_words: List[Dict] = field(default_factory=list)
+    removed_word_ids: List[int] = field(default_factory=list)
+    unchanged_count: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.new_words or self.changed_words or self.removed_word_ids)
+
+
+def diff_vocabulary(remote_words: Dict[int, Dict], local_hashes: Dict[int, Optional[str]]) -> VocabularyDelta:
+    """
+    Сравнивает нормализованный экспорт Lingualeo {word_id: word} с локальными
+    хешами {word_id: content_hash}.
+
+    Новые слова и слова с измененным переводом попадают в delta, слова,
+    которых больше нет в Lingualeo, - в removed_word_ids. Локальные записи
+    без хеша (созданные до появления хешей) считаются измененными и
+    получат хеш при ближайшей синхронизации.
+    """
+    delta = VocabularyDelta()
+    for word_id, word in remote_words.items():
+        if word_id not in local_hashes:
+            delta.new_words.append(word)
+        elif local_hashes[word_id] != word['content_hash']:
+            delta.changed_words.append(word)
+        else:
+            delta.unchanged_count += 1
+
+    delta.removed_word_ids = [word_id for word_id in local_hashes if word_id not in remote_words]
+    return delta
+
+
+def frame_vocabulary_hashes(df) -> Dict[int, Optional[str]]:
+    """
+    {word_id: content_hash} для CSV-словаря (pandas DataFrame).
+    В старых CSV колонки content_hash нет - хеш считается по словам.
+    """
+    if df is None or df.empty or 'word_id' not in df.columns:
+        return {}
+    word_ids = df['word_id'].astype('int64').tolist()
+    if 'content_hash' in df.columns:
+        hashes = [h if isinstance(h, str) and h else None for h in df['content_hash'].tolist()]
+    else:
+        hashes = [None] * len(word_ids)
+    return dict(zip(word_ids, hashes))
+
+
+def merge_delta_into_frame(df, delta: VocabularyDelta, next_repetition_date: str, interval_hours: float = 12):
+    """
+    Применяет дельту к CSV-словарю и возвращает новый DataFrame.
+    Колонки интервального повторения у существующих слов не меняются.
+    """
+    import pandas as pd
+
+    if df is None or df.empty:
+        df = pd.DataFrame(columns=['word_id', 'english', 'russian', 'next_repetition_date',
+                                   'interval_hours', 'ease_factor', 'repetitions', 'content_hash'])
+    else:
+        df = df.copy()
+        if 'content_hash' not in df.columns:
+            df['content_hash'] = None
+        df['word_id'] = df['word_id'].astype('int64')
+
+    if delta.removed_word_ids:
+        df = df[~df['word_id'].isin(delta.removed_word_ids)]
+
+    if delta.changed_words:
+        changed = {w['word_id']: w for w in delta.changed_words}
+        mask = df['word_id'].isin(changed.keys())
+        ids = df.loc[mask, 'word_id']
+        df.loc[mask, 'english'] = ids.map(lambda word_id: changed[word_id]['english']).values
+        df.loc[mask, 'russian'] = ids.map(lambda word_id: changed[word_id]['russian']).values
+        df.loc[mask, 'content_hash'] = ids.map(lambda word_id: changed[word_id]['content_hash']).values
+
+    if delta.new_words:
+        new_df = pd.DataFrame(delta.new_words)
+        new_df['next_repetition_date'] = next_repetition_date
+        new_df['interval_hours'] = interval_hours
+        new_df['ease_factor'] = 2.5
+        new_df['repetitions'] = 0
+        # pandas выравнивает колонки: лишние колонки CSV у новых слов остаются пустыми
+        if df.empty:
+            df = new_df.reindex(columns=df.columns.union(new_df.columns, sort=False))
+        else:
+            df = pd.concat([df, new_df], ignore_index=True)
+
+    return df.reset_index(drop=True)